@@ -4,4 +4,4 @@ set -x
 cd /var/app/current
 source /var/app/venv/*/bin/activate
 if [ "" = "1" ]; then python manage.py migrate --noinput; fi
-if [ "" = "1" ]; then python manage.py collectstatic --noinput; fi
+if [ "" = "1" ]; then python manage.py collectstatic --noinput && python manage.py build_precache; fi
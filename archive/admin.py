@@ -0,0 +1,24 @@
+from django.contrib import admin
+from .models import ArchiveSegment
+
+
+@admin.register(ArchiveSegment)
+class ArchiveSegmentAdmin(admin.ModelAdmin):
+    """Read-only list of archived files (managed by archive_rows and rehydrate_archive)."""
+    
+    list_display = ['model_label', 'month', 'row_count', 'first_at', 'last_at', 'size_bytes', 'created_at']
+    list_filter = ['model_label', 'month']
+    readonly_fields = [
+        'model_label', 'month', 'path', 'row_count', 'first_id', 'last_id',
+        'first_at', 'last_at', 'user_ids', 'checksum', 'size_bytes', 'created_at',
+    ]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        """Deleting a segment row would orphan its file; use rehydrate_archive."""
+        return False
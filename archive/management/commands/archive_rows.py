@@ -0,0 +1,83 @@
+"""
+Django management command to move cold ActivityLog and BreathingSession rows
+into compressed archive files.
+
+Rows older than the horizon (ARCHIVE_AFTER_DAYS, default 365) are written to
+gzipped NDJSON files under ARCHIVE_ROOT, one directory per table and month,
+and deleted from the table, one chunk per transaction (see archive.segments).
+Activity logs are only archived once update_activity_rollups has counted
+them, sessions once they are finished. Exports, analytics and the rebuild
+commands keep including archived rows.
+
+Usage:
+    python manage.py archive_rows
+    python manage.py archive_rows --days 180           # Custom horizon
+    python manage.py archive_rows --model sessions     # One table only
+    python manage.py archive_rows --dry-run            # Report what would be archived
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from archive.segments import CHUNK_SIZE, SPECS, archive_model, count_eligible
+
+
+class Command(BaseCommand):
+    help = 'Archive ActivityLog and BreathingSession rows older than a horizon to compressed files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help=f'Archive rows older than this many days (default: ARCHIVE_AFTER_DAYS, {settings.ARCHIVE_AFTER_DAYS})',
+        )
+        parser.add_argument(
+            '--model',
+            choices=sorted(SPECS),
+            default=None,
+            help='Only archive this table (default: all)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Rows moved per transaction (default: {CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many rows per month would be archived without moving them',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else settings.ARCHIVE_AFTER_DAYS
+        if days <= 0:
+            raise CommandError('--days must be positive')
+        if options['chunk_size'] <= 0:
+            raise CommandError('--chunk-size must be positive')
+        before = timezone.now() - timedelta(days=days)
+        specs = [SPECS[options['model']]] if options['model'] else list(SPECS.values())
+
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(self.style.SUCCESS(f'Archiving rows older than {before:%Y-%m-%d %H:%M} UTC'))
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+
+        total = 0
+        for spec in specs:
+            if options['dry_run']:
+                months = count_eligible(spec, before)
+            else:
+                months = archive_model(spec, before, chunk_size=options['chunk_size'])
+            rows = sum(months.values())
+            total += rows
+            self.stdout.write(f'  {spec.model._meta.verbose_name_plural}: {rows} row(s)')
+            for month, count in sorted(months.items()):
+                self.stdout.write(f'    {month:%Y-%m}: {count}')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{total} row(s) would be archived'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Archived {total} row(s)'))
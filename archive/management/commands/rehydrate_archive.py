@@ -0,0 +1,75 @@
+"""
+Django management command to move archived rows back into their tables.
+
+Each archive file is verified against its checksum, its rows are inserted
+again and the file and its ArchiveSegment are removed (see
+archive.segments). Rehydrated rows are archived again by the next
+archive_rows run if they are still older than the horizon.
+
+Usage:
+    python manage.py rehydrate_archive --model activity --month 2024-03
+    python manage.py rehydrate_archive --model sessions               # All months
+    python manage.py rehydrate_archive --model sessions --dry-run     # List files only
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from archive.models import ArchiveSegment
+from archive.segments import SPECS, rehydrate_segment
+
+
+class Command(BaseCommand):
+    help = 'Move archived ActivityLog or BreathingSession rows back into their table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=sorted(SPECS),
+            required=True,
+            help='Table to restore rows into',
+        )
+        parser.add_argument(
+            '--month',
+            type=str,
+            default=None,
+            help='Only restore this month (YYYY-MM, UTC); default: all archived months',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the archive files that would be restored',
+        )
+
+    def handle(self, *args, **options):
+        spec = SPECS[options['model']]
+        segments = ArchiveSegment.objects.filter(model_label=spec.label)
+        if options['month']:
+            try:
+                month = datetime.strptime(options['month'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError(f'Invalid month: {options["month"]} (expected YYYY-MM)')
+            segments = segments.filter(month=month)
+
+        segments = list(segments)
+        if not segments:
+            self.stdout.write(self.style.WARNING('No archived rows found'))
+            return
+
+        total = 0
+        for segment in segments:
+            if options['dry_run']:
+                rows = segment.row_count
+            else:
+                try:
+                    rows = rehydrate_segment(segment)
+                except (OSError, ValueError) as e:
+                    self.stdout.write(self.style.ERROR(f'  ✗ {segment.path}: {e}'))
+                    continue
+            total += rows
+            self.stdout.write(f'  {segment.path}: {rows} row(s)')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{total} row(s) would be restored'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Restored {total} row(s)'))
@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-17 06:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(help_text='Table the rows came from, e.g. tracker.activitylog', max_length=100)),
+                ('month', models.DateField(help_text='First day of the month (UTC) all rows in the file belong to')),
+                ('path', models.CharField(help_text='File path relative to ARCHIVE_ROOT', max_length=255, unique=True)),
+                ('row_count', models.PositiveIntegerField(help_text='Number of rows in the file')),
+                ('first_id', models.BigIntegerField(help_text='Lowest row id in the file')),
+                ('last_id', models.BigIntegerField(help_text='Highest row id in the file')),
+                ('first_at', models.DateTimeField(help_text='Earliest time field value in the file')),
+                ('last_at', models.DateTimeField(help_text='Latest time field value in the file')),
+                ('user_ids', models.JSONField(default=list, help_text='Sorted ids of the users with rows in the file (per-user reads skip other files)')),
+                ('checksum', models.CharField(help_text='SHA-256 of the compressed file', max_length=64)),
+                ('size_bytes', models.BigIntegerField(help_text='Size of the compressed file')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='When the rows were archived')),
+            ],
+            options={
+                'verbose_name': 'Archive Segment',
+                'verbose_name_plural': 'Archive Segments',
+                'ordering': ['model_label', 'month', 'first_at', 'first_id'],
+                'indexes': [models.Index(fields=['model_label', 'month'], name='archive_segment_month_idx')],
+            },
+        ),
+    ]
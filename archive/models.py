@@ -0,0 +1,62 @@
+from django.db import models
+
+
+class ArchiveSegment(models.Model):
+    """
+    One compressed NDJSON file of rows moved out of a hot table (see archive.segments).
+    Files are partitioned by table and calendar month (UTC) of the rows' time field.
+    """
+    
+    model_label = models.CharField(
+        max_length=100,
+        help_text="Table the rows came from, e.g. tracker.activitylog"
+    )
+    month = models.DateField(
+        help_text="First day of the month (UTC) all rows in the file belong to"
+    )
+    path = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="File path relative to ARCHIVE_ROOT"
+    )
+    row_count = models.PositiveIntegerField(
+        help_text="Number of rows in the file"
+    )
+    first_id = models.BigIntegerField(
+        help_text="Lowest row id in the file"
+    )
+    last_id = models.BigIntegerField(
+        help_text="Highest row id in the file"
+    )
+    first_at = models.DateTimeField(
+        help_text="Earliest time field value in the file"
+    )
+    last_at = models.DateTimeField(
+        help_text="Latest time field value in the file"
+    )
+    user_ids = models.JSONField(
+        default=list,
+        help_text="Sorted ids of the users with rows in the file (per-user reads skip other files)"
+    )
+    checksum = models.CharField(
+        max_length=64,
+        help_text="SHA-256 of the compressed file"
+    )
+    size_bytes = models.BigIntegerField(
+        help_text="Size of the compressed file"
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="When the rows were archived"
+    )
+    
+    class Meta:
+        verbose_name = "Archive Segment"
+        verbose_name_plural = "Archive Segments"
+        ordering = ['model_label', 'month', 'first_at', 'first_id']
+        indexes = [
+            models.Index(fields=['model_label', 'month'], name='archive_segment_month_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.model_label} {self.month:%Y-%m} ({self.row_count} rows)"
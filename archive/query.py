@@ -0,0 +1,55 @@
+"""
+Reading archived rows together with the live tables.
+
+Exports, the session summary rebuild, counter and rollup rebuilds and the
+correlation report use these helpers so that archiving rows (see
+archive.segments) doesn't change their results. Archived rows are read from
+the files listed in ArchiveSegment, skipping files outside the requested time
+range or without the requested user, and merged with the live rows in
+(time, id) order.
+"""
+
+import heapq
+from itertools import groupby
+from operator import attrgetter
+
+from .models import ArchiveSegment
+from .segments import get_spec, read_segment
+
+
+def archived_rows(model, user_id=None, start=None, end=None):
+    """
+    Archived rows of `model` as dicts of field attnames (user_id, technique_id,
+    ...), oldest first by (time, id), optionally limited to one user and a
+    [start, end) range of the model's time field.
+    """
+    spec = get_spec(model)
+    segments = ArchiveSegment.objects.filter(model_label=spec.label)
+    if start is not None:
+        segments = segments.filter(last_at__gte=start)
+    if end is not None:
+        segments = segments.filter(first_at__lt=end)
+
+    # Months don't overlap, but several runs may each have archived part of one month
+    for _, month_segments in groupby(segments.order_by('month', 'first_at', 'first_id'), key=attrgetter('month')):
+        files = [
+            read_segment(segment)
+            for segment in month_segments
+            if user_id is None or user_id in segment.user_ids
+        ]
+        for row in heapq.merge(*files, key=spec.sort_key):
+            if user_id is not None and row['user_id'] != user_id:
+                continue
+            moment = row[spec.time_field]
+            if (start is not None and moment < start) or (end is not None and moment >= end):
+                continue
+            yield row
+
+
+def union_rows(model, live_rows, archived):
+    """
+    Merge live and archived rows of `model`, each already ordered oldest
+    first, into one (time, id) ordered stream. Rows only need the time field
+    and 'id' keys, so export rows of either source can be merged.
+    """
+    return heapq.merge(archived, live_rows, key=get_spec(model).sort_key)
@@ -0,0 +1,279 @@
+"""
+Time-based archival of cold ActivityLog and BreathingSession rows.
+
+Rows older than a horizon are moved, in chunked transactions, into gzipped
+NDJSON files under settings.ARCHIVE_ROOT, one directory per table and
+calendar month (UTC) of the row's time field:
+
+    <ARCHIVE_ROOT>/tracker/activitylog/2024-03/<first id>-<last id>-<tag>.ndjson.gz
+
+Each file is recorded as an ArchiveSegment (row count, id and time range,
+users, checksum), which is the index readers use to find files; a file
+without a segment row is ignored. Within a chunk's transaction the file is
+written, the segment row created and the rows deleted, so a failure leaves
+either the rows or the segment, never both or neither (a file written by a
+failed run is removed).
+
+Only rows whose derived data is final are archived: ActivityLog rows already
+folded into the rollups (id up to the rollup watermark), and finished
+breathing sessions. Counters, rollups and session summary tables keep
+counting archived rows, and their rebuilds read the archive too (see
+archive.query). Counter and summary rows are otherwise seeded lazily from the
+live table, so a chunk first seeds the missing ones of its users and
+techniques while its rows are still there. `rehydrate_segment` moves a
+file's rows back.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+from breathe.models import BreathingSession, TechniqueStats, UserTechniqueStats
+from breathing.exports import encode_chunks, gzip_chunks, ndjson_rows
+from tracker.models import ActivityCounter, ActivityLog
+
+from .models import ArchiveSegment
+
+# Rows moved per transaction
+CHUNK_SIZE = 5000
+
+
+def rolled_up_logs():
+    # Imported here: tracker.rollups reads the archive when rebuilding
+    from tracker.rollups import get_watermark
+    return Q(id__lte=get_watermark())
+
+
+def finished_sessions():
+    return Q(completed_at__isnull=False)
+
+
+def seed_activity_counters(rows):
+    """Create the missing ActivityCounter rows of the users of `rows`."""
+    user_ids = {row['user_id'] for row in rows}
+    seeded = set(ActivityCounter.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    for user in User.objects.filter(pk__in=user_ids - seeded):
+        ActivityCounter.rebuild_for_user(user)
+
+
+def seed_session_stats(rows):
+    """Create the missing UserTechniqueStats/TechniqueStats rows of the sessions in `rows`."""
+    # Imported here: breathe.analytics reads the archive when rebuilding
+    from breathe.analytics import rebuild_stats
+    pairs = {(row['user_id'], row['technique_id']) for row in rows}
+    seeded = set(UserTechniqueStats.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        technique_id__in={technique_id for _, technique_id in pairs},
+    ).values_list('user_id', 'technique_id'))
+    for user_id, technique_id in pairs - seeded:
+        rebuild_stats(UserTechniqueStats, user_id=user_id, technique_id=technique_id)
+
+    technique_ids = {technique_id for _, technique_id in pairs}
+    seeded = set(TechniqueStats.objects.filter(technique_id__in=technique_ids).values_list('technique_id', flat=True))
+    for technique_id in technique_ids - seeded:
+        rebuild_stats(TechniqueStats, technique_id=technique_id)
+
+
+class ArchiveSpec:
+    """
+    How one model is archived: its time field, which rows may be moved and
+    `seed(rows)`, which creates derived rows still missing for a chunk.
+    """
+
+    def __init__(self, name, model, time_field, eligible, seed):
+        self.name = name
+        self.model = model
+        self.time_field = time_field
+        self.eligible = eligible
+        self.seed = seed
+        self.label = model._meta.label_lower
+        self.fields = {field.attname: field for field in model._meta.concrete_fields}
+
+    def sort_key(self, row):
+        return row[self.time_field], row['id']
+
+    def decode(self, data):
+        """Row dict read from a file -> dict of Python values (datetimes, UUIDs, ...)."""
+        return {name: self.fields[name].to_python(value) for name, value in data.items()}
+
+
+SPECS = {
+    spec.name: spec
+    for spec in (
+        ArchiveSpec('activity', ActivityLog, 'timestamp', rolled_up_logs, seed_activity_counters),
+        ArchiveSpec('sessions', BreathingSession, 'started_at', finished_sessions, seed_session_stats),
+    )
+}
+
+
+def get_spec(model):
+    return next(spec for spec in SPECS.values() if spec.model is model)
+
+
+def segment_spec(segment):
+    return next(spec for spec in SPECS.values() if spec.label == segment.model_label)
+
+
+def get_archive_root():
+    return Path(settings.ARCHIVE_ROOT)
+
+
+def month_bounds(moment):
+    """(first day, start, end) of the UTC calendar month containing `moment`."""
+    moment = moment.astimezone(dt_timezone.utc)
+    start = datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+    if moment.month == 12:
+        end = start.replace(year=moment.year + 1, month=1)
+    else:
+        end = start.replace(month=moment.month + 1)
+    return start.date(), start, end
+
+
+def write_segment(spec, month, rows):
+    """
+    Write `rows` (sorted by time and id, all in `month`) to a new file and
+    return the unsaved ArchiveSegment describing it.
+    """
+    ids = [row['id'] for row in rows]
+    relative = Path(
+        spec.model._meta.app_label,
+        spec.model._meta.model_name,
+        f'{month:%Y-%m}',
+        f'{min(ids)}-{max(ids)}-{uuid.uuid4().hex[:8]}.ndjson.gz',
+    )
+    path = get_archive_root() / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    temporary = path.with_name(path.name + '.tmp')
+    with open(temporary, 'wb') as output:
+        for chunk in gzip_chunks(encode_chunks(ndjson_rows(rows))):
+            output.write(chunk)
+            digest.update(chunk)
+            size += len(chunk)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temporary, path)
+
+    return ArchiveSegment(
+        model_label=spec.label,
+        month=month,
+        path=relative.as_posix(),
+        row_count=len(rows),
+        first_id=min(ids),
+        last_id=max(ids),
+        first_at=rows[0][spec.time_field],
+        last_at=rows[-1][spec.time_field],
+        user_ids=sorted({row['user_id'] for row in rows}),
+        checksum=digest.hexdigest(),
+        size_bytes=size,
+    )
+
+
+def segment_path(segment):
+    return get_archive_root() / segment.path
+
+
+def read_segment(segment, verify=False):
+    """
+    Yield the rows of `segment` as dicts of field attnames, in (time, id) order.
+    With `verify`, the file is checked against the stored checksum first
+    (raises ValueError on a mismatch).
+    """
+    spec = segment_spec(segment)
+    path = segment_path(segment)
+    if verify:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as archived:
+            for block in iter(lambda: archived.read(1024 * 1024), b''):
+                digest.update(block)
+        if digest.hexdigest() != segment.checksum:
+            raise ValueError(f'Checksum mismatch: {segment.path}')
+    with gzip.open(path, 'rt', encoding='utf-8') as lines:
+        for line in lines:
+            yield spec.decode(json.loads(line))
+
+
+def eligible_rows(spec, before):
+    """Rows of `spec.model` that may be archived: older than `before` and final."""
+    return spec.model.objects.filter(spec.eligible(), **{f'{spec.time_field}__lt': before})
+
+
+def count_eligible(spec, before):
+    """{first day of month: rows} that archive_model would move (for --dry-run)."""
+    rows = eligible_rows(spec, before).annotate(
+        archive_month=TruncMonth(spec.time_field, tzinfo=dt_timezone.utc)
+    ).values('archive_month').order_by('archive_month').annotate(rows=Count('id'))
+    return {row['archive_month'].date(): row['rows'] for row in rows}
+
+
+def archive_chunk(spec, before, chunk_size):
+    """
+    Move up to `chunk_size` of the oldest eligible rows, all from one month,
+    into a new segment. Returns the segment, or None when nothing is left.
+    """
+    segment = None
+    try:
+        with transaction.atomic():
+            rows = list(
+                eligible_rows(spec, before)
+                .select_for_update()
+                .order_by(spec.time_field, 'id')
+                .values(*spec.fields)[:chunk_size]
+            )
+            if not rows:
+                return None
+            # One month per file: the rest of the chunk goes into the next one
+            month, _, month_end = month_bounds(rows[0][spec.time_field])
+            rows = [row for row in rows if row[spec.time_field] < month_end]
+
+            # Seeded from the live rows, which are about to be deleted
+            spec.seed(rows)
+            segment = write_segment(spec, month, rows)
+            segment.save()
+            spec.model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+    except BaseException:
+        if segment is not None:
+            segment_path(segment).unlink(missing_ok=True)
+        raise
+    return segment
+
+
+def archive_model(spec, before, chunk_size=CHUNK_SIZE):
+    """
+    Archive every eligible row of `spec.model` older than `before`, one chunk
+    per transaction. Returns {first day of month: rows archived}.
+    """
+    archived = {}
+    while True:
+        segment = archive_chunk(spec, before, chunk_size)
+        if segment is None:
+            return archived
+        archived[segment.month] = archived.get(segment.month, 0) + segment.row_count
+
+
+def rehydrate_segment(segment, batch_size=CHUNK_SIZE):
+    """
+    Move the rows of `segment` back into their table (after verifying the
+    file), delete the segment and, once committed, its file. Returns the row count.
+    """
+    spec = segment_spec(segment)
+    instances = [spec.model(**row) for row in read_segment(segment, verify=True)]
+    path = segment_path(segment)
+    with transaction.atomic():
+        # Ids come from the table's own sequence, so they are still free
+        spec.model.objects.bulk_create(instances, batch_size=batch_size)
+        segment.delete()
+        transaction.on_commit(lambda: path.unlink(missing_ok=True))
+    return len(instances)
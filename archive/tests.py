@@ -0,0 +1,219 @@
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from breathe.analytics import record_finished_sessions
+from breathe.correlation import compute_correlation
+from breathe.exports import session_export_rows
+from breathe.models import BreathingCategory, BreathingSession, BreathingTechnique
+from tracker.exports import activity_export_rows
+from tracker.models import ActivityCounter, ActivityLog, ActivityRollup
+from tracker.rollups import rebuild_rollups, update_rollups
+
+from breathe.models import TechniqueStats, UserTechniqueStats
+
+from .models import ArchiveSegment
+from .query import archived_rows
+from .segments import SPECS, archive_model, read_segment, rehydrate_segment
+
+
+class ArchiveTests(TestCase):
+    """Cold rows move to monthly files and stay visible to exports and rebuilds."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        settings_override = override_settings(ARCHIVE_ROOT=str(self.root))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('admin', password='password')
+        self.other = User.objects.create_user('other', password='password')
+        with self.captureOnCommitCallbacks(execute=True):
+            category = BreathingCategory.objects.create(name_ru='Успокоение')
+            self.technique = BreathingTechnique.objects.create(
+                category=category,
+                name_ru='Квадратное дыхание',
+                inhale=4,
+                hold_start=4,
+                exhale=4,
+                hold_end=4,
+                recommended_time_min=3,
+                posture_ru='Сидя',
+                breath_origin='ABDOMEN',
+                instructions_ru='Дышите.',
+            )
+
+        # Two cold months (January and March 2024) and a recent day
+        self.moments = [
+            datetime(2024, 1, 10, 8, tzinfo=dt_timezone.utc),
+            datetime(2024, 1, 31, 23, 30, tzinfo=dt_timezone.utc),
+            datetime(2024, 3, 5, 12, tzinfo=dt_timezone.utc),
+            datetime(2024, 3, 5, 12, tzinfo=dt_timezone.utc),
+            timezone.now() - timedelta(days=1),
+        ]
+        for index, moment in enumerate(self.moments):
+            user = self.user if index % 2 == 0 else self.other
+            ActivityLog.objects.create(user=user, activity_type='RESIST', timestamp=moment)
+            ActivityCounter.increment(user, 'RESIST')
+            session = BreathingSession.objects.create(
+                user=user,
+                technique=self.technique,
+                started_at=moment,
+                completed_at=moment + timedelta(minutes=3),
+                completed=index != 1,
+                cycles_completed=11,
+            )
+            record_finished_sessions([session])
+        update_rollups(lag=0)
+        # A cold tap not yet rolled up and a cold session still open stay put
+        self.unrolled = ActivityLog.objects.create(user=self.user, activity_type='SPORT', timestamp=self.moments[0])
+        ActivityCounter.increment(self.user, 'SPORT')
+        self.open_session = BreathingSession.objects.create(
+            user=self.user, technique=self.technique, started_at=self.moments[0]
+        )
+        self.before = timezone.now() - timedelta(days=30)
+
+    def archive(self, chunk_size=1000):
+        return {
+            name: archive_model(spec, self.before, chunk_size=chunk_size)
+            for name, spec in SPECS.items()
+        }
+
+    def test_moves_final_cold_rows_into_monthly_files(self):
+        archived = self.archive()
+        self.assertEqual(archived['activity'], {datetime(2024, 1, 1).date(): 2, datetime(2024, 3, 1).date(): 2})
+        self.assertEqual(sum(archived['sessions'].values()), 4)
+        self.assertEqual(
+            set(ActivityLog.objects.values_list('id', flat=True)),
+            {self.unrolled.pk, ActivityLog.objects.get(timestamp=self.moments[4]).pk}
+        )
+        self.assertTrue(BreathingSession.objects.filter(pk=self.open_session.pk).exists())
+
+        segment = ArchiveSegment.objects.get(model_label='tracker.activitylog', month=datetime(2024, 1, 1).date())
+        self.assertTrue((self.root / segment.path).exists())
+        self.assertIn('tracker/activitylog/2024-01/', segment.path)
+        self.assertEqual(segment.user_ids, [self.user.pk, self.other.pk])
+        rows = list(read_segment(segment, verify=True))
+        self.assertEqual([row['timestamp'] for row in rows], self.moments[:2])
+
+    def test_chunks_keep_time_order(self):
+        self.archive(chunk_size=1)
+        self.assertEqual(ArchiveSegment.objects.filter(model_label='tracker.activitylog').count(), 4)
+        rows = list(archived_rows(ActivityLog))
+        self.assertEqual([row['timestamp'] for row in rows], self.moments[:4])
+        self.assertEqual(len(list(archived_rows(ActivityLog, user_id=self.other.pk))), 2)
+        march = list(archived_rows(ActivityLog, start=datetime(2024, 2, 1, tzinfo=dt_timezone.utc)))
+        self.assertEqual(len(march), 2)
+
+    def test_exports_and_correlation_include_archived_rows(self):
+        activity = [row['id'] for row in activity_export_rows()]
+        sessions = list(session_export_rows(user=self.user))
+        correlation = compute_correlation(self.user)
+        self.archive(chunk_size=1)
+        self.assertEqual([row['id'] for row in activity_export_rows()], activity)
+        self.assertEqual(list(session_export_rows(user=self.user)), sessions)
+        self.assertEqual(compute_correlation(self.user), correlation)
+
+    def test_rebuilds_still_count_archived_rows(self):
+        rollups = sorted(ActivityRollup.objects.values_list('bucket_start', 'granularity', 'count'))
+        self.archive()
+
+        out = StringIO()
+        call_command('rebuild_session_stats', '--check', stdout=out)
+        self.assertIn('up to date', out.getvalue())
+        out = StringIO()
+        call_command('rebuild_activity_counters', '--check', stdout=out)
+        self.assertIn('up to date', out.getvalue())
+        out = StringIO()
+        call_command('rebuild_activity_counters', '--check', '--user', 'other', stdout=out)
+        self.assertIn('up to date', out.getvalue())
+
+        self.unrolled.delete()
+        rebuild_rollups(lag=0)
+        self.assertEqual(sorted(ActivityRollup.objects.values_list('bucket_start', 'granularity', 'count')), rollups)
+
+    def stats(self, user):
+        return sorted(UserTechniqueStats.objects.filter(user=user).values_list('technique_id', 'sessions', 'completed'))
+
+    def test_archive_seeds_missing_counters_and_stats(self):
+        counts = ActivityCounter.objects.get(user=self.other).as_dict()
+        stats = self.stats(self.other)
+        technique_stats = list(TechniqueStats.objects.values_list('technique_id', 'sessions'))
+        # Rows that were never seeded (e.g. history from before the summary tables)
+        ActivityCounter.objects.filter(user=self.other).delete()
+        UserTechniqueStats.objects.filter(user=self.other).delete()
+        TechniqueStats.objects.all().delete()
+
+        self.archive()
+        self.assertEqual(ActivityCounter.objects.get(user=self.other).as_dict(), counts)
+        self.assertEqual(self.stats(self.other), stats)
+        self.assertEqual(list(TechniqueStats.objects.values_list('technique_id', 'sessions')), technique_stats)
+
+    def test_seeding_after_archive_counts_archived_rows(self):
+        counts = ActivityCounter.objects.get(user=self.other).as_dict()
+        stats = self.stats(self.other)
+        self.archive()
+        ActivityCounter.objects.filter(user=self.other).delete()
+        UserTechniqueStats.objects.filter(user=self.other).delete()
+
+        ActivityLog.objects.create(user=self.other, activity_type='SPORT')
+        ActivityCounter.increment(self.other, 'SPORT')
+        counts['sport'] += 1
+        self.assertEqual(ActivityCounter.objects.get(user=self.other).as_dict(), counts)
+
+        session = BreathingSession.objects.create(
+            user=self.other,
+            technique=self.technique,
+            started_at=timezone.now(),
+            completed_at=timezone.now(),
+            completed=True,
+        )
+        record_finished_sessions([session])
+        technique_id, sessions, completed = stats[0]
+        self.assertEqual(self.stats(self.other), [(technique_id, sessions + 1, completed + 1)])
+
+    def test_rehydrate_restores_rows(self):
+        ids = set(BreathingSession.objects.values_list('id', flat=True))
+        self.archive()
+        for segment in ArchiveSegment.objects.filter(model_label='breathe.breathingsession'):
+            path = self.root / segment.path
+            with self.captureOnCommitCallbacks(execute=True):
+                rehydrate_segment(segment)
+            self.assertFalse(path.exists())
+        self.assertEqual(set(BreathingSession.objects.values_list('id', flat=True)), ids)
+        self.assertFalse(ArchiveSegment.objects.filter(model_label='breathe.breathingsession').exists())
+
+    def test_rehydrate_refuses_a_modified_file(self):
+        self.archive()
+        segment = ArchiveSegment.objects.filter(model_label='tracker.activitylog').first()
+        with open(self.root / segment.path, 'ab') as archived:
+            archived.write(b'\0')
+        out = StringIO()
+        call_command('rehydrate_archive', '--model', 'activity', '--month', f'{segment.month:%Y-%m}', stdout=out)
+        self.assertIn('Checksum mismatch', out.getvalue())
+        self.assertTrue(ArchiveSegment.objects.filter(pk=segment.pk).exists())
+
+    def test_commands(self):
+        out = StringIO()
+        call_command('archive_rows', '--days', '30', '--dry-run', stdout=out)
+        self.assertIn('8 row(s) would be archived', out.getvalue())
+        self.assertFalse(ArchiveSegment.objects.exists())
+
+        call_command('archive_rows', '--days', '30', '--model', 'activity', stdout=StringIO())
+        self.assertEqual(ActivityLog.objects.count(), 2)
+        self.assertEqual(BreathingSession.objects.count(), 6)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rehydrate_archive', '--model', 'activity', stdout=out)
+        self.assertIn('Restored 4 row(s)', out.getvalue())
+        self.assertEqual(ActivityLog.objects.count(), 6)
+        self.assertEqual(list(self.root.rglob('*.gz')), [])
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from breathing.admin import AutocompleteFilter, LargeTableAdmin
 from .models import BreathingCategory, BreathingTechnique, BreathingSession
 
 
@@ -49,19 +50,23 @@ class BreathingTechniqueAdmin(admin.ModelAdmin):
 
 
 @admin.register(BreathingSession)
-class BreathingSessionAdmin(admin.ModelAdmin):
-    """Admin interface for BreathingSession model."""
+class BreathingSessionAdmin(LargeTableAdmin):
+    """Admin interface for BreathingSession model (estimated counts, see breathing.admin)."""
     
     list_display = ['id', 'user', 'technique', 'started_at', 'completed', 'duration_seconds', 'cycles_completed']
-    list_filter = ['completed', 'sound_enabled', 'vibration_enabled', 'started_at', 'technique__category']
+    # No date_hierarchy: its drill-down reads the distinct dates of the whole table
+    list_filter = [
+        'completed', 'sound_enabled', 'vibration_enabled', 'started_at', 'technique__category',
+        ('user', AutocompleteFilter),
+    ]
     search_fields = ['user__username', 'technique__name_ru']
-    readonly_fields = ['started_at', 'completed_at', 'duration_seconds']
-    date_hierarchy = 'started_at'
+    readonly_fields = ['started_at', 'completed_at', 'duration_seconds', 'client_uuid']
+    autocomplete_fields = ['user']
     ordering = ['-started_at']
     
     fieldsets = (
         ('Session Information', {
-            'fields': ('user', 'technique', 'started_at', 'completed_at', 'duration_seconds')
+            'fields': ('user', 'technique', 'started_at', 'completed_at', 'duration_seconds', 'client_uuid')
         }),
         ('Session Status', {
             'fields': ('completed', 'cycles_completed')
@@ -0,0 +1,281 @@
+"""
+Breathing session analytics served from summary tables.
+
+UserTechniqueStats (per user and technique) and TechniqueStats (per technique,
+all users) hold running totals of finished sessions: how many, how many were
+completed, total duration and cycles, and the same counts split by the sound
+and vibration preferences. `record_finished_sessions` adds a session to both
+tables in the transaction that completes or cancels it (breathe.sessions), so
+the analytics endpoint reads at most a few dozen summary rows and never scans
+BreathingSession. Per-category figures are sums over a category's techniques.
+
+Rows are seeded from BreathingSession and archived sessions the first time a
+user/technique pair finishes a session, and `rebuild_session_stats`
+recalculates everything, e.g. after sessions were edited or deleted in the
+admin. Archived sessions (see archive.segments) stay counted: archiving seeds
+missing rows before it deletes sessions, and seeding and the rebuild read the
+archive.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from archive.query import archived_rows
+
+from .catalog import get_catalog
+from .models import BreathingSession, SessionStats, TechniqueStats, UserTechniqueStats
+
+STAT_FIELDS = SessionStats.STAT_FIELDS
+
+def session_counts(completed, duration_seconds, cycles_completed, sound_enabled, vibration_enabled):
+    """Contribution of one finished session to the STAT_FIELDS totals."""
+    return {
+        'sessions': 1,
+        'completed': int(completed),
+        'duration_seconds': duration_seconds or 0,
+        'cycles_completed': cycles_completed or 0,
+        'sound_sessions': int(sound_enabled),
+        'sound_completed': int(sound_enabled and completed),
+        'vibration_sessions': int(vibration_enabled),
+        'vibration_completed': int(vibration_enabled and completed),
+    }
+
+
+def aggregate_sessions(sessions, group_by):
+    """STAT_FIELDS totals and last_session_at of finished `sessions`, grouped by `group_by` ids."""
+    # Annotations can't reuse BreathingSession field names (completed, duration_seconds, ...)
+    rows = sessions.filter(completed_at__isnull=False).values(*group_by).order_by().annotate(
+        total_sessions=Count('id'),
+        total_completed=Count('id', filter=Q(completed=True)),
+        total_duration_seconds=Coalesce(Sum('duration_seconds'), 0),
+        total_cycles_completed=Coalesce(Sum('cycles_completed'), 0),
+        total_sound_sessions=Count('id', filter=Q(sound_enabled=True)),
+        total_sound_completed=Count('id', filter=Q(sound_enabled=True, completed=True)),
+        total_vibration_sessions=Count('id', filter=Q(vibration_enabled=True)),
+        total_vibration_completed=Count('id', filter=Q(vibration_enabled=True, completed=True)),
+        total_last_session_at=Max('completed_at'),
+    )
+    for row in rows:
+        yield {name.removeprefix('total_'): value for name, value in row.items()}
+
+
+def aggregate_archived_sessions(group_by, user_id=None, technique_id=None):
+    """aggregate_sessions for archived sessions (all finished), keyed by the `group_by` id tuple."""
+    totals = {}
+    for session in archived_rows(BreathingSession, user_id=user_id):
+        if technique_id is not None and session['technique_id'] != technique_id:
+            continue
+        key = tuple(session[f'{name}_id'] for name in group_by)
+        entry = totals.setdefault(key, {**dict.fromkeys(STAT_FIELDS, 0), 'last_session_at': None})
+        counts = session_counts(
+            session['completed'],
+            session['duration_seconds'],
+            session['cycles_completed'],
+            session['sound_enabled'],
+            session['vibration_enabled'],
+        )
+        for field, amount in counts.items():
+            entry[field] += amount
+        if entry['last_session_at'] is None or session['completed_at'] > entry['last_session_at']:
+            entry['last_session_at'] = session['completed_at']
+    return totals
+
+
+def rebuild_stats(model, dry_run=False, include_archive=True, **filters):
+    """
+    Recalculate `model` rows from BreathingSession and, with `include_archive`,
+    archived sessions. `filters` (user_id, technique_id) restrict both the
+    sessions and the rows rebuilt. Returns the number of rows that were (or,
+    with dry_run, would be) created, changed or deleted.
+    """
+    fields = STAT_FIELDS + ('last_session_at',)
+    keys = [f'{name}_id' for name in model.GROUP_BY]
+
+    with transaction.atomic():
+        rows = model.objects.filter(**filters)
+        if not dry_run:
+            # Sessions ending meanwhile wait for the rebuild, then add to the rebuilt rows
+            rows = rows.select_for_update()
+        stored = {
+            tuple(row[key] for key in keys): row
+            for row in rows.values(*keys, *fields)
+        }
+        actual = {
+            tuple(row[name] for name in model.GROUP_BY): row
+            for row in aggregate_sessions(BreathingSession.objects.filter(**filters), model.GROUP_BY)
+        }
+        if include_archive:
+            for key, archived in aggregate_archived_sessions(model.GROUP_BY, **filters).items():
+                row = actual.setdefault(key, {**dict.fromkeys(STAT_FIELDS, 0), 'last_session_at': None})
+                for field in STAT_FIELDS:
+                    row[field] += archived[field]
+                if row['last_session_at'] is None or archived['last_session_at'] > row['last_session_at']:
+                    row['last_session_at'] = archived['last_session_at']
+
+        changed = [
+            key for key, row in actual.items()
+            if key not in stored or any(stored[key][field] != row[field] for field in fields)
+        ]
+        stale = [key for key in stored if key not in actual]
+        if dry_run:
+            return len(changed) + len(stale)
+
+        if changed:
+            model.objects.bulk_create(
+                [
+                    model(**dict(zip(keys, key)), **{field: actual[key][field] for field in fields})
+                    for key in changed
+                ],
+                update_conflicts=True,
+                unique_fields=list(model.GROUP_BY),
+                update_fields=list(fields),
+            )
+        for key in stale:
+            model.objects.filter(**dict(zip(keys, key))).delete()
+    return len(changed) + len(stale)
+
+
+def add_counts(model, key, counts, last_session_at):
+    """Add `counts` to one summary row with a single UPDATE, seeding the row if it is missing."""
+    updated = model.objects.filter(**key).update(
+        last_session_at=Greatest(Coalesce(F('last_session_at'), last_session_at), last_session_at),
+        **{field: F(field) + amount for field, amount in counts.items() if amount}
+    )
+    if not updated:
+        # First finished session for this key: seed the row from history,
+        # which already includes the sessions just finished, and the archive
+        # (sessions archived before the row existed)
+        rebuild_stats(model, **key)
+
+
+def record_finished_sessions(sessions):
+    """
+    Add sessions that were just completed or cancelled to the summary tables.
+    `sessions` are BreathingSession instances or dicts with user_id,
+    technique_id, completed, completed_at, duration_seconds, cycles_completed,
+    sound_enabled and vibration_enabled. Must be called inside the
+    transaction that finished them, and only once per session.
+    """
+    totals = {}
+    for session in sessions:
+        if not isinstance(session, dict):
+            session = {
+                name: getattr(session, name)
+                for name in (
+                    'user_id', 'technique_id', 'completed', 'completed_at', 'duration_seconds',
+                    'cycles_completed', 'sound_enabled', 'vibration_enabled',
+                )
+            }
+        counts = session_counts(
+            session['completed'],
+            session['duration_seconds'],
+            session['cycles_completed'],
+            session['sound_enabled'],
+            session['vibration_enabled'],
+        )
+        for model, key in (
+            (UserTechniqueStats, (('user_id', session['user_id']), ('technique_id', session['technique_id']))),
+            (TechniqueStats, (('technique_id', session['technique_id']),)),
+        ):
+            entry = totals.setdefault((model, key), [dict.fromkeys(STAT_FIELDS, 0), session['completed_at']])
+            for field, amount in counts.items():
+                entry[0][field] += amount
+            entry[1] = max(entry[1], session['completed_at'])
+
+    for (model, key), (counts, last_session_at) in totals.items():
+        add_counts(model, dict(key), counts, last_session_at)
+
+
+def rate(part, total):
+    return round(part / total, 4) if total else None
+
+
+def summarize(counts):
+    """Derived figures of STAT_FIELDS totals."""
+    cancelled = counts['sessions'] - counts['completed']
+    return {
+        'sessions': counts['sessions'],
+        'completed': counts['completed'],
+        'cancelled': cancelled,
+        'completion_rate': rate(counts['completed'], counts['sessions']),
+        'total_duration_seconds': counts['duration_seconds'],
+        'average_duration_seconds': (
+            round(counts['duration_seconds'] / counts['sessions'], 1) if counts['sessions'] else None
+        ),
+        'cycles_completed': counts['cycles_completed'],
+    }
+
+
+def preference_effects(counts):
+    """Sessions and completion rate with each cue preference on and off."""
+    effects = {}
+    for preference in ('sound', 'vibration'):
+        sessions_on = counts[f'{preference}_sessions']
+        completed_on = counts[f'{preference}_completed']
+        sessions_off = counts['sessions'] - sessions_on
+        completed_off = counts['completed'] - completed_on
+        effects[preference] = {
+            'on': {'sessions': sessions_on, 'completion_rate': rate(completed_on, sessions_on)},
+            'off': {'sessions': sessions_off, 'completion_rate': rate(completed_off, sessions_off)},
+        }
+    return effects
+
+
+def add_up(rows):
+    totals = dict.fromkeys(STAT_FIELDS, 0)
+    for row in rows:
+        for field in STAT_FIELDS:
+            totals[field] += getattr(row, field)
+    return totals
+
+
+def build_analytics(stats_rows):
+    """
+    Analytics payload from summary rows (UserTechniqueStats of one user, or
+    TechniqueStats): totals, per-technique and per-category figures, and
+    preference effects. Names come from the catalog snapshot, not a join.
+    """
+    catalog = get_catalog()
+    stats_rows = list(stats_rows)
+
+    techniques = []
+    by_category = {}
+    for row in stats_rows:
+        technique = catalog.get_technique(row.technique_id)
+        counts = add_up([row])
+        techniques.append({
+            'technique_id': row.technique_id,
+            'name_ru': technique.name_ru if technique else None,
+            'category_id': technique.category_id if technique else None,
+            'last_session_at': row.last_session_at.isoformat() if row.last_session_at else None,
+            **summarize(counts),
+        })
+        by_category.setdefault(technique.category_id if technique else None, []).append(row)
+    techniques.sort(key=lambda entry: -entry['sessions'])
+
+    categories = []
+    for category_id, rows in by_category.items():
+        category = catalog.get_category(category_id) if category_id is not None else None
+        categories.append({
+            'category_id': category_id,
+            'name_ru': category.name_ru if category else None,
+            **summarize(add_up(rows)),
+        })
+    categories.sort(key=lambda entry: -entry['sessions'])
+
+    totals = add_up(stats_rows)
+    return {
+        'totals': summarize(totals),
+        'techniques': techniques,
+        'categories': categories,
+        'preferences': preference_effects(totals),
+    }
+
+
+def user_analytics(user):
+    return build_analytics(UserTechniqueStats.objects.filter(user=user))
+
+
+def technique_analytics():
+    return build_analytics(TechniqueStats.objects.all())
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class BreatheConfig(AppConfig):
     name = 'breathe'
+
+    def ready(self):
+        # Register catalog change signal handlers
+        from . import signals  # noqa: F401
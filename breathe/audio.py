@@ -0,0 +1,241 @@
+"""
+Audio sprite of the guide's voice cues.
+
+`generate_audio` writes one MP3 per cue (phase_*.mp3, count_*.mp3). Loading
+them separately costs one request and one decoder setup per file before a
+session can start, so `generate_audio --sprite` joins them into a single
+MP3 with a JSON manifest of where each cue starts and how long it lasts:
+
+    static/audio/ru/cues.<content hash>.mp3
+    static/audio/ru/cues.json   {"file": ..., "cues": {"phase_inhale": {"offset", "duration"}, ...}}
+
+MP3 files are a plain sequence of self-contained frames, so they are joined
+at frame boundaries without re-encoding: ID3 tags and Xing/Info header
+frames are dropped, and short runs of silent frames separate the cues.
+Offsets are computed from frame counts (each frame holds a fixed number of
+samples), so they are exact up to the decoder delay of a few milliseconds.
+"""
+
+import hashlib
+import json
+import math
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+
+SPRITE_PREFIX = 'cues'
+MANIFEST_NAME = f'{SPRITE_PREFIX}.json'
+STATIC_DIR = 'audio/ru'
+
+# Silence inserted between cues, so the <audio> fallback can't bleed into the next cue
+DEFAULT_GAP_SECONDS = 0.25
+
+# Layer III bitrates (kbps) by bitrate index, for MPEG-1 and MPEG-2/2.5
+BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates by version bits (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+
+
+class FrameHeader:
+    """Decoded 4-byte MPEG audio Layer III frame header."""
+
+    __slots__ = ('raw', 'version', 'protected', 'bitrate', 'sample_rate', 'padding', 'mono')
+
+    def __init__(self, raw):
+        if raw[0] != 0xFF or (raw[1] & 0xE0) != 0xE0:
+            raise ValueError('No MPEG frame sync')
+        version = (raw[1] >> 3) & 0x03
+        layer = (raw[1] >> 1) & 0x03
+        bitrate_index = raw[2] >> 4
+        sample_rate_index = (raw[2] >> 2) & 0x03
+        if version == 1 or layer != 1:
+            raise ValueError('Only MPEG Layer III audio is supported')
+        if bitrate_index in (0, 15) or sample_rate_index == 3:
+            raise ValueError('Unsupported bitrate or sample rate')
+
+        self.raw = bytes(raw[:4])
+        self.version = version
+        self.protected = not (raw[1] & 0x01)
+        self.bitrate = BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+        self.sample_rate = SAMPLE_RATES[version][sample_rate_index]
+        self.padding = (raw[2] >> 1) & 0x01
+        self.mono = (raw[3] >> 6) == 3
+
+    @property
+    def samples(self):
+        return 1152 if self.version == 3 else 576
+
+    @property
+    def length(self):
+        """Frame length in bytes, header included."""
+        return self.samples // 8 * self.bitrate // self.sample_rate + self.padding
+
+    @property
+    def side_info_length(self):
+        if self.version == 3:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+    def silent_frame(self):
+        """
+        A frame of silence in this format: all-zero side information means
+        no Huffman data, which decodes to zero samples.
+        """
+        raw = bytearray(self.raw)
+        raw[1] |= 0x01  # no CRC
+        raw[2] &= ~0x02 & 0xFF  # no padding
+        header = FrameHeader(raw)
+        return bytes(raw) + bytes(header.length - 4)
+
+
+def skip_id3v2(data):
+    """Offset of the first byte after a leading ID3v2 tag (0 if there is none)."""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def read_frames(data):
+    """
+    Split MP3 bytes into (FrameHeader, frame bytes) pairs, skipping ID3 tags
+    and the Xing/Info header frame written by encoders.
+    """
+    frames = []
+    position = skip_id3v2(data)
+    while position + 4 <= len(data):
+        if data[position:position + 3] in (b'TAG', b'APE'):
+            # ID3v1 / APE tag at the end of the file
+            break
+        try:
+            header = FrameHeader(data[position:position + 4])
+        except ValueError:
+            if frames:
+                raise ValueError(f'Corrupt MP3 frame at byte {position}')
+            # Junk before the first frame: resynchronize
+            position += 1
+            continue
+        frame = data[position:position + header.length]
+        if len(frame) < header.length:
+            break  # Truncated last frame
+        tag_at = 4 + (2 if header.protected else 0) + header.side_info_length
+        if not frames and frame[tag_at:tag_at + 4] in (b'Xing', b'Info'):
+            position += header.length
+            continue
+        frames.append((header, frame))
+        position += header.length
+    if not frames:
+        raise ValueError('No MP3 frames found')
+    return frames
+
+
+def build_sprite(sources, gap_seconds=DEFAULT_GAP_SECONDS):
+    """
+    Join MP3 files into one sprite. `sources` maps cue name -> MP3 bytes (in
+    playback order). Returns (sprite bytes, {name: {'offset', 'duration'}})
+    with times in seconds. All files must share one sample rate and channel mode.
+    """
+    chunks = []
+    cues = {}
+    reference = None
+    samples = 0
+    for name, data in sources.items():
+        frames = read_frames(data)
+        header = frames[0][0]
+        if reference is None:
+            reference = header
+        elif (header.sample_rate, header.mono) != (reference.sample_rate, reference.mono):
+            raise ValueError(f'{name}: sample rate/channels differ from the other cues')
+
+        if chunks and gap_seconds > 0:
+            gap_frames = math.ceil(gap_seconds * reference.sample_rate / reference.samples)
+            chunks.append(reference.silent_frame() * gap_frames)
+            samples += gap_frames * reference.samples
+
+        cue_samples = sum(frame_header.samples for frame_header, _ in frames)
+        cues[name] = {
+            'offset': round(samples / reference.sample_rate, 4),
+            'duration': round(cue_samples / reference.sample_rate, 4),
+        }
+        chunks.extend(frame for _, frame in frames)
+        samples += cue_samples
+    return b''.join(chunks), cues
+
+
+def cue_sort_key(path):
+    """Phase cues first, then counts in numeric order."""
+    match = re.fullmatch(r'count_(\d+)', path.stem)
+    return (1, int(match.group(1)), '') if match else (0, 0, path.stem)
+
+
+def find_cue_files(audio_dir):
+    """Cue MP3 files written by generate_audio, in sprite order."""
+    audio_dir = Path(audio_dir)
+    paths = list(audio_dir.glob('phase_*.mp3')) + list(audio_dir.glob('count_*.mp3'))
+    return sorted(paths, key=cue_sort_key)
+
+
+def write_sprite(audio_dir, gap_seconds=DEFAULT_GAP_SECONDS):
+    """
+    Build the sprite from the cue files in `audio_dir` and write it with its
+    manifest, removing sprites of earlier builds. Returns the manifest.
+    """
+    audio_dir = Path(audio_dir)
+    paths = find_cue_files(audio_dir)
+    if not paths:
+        raise ValueError(f'No cue files (phase_*.mp3, count_*.mp3) in {audio_dir}')
+
+    sprite, cues = build_sprite(
+        {path.stem: path.read_bytes() for path in paths},
+        gap_seconds=gap_seconds
+    )
+    digest = hashlib.sha256(sprite).hexdigest()[:12]
+    filename = f'{SPRITE_PREFIX}.{digest}.mp3'
+
+    for old in audio_dir.glob(f'{SPRITE_PREFIX}.*.mp3'):
+        if old.name != filename:
+            old.unlink()
+    (audio_dir / filename).write_bytes(sprite)
+
+    manifest = {'file': filename, 'cues': cues}
+    (audio_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2) + '\n', encoding='utf-8')
+    return manifest
+
+
+_manifest_cache = {}
+
+
+def get_sprite_manifest():
+    """
+    The sprite manifest with the sprite's static URL added, or None if no
+    sprite has been built. Re-read only when the manifest file changes.
+    """
+    path = finders.find(f'{STATIC_DIR}/{MANIFEST_NAME}')
+    if path is None and settings.STATIC_ROOT:
+        candidate = Path(settings.STATIC_ROOT) / STATIC_DIR / MANIFEST_NAME
+        path = str(candidate) if candidate.exists() else None
+    if path is None:
+        return None
+
+    mtime = Path(path).stat().st_mtime
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['url'] = static(f'{STATIC_DIR}/{manifest["file"]}')
+        cached = _manifest_cache[path] = (mtime, manifest)
+    return cached[1]
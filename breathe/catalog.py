@@ -0,0 +1,157 @@
+"""
+In-memory snapshot of the breathing catalog (categories and techniques).
+
+The catalog is tiny (6 categories, 18 techniques) and changes only when
+`load_breathing_data` runs or an admin edits it, so each process loads it
+once into compact read-only records and serves catalog pages without
+touching the database.
+
+Changes are detected through a version stamp in the shared cache: saving or
+deleting a category/technique bumps it (see breathe.signals), and the next
+`get_catalog()` call in every process sees the new stamp and swaps in a
+freshly loaded snapshot. The stamp is the time of the last change, which also
+serves as the catalog's Last-Modified time.
+"""
+
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import BreathingCategory, BreathingTechnique
+
+CATALOG_VERSION_KEY = 'breathe:catalog:version'
+
+
+class CategoryRecord:
+    """Read-only copy of a BreathingCategory with its techniques."""
+
+    __slots__ = ('id', 'name', 'name_ru', 'description_ru', 'order', 'techniques')
+
+    def __init__(self, category):
+        self.id = category.id
+        self.name = category.name
+        self.name_ru = category.name_ru
+        self.description_ru = category.description_ru
+        self.order = category.order
+        self.techniques = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name_ru
+
+
+class TechniqueRecord:
+    """Read-only copy of a BreathingTechnique, linked to its CategoryRecord."""
+
+    __slots__ = (
+        'id', 'category', 'name_ru', 'inhale', 'hold_start', 'exhale', 'hold_end',
+        'recommended_time_min', 'posture_ru', 'breath_origin', 'instructions_ru',
+        'use_sound_cue', 'use_haptic_cue',
+    )
+
+    def __init__(self, technique, category):
+        self.id = technique.id
+        self.category = category
+        self.name_ru = technique.name_ru
+        self.inhale = technique.inhale
+        self.hold_start = technique.hold_start
+        self.exhale = technique.exhale
+        self.hold_end = technique.hold_end
+        self.recommended_time_min = technique.recommended_time_min
+        self.posture_ru = technique.posture_ru
+        self.breath_origin = technique.breath_origin
+        self.instructions_ru = technique.instructions_ru
+        self.use_sound_cue = technique.use_sound_cue
+        self.use_haptic_cue = technique.use_haptic_cue
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def category_id(self):
+        return self.category.id
+
+    @property
+    def cycle_duration_seconds(self):
+        """Calculate total duration of one breathing cycle in seconds."""
+        return self.inhale + self.hold_start + self.exhale + self.hold_end
+
+    def __str__(self):
+        return self.name_ru
+
+
+class CatalogSnapshot:
+    """All categories and techniques at one catalog version, indexed by id."""
+
+    __slots__ = ('version', 'categories', 'categories_by_id', 'techniques_by_id')
+
+    def __init__(self, version, categories, techniques):
+        self.version = version
+        self.categories = tuple(categories)
+        self.categories_by_id = {category.id: category for category in self.categories}
+        self.techniques_by_id = {technique.id: technique for technique in techniques}
+
+    def get_category(self, category_id):
+        return self.categories_by_id.get(category_id)
+
+    def get_technique(self, technique_id):
+        return self.techniques_by_id.get(technique_id)
+
+
+def load_catalog(version):
+    """Build a snapshot from the database (two queries)."""
+    categories = [
+        CategoryRecord(category)
+        for category in BreathingCategory.objects.all().order_by('pk')
+    ]
+    by_id = {category.id: category for category in categories}
+
+    techniques = []
+    grouped = {category.id: [] for category in categories}
+    for technique in BreathingTechnique.objects.all().order_by('category', 'id'):
+        record = TechniqueRecord(technique, by_id[technique.category_id])
+        techniques.append(record)
+        grouped[technique.category_id].append(record)
+    for category in categories:
+        category.techniques = tuple(grouped[category.id])
+
+    return CatalogSnapshot(version, categories, techniques)
+
+
+def get_catalog_version():
+    """Current catalog version stamp (time of the last change) from the shared cache."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # First use or cache cleared: start a version that every process agrees on
+        cache.add(CATALOG_VERSION_KEY, time.time(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Mark the catalog as changed so every process reloads its snapshot."""
+    cache.set(CATALOG_VERSION_KEY, time.time(), timeout=None)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_catalog():
+    """Return the current CatalogSnapshot, reloading it if the version changed."""
+    global _snapshot
+    version = get_catalog_version()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != version:
+        with _snapshot_lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = load_catalog(version)
+                # Single reference assignment: readers see either the old or the new snapshot
+                _snapshot = snapshot
+    return snapshot
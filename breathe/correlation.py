@@ -0,0 +1,201 @@
+"""
+Correlation of breathing sessions with activity taps (RESIST, SMOKED, SPORT).
+
+Answers the questions from docs/BREATHING_SESSION_HISTORY.md for one user:
+are taps of a type more likely within a window after a session of a given
+technique, and how often is a tap (e.g. SMOKED) preceded by a session?
+
+The user's BreathingSession.started_at and ActivityLog.timestamp values are
+loaded once with values_list into sorted NumPy arrays of epoch seconds, and
+the windowed as-of joins are done with searchsorted, so the cost is
+O((sessions + taps) log n) instead of comparing every session with every tap.
+
+For technique T, activity type A and window W:
+
+- after_session: share of T sessions followed by an A tap within W
+  (`rate`), against the share of all moments in the observed period that
+  are followed by an A tap within W (`baseline`); `lift` = rate / baseline
+- before_activity: share of A taps preceded by a T session within W, against
+  the share of the period that lies within W after a T session
+
+A lift above 1 means the two go together more often than chance.
+
+Archived sessions and taps (see archive.segments) are included. Results are
+cached per user and window, keyed by the row count and highest id of both
+tables, so new sessions or taps, and archiving, invalidate them.
+"""
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from archive.query import archived_rows, union_rows
+from tracker.models import ActivityLog
+
+from .catalog import get_catalog
+from .models import BreathingSession
+
+DEFAULT_WINDOW_MINUTES = 60
+
+CACHE_TIMEOUT = 24 * 60 * 60
+
+ACTIVITY_TYPES = [activity_type for activity_type, _ in ActivityLog.ACTIVITY_CHOICES]
+
+
+def epoch_seconds(moments, count):
+    """Sorted datetimes -> float64 array of Unix timestamps."""
+    return np.fromiter((moment.timestamp() for moment in moments), dtype=np.float64, count=count)
+
+
+def load_rows(model, user, time_field, field):
+    """The user's live and archived (id, time, `field`) rows, oldest first."""
+    live = model.objects.filter(user=user).order_by(time_field, 'id').values('id', time_field, field)
+    archived = (
+        {'id': row['id'], time_field: row[time_field], field: row[field]}
+        for row in archived_rows(model, user_id=user.pk)
+    )
+    return list(union_rows(model, live.iterator(), archived))
+
+
+def load_sessions(user):
+    """(started_at seconds, technique ids) of the user's sessions, oldest first."""
+    rows = load_rows(BreathingSession, user, 'started_at', 'technique_id')
+    started = epoch_seconds((row['started_at'] for row in rows), len(rows))
+    techniques = np.fromiter((row['technique_id'] for row in rows), dtype=np.int64, count=len(rows))
+    return started, techniques
+
+
+def load_activities(user):
+    """Activity type -> sorted array of the user's tap timestamps in seconds."""
+    rows = load_rows(ActivityLog, user, 'timestamp', 'activity_type')
+    timestamps = epoch_seconds((row['timestamp'] for row in rows), len(rows))
+    types = np.array([row['activity_type'] for row in rows], dtype=object)
+    return {activity_type: timestamps[types == activity_type] for activity_type in ACTIVITY_TYPES}
+
+
+def followed_within(starts, events, window):
+    """For each start (sorted or not), whether an event falls in [start, start + window]."""
+    if len(events) == 0:
+        return np.zeros(len(starts), dtype=bool)
+    index = np.searchsorted(events, starts, side='left')
+    found = index < len(events)
+    gap = np.full(len(starts), np.inf)
+    gap[found] = events[index[found]] - starts[found]
+    return gap <= window
+
+
+def preceded_within(events, starts, window):
+    """For each event, whether a start falls in [event - window, event]; `starts` sorted."""
+    if len(starts) == 0:
+        return np.zeros(len(events), dtype=bool)
+    index = np.searchsorted(starts, events, side='right') - 1
+    found = index >= 0
+    gap = np.full(len(events), np.inf)
+    gap[found] = events[found] - starts[index[found]]
+    return gap <= window
+
+
+def covered_share(points, window, span_start, span_end, forward):
+    """
+    Share of [span_start, span_end] lying within `window` after (forward) or
+    before each of the sorted `points`: the union of those intervals, clipped
+    to the span, over the span length.
+    """
+    span = span_end - span_start
+    if len(points) == 0 or span <= 0:
+        return 0.0
+    covered = window + np.minimum(np.diff(points), window).sum()
+    if forward:
+        covered -= max(0.0, points[-1] + window - span_end)
+    else:
+        covered -= max(0.0, span_start - (points[0] - window))
+    return float(min(covered / span, 1.0))
+
+
+def rate_entry(hits, total, baseline):
+    rate = hits / total if total else None
+    return {
+        'rate': round(rate, 4) if rate is not None else None,
+        'baseline': round(baseline, 4),
+        'lift': round(rate / baseline, 3) if rate is not None and baseline > 0 else None,
+    }
+
+
+def technique_correlation(started, activities, window, span_start, span_end):
+    """after_session/before_activity entries for one group of sessions (`started` sorted)."""
+    after_session = {}
+    before_activity = {}
+    session_coverage = covered_share(started, window, span_start, span_end, forward=True)
+    for activity_type, events in activities.items():
+        after_session[activity_type] = rate_entry(
+            int(followed_within(started, events, window).sum()),
+            len(started),
+            covered_share(events, window, span_start, span_end, forward=False),
+        )
+        before_activity[activity_type] = rate_entry(
+            int(preceded_within(events, started, window).sum()),
+            len(events),
+            session_coverage,
+        )
+    return after_session, before_activity
+
+
+def compute_correlation(user, window_minutes=DEFAULT_WINDOW_MINUTES):
+    """Correlation report for `user` (see the module docstring); not cached."""
+    window = window_minutes * 60
+    started, technique_ids = load_sessions(user)
+    activities = load_activities(user)
+
+    report = {
+        'user_id': user.pk,
+        'window_minutes': window_minutes,
+        'sessions': len(started),
+        'activities': {activity_type: len(events) for activity_type, events in activities.items()},
+        'span_days': 0,
+        'techniques': [],
+    }
+    if not len(started):
+        return report
+    arrays = [array for array in (started, *activities.values()) if len(array)]
+    span_start = float(min(array[0] for array in arrays))
+    span_end = float(max(array[-1] for array in arrays))
+    report['span_days'] = round((span_end - span_start) / 86400, 1)
+
+    catalog = get_catalog()
+    groups = [(None, started)]
+    # started is sorted, so every technique's subset is sorted too
+    for technique_id in np.unique(technique_ids):
+        groups.append((int(technique_id), started[technique_ids == technique_id]))
+
+    for technique_id, group in groups:
+        after_session, before_activity = technique_correlation(
+            group, activities, window, span_start, span_end
+        )
+        technique = catalog.get_technique(technique_id) if technique_id is not None else None
+        report['techniques'].append({
+            'technique_id': technique_id,
+            'name_ru': technique.name_ru if technique else None,
+            'sessions': len(group),
+            'after_session': after_session,
+            'before_activity': before_activity,
+        })
+    return report
+
+
+def data_version(user):
+    """Row count and highest id of the user's sessions and taps."""
+    parts = []
+    for queryset in (BreathingSession.objects.filter(user=user), ActivityLog.objects.filter(user=user)):
+        stats = queryset.aggregate(count=Count('id'), last=Max('id'))
+        parts.append(f'{stats["count"]}-{stats["last"] or 0}')
+    return ':'.join(parts)
+
+
+def get_correlation(user, window_minutes=DEFAULT_WINDOW_MINUTES, refresh=False):
+    """Cached correlation report for `user`; recomputed when their sessions or taps change."""
+    key = f'breathe:correlation:{user.pk}:{window_minutes}:{data_version(user)}'
+    report = None if refresh else cache.get(key)
+    if report is None:
+        report = compute_correlation(user, window_minutes)
+        cache.set(key, report, timeout=CACHE_TIMEOUT)
+    return report
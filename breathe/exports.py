@@ -0,0 +1,61 @@
+"""Row sources for exporting BreathingSession (see breathing.exports for encoding)."""
+
+from django.contrib.auth.models import User
+
+from archive.query import archived_rows, union_rows
+from breathing.exports import CHUNK_SIZE
+
+from .catalog import get_catalog
+from .models import BreathingSession
+
+SESSION_EXPORT_FIELDS = [
+    'id', 'username', 'technique_id', 'technique', 'category',
+    'started_at', 'completed_at', 'duration_seconds', 'completed',
+    'cycles_completed', 'sound_enabled', 'vibration_enabled',
+]
+
+
+def archived_session_rows(user=None, start=None, end=None):
+    """
+    Archived BreathingSession rows (see archive.query) in the export row
+    shape; technique and category names come from the catalog snapshot.
+    """
+    catalog = get_catalog()
+    usernames = None
+    for row in archived_rows(BreathingSession, user_id=user.pk if user else None, start=start, end=end):
+        if usernames is None:
+            usernames = {user.pk: user.username} if user else dict(User.objects.values_list('id', 'username'))
+        technique = catalog.get_technique(row['technique_id'])
+        category = catalog.get_category(technique.category_id) if technique else None
+        row = {
+            **row,
+            'username': usernames.get(row['user_id']),
+            'technique': technique.name_ru if technique else None,
+            'category': category.name_ru if category else None,
+        }
+        yield {field: row[field] for field in SESSION_EXPORT_FIELDS}
+
+
+def session_export_rows(user=None, start=None, end=None):
+    """
+    Yield BreathingSession rows as dicts joined to technique and category
+    names, oldest first, optionally limited to one user and a [start, end)
+    started_at range. Rows are streamed from the database in chunks and
+    merged with archived rows.
+    """
+    sessions = BreathingSession.objects.all()
+    if user is not None:
+        sessions = sessions.filter(user=user)
+    if start is not None:
+        sessions = sessions.filter(started_at__gte=start)
+    if end is not None:
+        sessions = sessions.filter(started_at__lt=end)
+
+    values = sessions.order_by('started_at', 'id').values_list(
+        'id', 'user__username', 'technique_id', 'technique__name_ru',
+        'technique__category__name_ru', 'started_at', 'completed_at',
+        'duration_seconds', 'completed', 'cycles_completed',
+        'sound_enabled', 'vibration_enabled',
+    )
+    live = (dict(zip(SESSION_EXPORT_FIELDS, row)) for row in values.iterator(chunk_size=CHUNK_SIZE))
+    yield from union_rows(BreathingSession, live, archived_session_rows(user, start, end))
@@ -0,0 +1,38 @@
+"""
+Django management command to write the offline precache manifest of the breathing guide.
+
+Resolves the static files the guide needs (stylesheets, breathing-guide.js,
+the audio sprite or cue files) to their hashed URLs with a content revision
+and writes STATIC_ROOT/precache.json, which the service worker at
+/breathe/sw.js precaches (see breathe.precache). Run it right after
+collectstatic, so the hashed names are known.
+
+Usage:
+    python manage.py collectstatic --noinput && python manage.py build_precache
+    python manage.py build_precache --static-root /tmp/staticfiles
+"""
+
+from django.core.management.base import BaseCommand
+from breathe.precache import write_manifest
+
+
+class Command(BaseCommand):
+    help = 'Write the precache manifest used by the breathing guide service worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--static-root',
+            type=str,
+            default=None,
+            help='Directory to write precache.json to (default: STATIC_ROOT)',
+        )
+
+    def handle(self, *args, **options):
+        path, manifest = write_manifest(options['static_root'])
+        for asset in manifest['assets']:
+            self.stdout.write(f'  ✓ {asset["url"]} ({asset["revision"]})')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'\n✓ Wrote {path} with {len(manifest["assets"])} asset(s), version {manifest["version"]}'
+            )
+        )
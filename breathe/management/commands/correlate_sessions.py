@@ -0,0 +1,89 @@
+"""
+Django management command to correlate breathing sessions with activity taps.
+
+For every technique the user practised, reports how often RESIST, SMOKED and
+SPORT taps follow a session within the window, and how often those taps are
+preceded by a session, each with the rate expected by chance and the lift
+(see breathe.correlation). Results are cached until the user's sessions or
+taps change.
+
+Usage:
+    python manage.py correlate_sessions --user admin
+    python manage.py correlate_sessions --user admin --window 30
+    python manage.py correlate_sessions --user admin --json --refresh
+"""
+
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from breathe.correlation import DEFAULT_WINDOW_MINUTES, get_correlation
+
+
+class Command(BaseCommand):
+    help = 'Correlate breathing sessions with activity taps per technique'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            required=True,
+            help='Username to analyse',
+        )
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=DEFAULT_WINDOW_MINUTES,
+            help=f'Window in minutes between a session and a tap (default: {DEFAULT_WINDOW_MINUTES})',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the report as JSON',
+        )
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Recompute even if a cached report exists',
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f'User not found: {options["user"]}')
+        if options['window'] <= 0:
+            raise CommandError('--window must be positive')
+
+        report = get_correlation(user, options['window'], refresh=options['refresh'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(self.style.SUCCESS(f'Sessions vs. activity for {user.username}'))
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(
+            f'  Window: {report["window_minutes"]} min, period: {report["span_days"]} days, '
+            f'sessions: {report["sessions"]}, taps: '
+            + ', '.join(f'{activity_type} {count}' for activity_type, count in report['activities'].items())
+        )
+        if not report['techniques']:
+            self.stdout.write(self.style.WARNING('\nNo breathing sessions to analyse'))
+            return
+
+        for entry in report['techniques']:
+            name = entry['name_ru'] or ('All techniques' if entry['technique_id'] is None else f'#{entry["technique_id"]}')
+            self.stdout.write(self.style.SUCCESS(f'\n{name} ({entry["sessions"]} sessions)'))
+            for activity_type, after in entry['after_session'].items():
+                before = entry['before_activity'][activity_type]
+                self.stdout.write(
+                    f'  {activity_type:<7} after session: {self._format(after)}'
+                    f' | preceded by session: {self._format(before)}'
+                )
+
+    def _format(self, entry):
+        if entry['rate'] is None:
+            return 'n/a'
+        lift = f'{entry["lift"]:.2f}x' if entry['lift'] is not None else 'n/a'
+        return f'{entry["rate"]:.0%} (chance {entry["baseline"]:.0%}, lift {lift})'
@@ -0,0 +1,51 @@
+"""
+Django management command to export BreathingSession rows as NDJSON or CSV.
+
+Rows are streamed from the database in chunks, so memory use does not grow
+with the size of the table.
+
+Usage:
+    python manage.py export_sessions --output sessions.ndjson
+    python manage.py export_sessions --format csv --gzip --output sessions.csv.gz
+    python manage.py export_sessions --user admin --start 2025-01-01 --end 2025-01-31
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from breathing.exports import add_export_arguments, export_chunks, parse_date_range, write_chunks
+from breathe.exports import SESSION_EXPORT_FIELDS, session_export_rows
+
+
+class Command(BaseCommand):
+    help = 'Export BreathingSession rows as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        add_export_arguments(parser)
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User not found: {options["user"]}')
+
+        try:
+            start, end = parse_date_range(options['start'], options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks = export_chunks(
+            session_export_rows(user=user, start=start, end=end),
+            SESSION_EXPORT_FIELDS,
+            options['format'],
+            options['gzip'],
+        )
+        written = write_chunks(chunks, options['output'], sys.stdout)
+
+        if options['output'] != '-':
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Wrote {written} bytes to {options["output"]}')
+            )
@@ -0,0 +1,23 @@
+"""
+Django management command to write cached breathing session progress to the database.
+
+Heartbeats of running sessions are coalesced in the SESSION_PROGRESS_CACHE
+cache (see breathe.sessions); this writes the latest cycle count of sessions
+that are still open, e.g. because the tab was closed mid-session. Run it
+periodically (e.g. from cron every few minutes). It only sees progress kept
+in a cache shared between processes (Redis/Memcached/database).
+
+Usage:
+    python manage.py flush_session_progress
+"""
+
+from django.core.management.base import BaseCommand
+from breathe.sessions import flush_open_sessions
+
+
+class Command(BaseCommand):
+    help = 'Write coalesced progress of open breathing sessions to the database'
+
+    def handle(self, *args, **options):
+        flushed = flush_open_sessions()
+        self.stdout.write(self.style.SUCCESS(f'✓ Flushed progress of {flushed} open session(s)'))
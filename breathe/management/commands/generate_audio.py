@@ -1,30 +1,47 @@
 """
 Django management command to generate TTS audio files for breathing techniques.
 
-This command generates all required Russian audio files using gTTS:
+This command generates all required Russian audio files:
 - Phase cues: inhale, exhale, hold
-- Number counts: 1-10
+- Number counts: 1-10 (or up to --max-count)
+
+Phrases are synthesized in parallel, and only when the phrase, provider,
+voice or speed changed since the last run (tracked in tts-manifest.json in
+the output directory), so re-running it is cheap.
 
 Usage:
     python manage.py generate_audio
+    python manage.py generate_audio --max-count 20  # Only counts 11-20 are new
+    python manage.py generate_audio --provider google_cloud --voice ru-RU-Wavenet-D
+    python manage.py generate_audio --sprite  # Join existing cue files into one sprite
 """
 
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from pathlib import Path
-import os
+from breathe.audio import DEFAULT_GAP_SECONDS, MANIFEST_NAME as SPRITE_MANIFEST_NAME, write_sprite
+from breathe.tts import (
+    DEFAULT_MAX_COUNT, PROVIDERS, ProviderUnavailable, cue_phrases, generate_phrases, get_provider,
+)
 
 
 class Command(BaseCommand):
-    help = 'Generate TTS audio files for breathing techniques using gTTS'
+    help = 'Generate TTS audio files for breathing techniques'
 
     def add_arguments(self, parser):
         parser.add_argument(
             '--provider',
             type=str,
-            default='gtts',
-            choices=['gtts', 'google_cloud'],
-            help='TTS provider to use (default: gtts)',
+            default=settings.TTS_PROVIDER,
+            choices=sorted(PROVIDERS),
+            help=f'TTS provider to use (default: TTS_PROVIDER setting, {settings.TTS_PROVIDER}); '
+                 "'local' writes silent placeholders without network access",
+        )
+        parser.add_argument(
+            '--voice',
+            type=str,
+            default=None,
+            help='Provider voice name (google_cloud only, default: ru-RU-Wavenet-A)',
         )
         parser.add_argument(
             '--output-dir',
@@ -37,11 +54,38 @@ class Command(BaseCommand):
             action='store_true',
             help='Use slow speech (default: False)',
         )
+        parser.add_argument(
+            '--max-count',
+            type=int,
+            default=DEFAULT_MAX_COUNT,
+            help=f'Generate number counts 1..N (default: {DEFAULT_MAX_COUNT})',
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=4,
+            help='Phrases synthesized in parallel (default: 4)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate every phrase, even if it is up to date',
+        )
+        parser.add_argument(
+            '--sprite',
+            action='store_true',
+            help='Do not call TTS; join the existing cue files into a single '
+                 'content-hashed sprite with a cues.json manifest',
+        )
+        parser.add_argument(
+            '--gap',
+            type=float,
+            default=DEFAULT_GAP_SECONDS,
+            help=f'Seconds of silence between cues in the sprite (default: {DEFAULT_GAP_SECONDS})',
+        )
 
     def handle(self, *args, **options):
-        provider = options['provider']
         output_dir = options['output_dir']
-        slow = options['slow']
 
         # Determine output directory
         if output_dir:
@@ -49,121 +93,69 @@ class Command(BaseCommand):
         else:
             audio_dir = Path(settings.BASE_DIR) / 'static' / 'audio' / 'ru'
 
-        # Create output directory if it doesn't exist
-        audio_dir.mkdir(parents=True, exist_ok=True)
+        if options['sprite']:
+            self._build_sprite(audio_dir, options['gap'])
+            return
+
         self.stdout.write(f'Output directory: {audio_dir}')
 
-        # Check if gTTS is available
-        if provider == 'gtts':
-            try:
-                from gtts import gTTS
-            except ImportError:
-                self.stdout.write(
-                    self.style.ERROR(
-                        'gTTS is not installed. Install it with: pip install gTTS'
-                    )
-                )
-                return
-
-        # Define audio files to generate
-        phase_cues = {
-            'phase_inhale': 'Вдох',
-            'phase_exhale': 'Выдох',
-            'phase_hold': 'Задержка',
-        }
-
-        number_counts = {
-            1: 'Один',
-            2: 'Два',
-            3: 'Три',
-            4: 'Четыре',
-            5: 'Пять',
-            6: 'Шесть',
-            7: 'Семь',
-            8: 'Восемь',
-            9: 'Девять',
-            10: 'Десять',
-        }
-
-        total_files = len(phase_cues) + len(number_counts)
-        generated = 0
-        errors = []
-
-        # Generate phase cues
-        self.stdout.write(self.style.SUCCESS('\nGenerating phase cues...'))
-        for filename, text in phase_cues.items():
-            output_path = audio_dir / f'{filename}.mp3'
-            try:
-                if provider == 'gtts':
-                    self._generate_gtts(text, output_path, slow)
-                    generated += 1
-                    self.stdout.write(f'  ✓ {filename}.mp3 - "{text}"')
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'  ⚠ {filename}.mp3 - Google Cloud TTS not implemented yet'
-                        )
-                    )
-            except Exception as e:
-                error_msg = f'  ✗ {filename}.mp3 - Error: {str(e)}'
-                self.stdout.write(self.style.ERROR(error_msg))
-                errors.append(error_msg)
-
-        # Generate number counts
-        self.stdout.write(self.style.SUCCESS('\nGenerating number counts...'))
-        for num, text in number_counts.items():
-            filename = f'count_{num}'
-            output_path = audio_dir / f'{filename}.mp3'
-            try:
-                if provider == 'gtts':
-                    self._generate_gtts(text, output_path, slow)
-                    generated += 1
-                    self.stdout.write(f'  ✓ {filename}.mp3 - "{text}"')
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'  ⚠ {filename}.mp3 - Google Cloud TTS not implemented yet'
-                        )
-                    )
-            except Exception as e:
-                error_msg = f'  ✗ {filename}.mp3 - Error: {str(e)}'
-                self.stdout.write(self.style.ERROR(error_msg))
-                errors.append(error_msg)
+        try:
+            provider = get_provider(options['provider'], voice=options['voice'], slow=options['slow'])
+            phrases = cue_phrases(options['max_count'])
+        except (ProviderUnavailable, ValueError) as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+
+        def report(name, text, error):
+            if error is None:
+                self.stdout.write(f'  ✓ {name}.mp3 - "{text}"')
+            else:
+                self.stdout.write(self.style.ERROR(f'  ✗ {name}.mp3 - Error: {error}'))
+
+        self.stdout.write(self.style.SUCCESS(f'\nGenerating cues with {provider.name}...'))
+        generated, skipped, errors = generate_phrases(
+            provider,
+            phrases,
+            audio_dir,
+            jobs=options['jobs'],
+            force=options['force'],
+            on_result=report,
+        )
 
         # Summary
         self.stdout.write(self.style.SUCCESS(f'\n{"="*50}'))
-        self.stdout.write(self.style.SUCCESS(f'Summary:'))
-        self.stdout.write(f'  Total files: {total_files}')
-        self.stdout.write(f'  Generated: {generated}')
+        self.stdout.write(self.style.SUCCESS('Summary:'))
+        self.stdout.write(f'  Total files: {len(phrases)}')
+        self.stdout.write(f'  Generated: {len(generated)}')
+        self.stdout.write(f'  Up to date: {len(skipped)}')
         if errors:
             self.stdout.write(self.style.ERROR(f'  Errors: {len(errors)}'))
         else:
-            self.stdout.write(self.style.SUCCESS('  ✓ All files generated successfully!'))
+            self.stdout.write(self.style.SUCCESS('  ✓ All files are up to date!'))
         self.stdout.write(self.style.SUCCESS(f'{"="*50}'))
 
         if errors:
-            self.stdout.write(self.style.ERROR('\nErrors encountered:'))
-            for error in errors:
-                self.stdout.write(self.style.ERROR(f'  {error}'))
             return
 
+        # Keep an existing sprite in step with the cue files
+        if generated and (audio_dir / SPRITE_MANIFEST_NAME).exists():
+            self._build_sprite(audio_dir, options['gap'])
+        elif not (audio_dir / SPRITE_MANIFEST_NAME).exists():
+            self.stdout.write('Run with --sprite to build the audio sprite used by the guide.')
+
+    def _build_sprite(self, audio_dir, gap):
+        """Join the cue files in audio_dir into one sprite plus manifest."""
+        try:
+            manifest = write_sprite(audio_dir, gap_seconds=gap)
+        except (OSError, ValueError) as e:
+            self.stdout.write(self.style.ERROR(f'✗ Could not build sprite: {e}'))
+            return
+
+        for name, cue in manifest['cues'].items():
+            self.stdout.write(f'  ✓ {name}: {cue["offset"]:.3f}s (+{cue["duration"]:.3f}s)')
         self.stdout.write(
             self.style.SUCCESS(
-                f'\nAll audio files have been generated in: {audio_dir}'
+                f'\n✓ Wrote {audio_dir / manifest["file"]} with {len(manifest["cues"])} cue(s) '
+                f'and {audio_dir / SPRITE_MANIFEST_NAME}'
             )
         )
-
-    def _generate_gtts(self, text, output_path, slow=False):
-        """Generate audio file using gTTS."""
-        from gtts import gTTS
-
-        # Create gTTS object
-        tts = gTTS(text=text, lang='ru', slow=slow)
-
-        # Save to file
-        tts.save(str(output_path))
-
-        # Verify file was created
-        if not output_path.exists():
-            raise Exception(f'File was not created: {output_path}')
-
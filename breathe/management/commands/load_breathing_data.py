@@ -1,31 +1,42 @@
 """
-Django management command to load initial breathing categories and techniques.
+Django management command to sync breathing categories and techniques from the fixture.
 
-This command loads the fixture file containing:
+The fixture file contains:
 - 6 Breathing Categories
 - 18 Breathing Techniques
 
+The fixture is diffed against the database and new or changed rows are
+upserted in one transaction (see breathe.sync). A checksum of the fixture is
+stored, so runs with an unchanged fixture (e.g. every dyno start) return
+after a single query.
+
 Usage:
     python manage.py load_breathing_data
-    python manage.py load_breathing_data --clear  # Clear existing data first
+    python manage.py load_breathing_data --force  # Diff even if the fixture is unchanged
+    python manage.py load_breathing_data --prune  # Also delete unused rows missing from the fixture
 """
 
 from django.core.management.base import BaseCommand
-from django.core.management import call_command
-from django.core.management.color import no_style
+from django.db.models import Count
 from breathe.models import BreathingCategory, BreathingTechnique
+from breathe.sync import sync_catalog
 from pathlib import Path
-import os
 
 
 class Command(BaseCommand):
-    help = 'Load initial breathing categories and techniques from fixture file'
+    help = 'Sync breathing categories and techniques with the fixture file'
 
     def add_arguments(self, parser):
         parser.add_argument(
-            '--clear',
+            '--prune',
             action='store_true',
-            help='Clear existing categories and techniques before loading',
+            help='Delete categories and techniques missing from the fixture '
+                 '(techniques with recorded sessions are always kept)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Diff the fixture against the database even if its checksum is unchanged',
         )
         parser.add_argument(
             '--fixture',
@@ -35,7 +46,6 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        clear = options['clear']
         fixture_name = options['fixture']
 
         # Find fixture file
@@ -54,80 +64,16 @@ class Command(BaseCommand):
             )
             return
 
-        # Show current counts
-        categories_count = BreathingCategory.objects.count()
-        techniques_count = BreathingTechnique.objects.count()
-
-        self.stdout.write(self.style.SUCCESS('=' * 60))
-        self.stdout.write(self.style.SUCCESS('Loading Breathing Data'))
-        self.stdout.write(self.style.SUCCESS('=' * 60))
-        self.stdout.write(f'\nCurrent data:')
-        self.stdout.write(f'  Categories: {categories_count}')
-        self.stdout.write(f'  Techniques: {techniques_count}')
-
-        # Clear existing data if requested
-        if clear:
-            if categories_count > 0 or techniques_count > 0:
-                self.stdout.write(
-                    self.style.WARNING('\nClearing existing data...')
-                )
-                BreathingTechnique.objects.all().delete()
-                BreathingCategory.objects.all().delete()
-                self.stdout.write(
-                    self.style.SUCCESS('  ✓ Existing data cleared')
-                )
-            else:
-                self.stdout.write(
-                    self.style.SUCCESS('\nNo existing data to clear')
-                )
-
-        # Load fixture
-        self.stdout.write(
-            self.style.SUCCESS(f'\nLoading fixture: {fixture_name}')
-        )
-
         try:
-            # Use Django's loaddata command
-            call_command(
-                'loaddata',
-                fixture_name,
-                app_label='breathe',
-                verbosity=1,
-            )
-
-            # Verify what was loaded
-            new_categories_count = BreathingCategory.objects.count()
-            new_techniques_count = BreathingTechnique.objects.count()
-
-            categories_added = new_categories_count - categories_count
-            techniques_added = new_techniques_count - techniques_count
-
-            self.stdout.write(self.style.SUCCESS('\n' + '=' * 60))
-            self.stdout.write(self.style.SUCCESS('Summary:'))
-            self.stdout.write(f'  Categories loaded: {categories_added}')
-            self.stdout.write(f'  Techniques loaded: {techniques_added}')
-            self.stdout.write(f'\nTotal in database:')
-            self.stdout.write(f'  Categories: {new_categories_count}')
-            self.stdout.write(f'  Techniques: {new_techniques_count}')
-
-            # Show categories
-            if new_categories_count > 0:
-                self.stdout.write(self.style.SUCCESS('\nCategories:'))
-                for category in BreathingCategory.objects.all().order_by('pk'):
-                    technique_count = category.techniques.count()
-                    self.stdout.write(
-                        f'  {category.pk}. {category.name_ru} '
-                        f'({technique_count} technique{"s" if technique_count != 1 else ""})'
-                    )
-
-            self.stdout.write(self.style.SUCCESS('\n' + '=' * 60))
-            self.stdout.write(
-                self.style.SUCCESS('✓ Data loaded successfully!')
+            result = sync_catalog(
+                fixture_path,
+                prune=options['prune'],
+                # Pruning is asked for explicitly, so don't skip it for an unchanged fixture
+                force=options['force'] or options['prune'],
             )
-
         except Exception as e:
             self.stdout.write(
-                self.style.ERROR(f'\nError loading fixture: {str(e)}')
+                self.style.ERROR(f'\nError syncing fixture: {str(e)}')
             )
             self.stdout.write(
                 self.style.WARNING(
@@ -139,3 +85,37 @@ class Command(BaseCommand):
             )
             raise
 
+        if result.skipped:
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ {fixture_name} unchanged ({result.checksum[:12]}), nothing to sync')
+            )
+            return
+
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(self.style.SUCCESS(f'Synced fixture: {fixture_name}'))
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        for model in (BreathingCategory, BreathingTechnique):
+            counts = result.counts[model._meta.model_name]
+            self.stdout.write(
+                f'  {model._meta.verbose_name_plural}: {counts["created"]} created, '
+                f'{counts["updated"]} updated, {counts["unchanged"]} unchanged, '
+                f'{counts["pruned"]} pruned, {counts["kept"]} kept (not in fixture)'
+            )
+
+        # Show categories
+        categories = BreathingCategory.objects.annotate(
+            technique_count=Count('techniques')
+        ).order_by('pk')
+        if categories:
+            self.stdout.write(self.style.SUCCESS('\nCategories:'))
+            for category in categories:
+                technique_count = category.technique_count
+                self.stdout.write(
+                    f'  {category.pk}. {category.name_ru} '
+                    f'({technique_count} technique{"s" if technique_count != 1 else ""})'
+                )
+
+        self.stdout.write(self.style.SUCCESS('\n' + '=' * 60))
+        self.stdout.write(
+            self.style.SUCCESS('✓ Data synced successfully!')
+        )
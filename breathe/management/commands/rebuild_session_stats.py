@@ -0,0 +1,59 @@
+"""
+Django management command to rebuild or reconcile the breathing session summary tables.
+
+UserTechniqueStats and TechniqueStats are normally updated when a session is
+completed or cancelled (see breathe.analytics). This command recalculates
+them from BreathingSession, e.g. after the first deploy, after sessions were
+edited or deleted in the admin, or to verify that nothing has drifted.
+
+Usage:
+    python manage.py rebuild_session_stats
+    python manage.py rebuild_session_stats --check       # Report drift only
+    python manage.py rebuild_session_stats --user admin  # Single user (per-user table only)
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from breathe.analytics import rebuild_stats
+from breathe.models import TechniqueStats, UserTechniqueStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or reconcile breathing session summary tables from BreathingSession'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            default=None,
+            help='Only process the user with this username',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Report summary rows that differ from BreathingSession without changing them',
+        )
+
+    def handle(self, *args, **options):
+        username = options['user']
+        check_only = options['check']
+
+        targets = [(UserTechniqueStats, {}), (TechniqueStats, {})]
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f'User not found: {username}')
+            targets = [(UserTechniqueStats, {'user_id': user.pk})]
+
+        total = 0
+        for model, filters in targets:
+            rows = rebuild_stats(model, dry_run=check_only, **filters)
+            total += rows
+            self.stdout.write(f'  {model._meta.verbose_name_plural}: {rows} row(s) out of date')
+
+        if not total:
+            self.stdout.write(self.style.SUCCESS('✓ All session summaries are up to date'))
+        elif check_only:
+            self.stdout.write(self.style.WARNING(f'{total} summary row(s) out of date'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt {total} summary row(s)'))
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-17 06:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathe', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='breathingsession',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, help_text='Client-generated id for sessions sent through the batch API (used to drop retries)', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='breathingsession',
+            constraint=models.UniqueConstraint(fields=('user', 'client_uuid'), name='breathe_breathingsession_unique_client_uuid'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-17 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathe', '0002_breathingsession_client_uuid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogFixture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Fixture file name', max_length=200, unique=True)),
+                ('checksum', models.CharField(help_text='SHA-256 of the fixture file contents', max_length=64)),
+                ('synced_at', models.DateTimeField(auto_now=True, help_text='When the fixture was last synced')),
+            ],
+            options={
+                'verbose_name': 'Catalog Fixture',
+                'verbose_name_plural': 'Catalog Fixtures',
+            },
+        ),
+    ]
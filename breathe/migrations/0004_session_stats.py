@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-17 06:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathe', '0003_catalogfixture'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TechniqueStats',
+            fields=[
+                ('sessions', models.PositiveIntegerField(default=0, help_text='Finished sessions (completed + cancelled)')),
+                ('completed', models.PositiveIntegerField(default=0, help_text='Completed sessions')),
+                ('duration_seconds', models.PositiveBigIntegerField(default=0, help_text='Total duration of finished sessions in seconds')),
+                ('cycles_completed', models.PositiveBigIntegerField(default=0, help_text='Total breathing cycles of finished sessions')),
+                ('sound_sessions', models.PositiveIntegerField(default=0, help_text='Finished sessions with sound cues enabled')),
+                ('sound_completed', models.PositiveIntegerField(default=0, help_text='Completed sessions with sound cues enabled')),
+                ('vibration_sessions', models.PositiveIntegerField(default=0, help_text='Finished sessions with vibration cues enabled')),
+                ('vibration_completed', models.PositiveIntegerField(default=0, help_text='Completed sessions with vibration cues enabled')),
+                ('last_session_at', models.DateTimeField(blank=True, help_text='When the most recent finished session ended', null=True)),
+                ('technique', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='breathe.breathingtechnique')),
+            ],
+            options={
+                'verbose_name': 'Technique Stats',
+                'verbose_name_plural': 'Technique Stats',
+                'ordering': ['technique'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserTechniqueStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sessions', models.PositiveIntegerField(default=0, help_text='Finished sessions (completed + cancelled)')),
+                ('completed', models.PositiveIntegerField(default=0, help_text='Completed sessions')),
+                ('duration_seconds', models.PositiveBigIntegerField(default=0, help_text='Total duration of finished sessions in seconds')),
+                ('cycles_completed', models.PositiveBigIntegerField(default=0, help_text='Total breathing cycles of finished sessions')),
+                ('sound_sessions', models.PositiveIntegerField(default=0, help_text='Finished sessions with sound cues enabled')),
+                ('sound_completed', models.PositiveIntegerField(default=0, help_text='Completed sessions with sound cues enabled')),
+                ('vibration_sessions', models.PositiveIntegerField(default=0, help_text='Finished sessions with vibration cues enabled')),
+                ('vibration_completed', models.PositiveIntegerField(default=0, help_text='Completed sessions with vibration cues enabled')),
+                ('last_session_at', models.DateTimeField(blank=True, help_text='When the most recent finished session ended', null=True)),
+                ('technique', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_stats', to='breathe.breathingtechnique')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='technique_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Technique Stats',
+                'verbose_name_plural': 'User Technique Stats',
+                'ordering': ['user', 'technique'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'technique'), name='breathe_usertechniquestats_unique_user_technique')],
+            },
+        ),
+    ]
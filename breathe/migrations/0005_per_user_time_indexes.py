@@ -0,0 +1,38 @@
+# Generated by Django 6.0 on 2026-10-17 06:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathe', '0004_session_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Create the new indexes before dropping the ones they replace
+        migrations.AddIndex(
+            model_name='breathingsession',
+            index=models.Index(fields=['user', '-started_at'], include=('technique', 'id'), name='breathe_session_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='breathingsession',
+            index=models.Index(condition=models.Q(('completed_at__isnull', True)), fields=['started_at'], name='breathe_session_open_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='breathingsession',
+            name='breathe_bre_user_id_e79a79_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='breathingsession',
+            name='breathe_bre_techniq_3d9b1f_idx',
+        ),
+        migrations.AlterField(
+            model_name='breathingsession',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='User who performed the session', on_delete=django.db.models.deletion.CASCADE, related_name='breathing_sessions', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 06:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathe', '0005_per_user_time_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='breathingsession',
+            index=models.Index(fields=['user', 'technique', '-started_at'], name='breathe_session_user_tech_idx'),
+        ),
+    ]
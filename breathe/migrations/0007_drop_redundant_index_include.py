@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 07:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('breathe', '0006_history_technique_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='breathingsession',
+            name='breathe_session_user_start_idx',
+        ),
+        migrations.AddIndex(
+            model_name='breathingsession',
+            index=models.Index(fields=['user', '-started_at'], include=('technique',), name='breathe_session_user_start_idx'),
+        ),
+    ]
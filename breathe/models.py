@@ -116,6 +116,7 @@ class BreathingSession(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='breathing_sessions',
+        db_index=False,  # Leading column of breathe_session_user_start_idx
         help_text="User who performed the session"
     )
     technique = models.ForeignKey(
@@ -154,16 +155,43 @@ class BreathingSession(models.Model):
         default=True,
         help_text="Whether vibration cues were enabled"
     )
+    client_uuid = models.UUIDField(
+        blank=True,
+        null=True,
+        help_text="Client-generated id for sessions sent through the batch API (used to drop retries)"
+    )
     
     class Meta:
         verbose_name = "Breathing Session"
         verbose_name_plural = "Breathing Sessions"
         ordering = ['-started_at']
         indexes = [
-            models.Index(fields=['user']),
-            models.Index(fields=['technique']),
+            # A user's sessions newest first (history, exports, correlation, counts)
+            models.Index(
+                fields=['user', '-started_at'],
+                include=['technique'],
+                name='breathe_session_user_start_idx'
+            ),
+            # A user's sessions of one technique newest first (history filtered by technique)
+            models.Index(
+                fields=['user', 'technique', '-started_at'],
+                name='breathe_session_user_tech_idx'
+            ),
+            # Sessions still running (flush_session_progress); finished ones are left out
+            models.Index(
+                fields=['started_at'],
+                condition=models.Q(completed_at__isnull=True),
+                name='breathe_session_open_idx'
+            ),
+            # All users' sessions by time (admin changelist, full exports)
             models.Index(fields=['started_at']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'client_uuid'],
+                name='breathe_breathingsession_unique_client_uuid'
+            ),
+        ]
     
     def __str__(self):
         status = "Completed" if self.completed else "Cancelled"
@@ -175,3 +203,135 @@ class BreathingSession(models.Model):
             delta = self.completed_at - self.started_at
             self.duration_seconds = int(delta.total_seconds())
         super().save(*args, **kwargs)
+
+
+class CatalogFixture(models.Model):
+    """Checksum of the last fixture synced into the catalog by load_breathing_data."""
+    
+    name = models.CharField(
+        max_length=200,
+        unique=True,
+        help_text="Fixture file name"
+    )
+    checksum = models.CharField(
+        max_length=64,
+        help_text="SHA-256 of the fixture file contents"
+    )
+    synced_at = models.DateTimeField(
+        auto_now=True,
+        help_text="When the fixture was last synced"
+    )
+    
+    class Meta:
+        verbose_name = "Catalog Fixture"
+        verbose_name_plural = "Catalog Fixtures"
+    
+    def __str__(self):
+        return f"{self.name} ({self.checksum[:12]})"
+
+
+class SessionStats(models.Model):
+    """
+    Running totals of finished (completed or cancelled) breathing sessions.
+    Maintained incrementally by breathe.analytics when a session ends, so
+    analytics never aggregate the raw session table.
+    """
+    
+    # Counters added up when a session ends (see breathe.analytics)
+    STAT_FIELDS = (
+        'sessions', 'completed', 'duration_seconds', 'cycles_completed',
+        'sound_sessions', 'sound_completed', 'vibration_sessions', 'vibration_completed',
+    )
+    
+    sessions = models.PositiveIntegerField(
+        default=0,
+        help_text="Finished sessions (completed + cancelled)"
+    )
+    completed = models.PositiveIntegerField(
+        default=0,
+        help_text="Completed sessions"
+    )
+    duration_seconds = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Total duration of finished sessions in seconds"
+    )
+    cycles_completed = models.PositiveBigIntegerField(
+        default=0,
+        help_text="Total breathing cycles of finished sessions"
+    )
+    sound_sessions = models.PositiveIntegerField(
+        default=0,
+        help_text="Finished sessions with sound cues enabled"
+    )
+    sound_completed = models.PositiveIntegerField(
+        default=0,
+        help_text="Completed sessions with sound cues enabled"
+    )
+    vibration_sessions = models.PositiveIntegerField(
+        default=0,
+        help_text="Finished sessions with vibration cues enabled"
+    )
+    vibration_completed = models.PositiveIntegerField(
+        default=0,
+        help_text="Completed sessions with vibration cues enabled"
+    )
+    last_session_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text="When the most recent finished session ended"
+    )
+    
+    class Meta:
+        abstract = True
+
+
+class UserTechniqueStats(SessionStats):
+    """Session totals per user and technique (categories are summed from these rows)."""
+    
+    GROUP_BY = ('user', 'technique')
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='technique_stats'
+    )
+    technique = models.ForeignKey(
+        BreathingTechnique,
+        on_delete=models.CASCADE,
+        related_name='user_stats'
+    )
+    
+    class Meta:
+        verbose_name = "User Technique Stats"
+        verbose_name_plural = "User Technique Stats"
+        ordering = ['user', 'technique']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'technique'],
+                name='breathe_usertechniquestats_unique_user_technique'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.technique.name_ru}: {self.completed}/{self.sessions}"
+
+
+class TechniqueStats(SessionStats):
+    """Session totals per technique over all users."""
+    
+    GROUP_BY = ('technique',)
+    
+    technique = models.OneToOneField(
+        BreathingTechnique,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    
+    class Meta:
+        verbose_name = "Technique Stats"
+        verbose_name_plural = "Technique Stats"
+        ordering = ['technique']
+    
+    def __str__(self):
+        return f"{self.technique.name_ru}: {self.completed}/{self.sessions}"
@@ -0,0 +1,169 @@
+"""
+Offline precache manifest and service worker for the breathing guide.
+
+A cold start of the guide on a mobile connection refetches the stylesheets,
+breathing-guide.js, the voice cues and the catalog pages. The service worker
+served at /breathe/sw.js stores all of them in one versioned cache when it
+installs and answers later requests for them cache-first, so repeat visits
+and sessions running on a weak network need no round trips.
+
+The manifest has two parts:
+
+- static assets, resolved at build time by `build_precache` (run right after
+  `collectstatic`) to their hashed URLs plus a content revision, and written
+  to STATIC_ROOT/precache.json:
+
+      {"version": ..., "assets": [{"url": ..., "revision": ...}, ...]}
+
+- catalog page URLs (category list, technique lists, technique and guide
+  pages), taken from the in-memory catalog snapshot when sw.js is served, so
+  catalog edits reach clients without a rebuild.
+
+The cache name includes a version derived from both parts and the release
+(breathing.conditional.get_release_version). When an asset, the catalog or
+the deployed templates change, sw.js changes, the browser installs the new
+worker, and the worker drops the caches of earlier versions on activation.
+Catalog pages are HTML rendered by the current code, so the worker also
+refreshes them in the background whenever it serves one from the cache
+(stale-while-revalidate): a change no version covers reaches the client on
+its next visit.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.urls import reverse
+
+from breathing.conditional import get_release_version
+
+from .audio import STATIC_DIR as AUDIO_STATIC_DIR, find_cue_files, get_sprite_manifest
+from .catalog import get_catalog
+
+PRECACHE_NAME = 'precache.json'
+
+# Static files the guide pages load (base.html, guide.html)
+GUIDE_ASSETS = (
+    'css/base.css',
+    'css/guide.css',
+    'js/breathing-guide.js',
+)
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def find_static_file(name):
+    """Path of a static file in the source directories or STATIC_ROOT, or None."""
+    path = finders.find(name)
+    if path is None and settings.STATIC_ROOT:
+        candidate = Path(settings.STATIC_ROOT) / name
+        path = str(candidate) if candidate.exists() else None
+    return path
+
+
+def static_url(name):
+    """Hashed URL of a static file if the storage keeps a manifest, else the plain URL."""
+    try:
+        return staticfiles_storage.url(name)
+    except ValueError:
+        # Manifest storage without a manifest entry (collectstatic not run)
+        return settings.STATIC_URL + name
+
+
+def asset_entry(name, url=None):
+    """{'url', 'revision'} of a static file; the revision is a digest of its content."""
+    path = find_static_file(name)
+    if path is None:
+        return None
+    return {
+        'url': url or static_url(name),
+        'revision': _digest(Path(path).read_bytes()),
+    }
+
+
+def collect_assets():
+    """Precache entries of the static files the guide needs."""
+    entries = [asset_entry(name) for name in GUIDE_ASSETS]
+
+    sprite = get_sprite_manifest()
+    if sprite is not None:
+        entries.append(asset_entry(f'{AUDIO_STATIC_DIR}/{sprite["file"]}', url=sprite['url']))
+    else:
+        # Without a sprite the guide plays the individual cue files by their plain URL
+        audio_dir = find_static_file(AUDIO_STATIC_DIR)
+        if audio_dir is not None:
+            for path in find_cue_files(audio_dir):
+                name = f'{AUDIO_STATIC_DIR}/{path.name}'
+                entries.append(asset_entry(name, url=settings.STATIC_URL + name))
+
+    return [entry for entry in entries if entry is not None]
+
+
+def build_manifest():
+    """Static part of the precache manifest."""
+    assets = collect_assets()
+    version = _digest(json.dumps(assets, sort_keys=True).encode('utf-8'))
+    return {'version': version, 'assets': assets}
+
+
+def write_manifest(static_root=None):
+    """Write the static part to STATIC_ROOT/precache.json. Returns (path, manifest)."""
+    path = Path(static_root or settings.STATIC_ROOT) / PRECACHE_NAME
+    manifest = build_manifest()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(manifest, indent=2) + '\n', encoding='utf-8')
+    return path, manifest
+
+
+_manifest_cache = {}
+
+
+def load_manifest():
+    """
+    The static part written by `build_precache`, re-read only when the file
+    changes. Without a build (e.g. runserver) it is computed once per process.
+    """
+    path = Path(settings.STATIC_ROOT) / PRECACHE_NAME if settings.STATIC_ROOT else None
+    if path is None or not path.exists():
+        if 'built' not in _manifest_cache:
+            _manifest_cache['built'] = build_manifest()
+        return _manifest_cache['built']
+
+    mtime = path.stat().st_mtime
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, encoding='utf-8') as f:
+            cached = _manifest_cache[path] = (mtime, json.load(f))
+    return cached[1]
+
+
+def catalog_page_urls(catalog=None):
+    """URLs of every catalog page, in the order the user navigates them."""
+    catalog = catalog or get_catalog()
+    urls = [reverse('breathe:categories')]
+    for category in catalog.categories:
+        urls.append(reverse('breathe:techniques', args=[category.id]))
+    for category in catalog.categories:
+        for technique in category.techniques:
+            urls.append(reverse('breathe:technique', args=[technique.id]))
+            urls.append(reverse('breathe:guide', args=[technique.id]))
+    return urls
+
+
+def get_precache():
+    """
+    Full manifest embedded in sw.js: {'version', 'urls', 'pages'}, where
+    `pages` are the catalog page URLs among `urls`. The version changes
+    whenever a static asset, the catalog or the release changes.
+    """
+    manifest = load_manifest()
+    catalog = get_catalog()
+    version = _digest(f'{manifest["version"]}:{catalog.version}:{get_release_version()}'.encode('utf-8'))
+    pages = catalog_page_urls(catalog)
+    urls = [asset['url'] for asset in manifest['assets']] + pages
+    return {'version': version, 'urls': urls, 'pages': pages}
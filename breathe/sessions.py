@@ -0,0 +1,385 @@
+"""
+Write-coalescing progress tracking for breathing sessions.
+
+The guide sends an `update` heartbeat with `cycles_completed` after every
+breathing cycle. With settings.SESSION_PROGRESS_COALESCE enabled, heartbeats
+only update a progress record in the SESSION_PROGRESS_CACHE cache; the row is
+written when the session is completed or cancelled, and at most once per
+SESSION_PROGRESS_FLUSH_INTERVAL seconds while it runs. Sessions left open
+(tab closed mid-session) are flushed by the `flush_session_progress`
+command. Database writes therefore grow with the number of sessions, not
+with the number of heartbeats.
+
+Every write is a single-statement `.update()` of the changed columns.
+Completing or cancelling a session also adds it to the analytics summary
+tables (breathe.analytics) in the same transaction.
+
+Clients with poor connectivity can instead queue events locally and send
+them to the batch endpoint, which applies them with `apply_session_events`.
+"""
+
+import time
+import uuid
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .analytics import record_finished_sessions
+from .catalog import get_catalog
+from .models import BreathingSession
+from .timeline import get_timeline
+
+# Largest number of events accepted in one batch request
+SESSION_BATCH_MAX_EVENTS = 200
+
+SESSION_EVENT_TYPES = ('start', 'update', 'complete', 'cancel')
+
+
+def get_progress_cache():
+    return caches[settings.SESSION_PROGRESS_CACHE]
+
+
+def progress_key(session_id):
+    return f'breathe:session-progress:{session_id}'
+
+
+def new_progress(user_id, technique_id, started_at, cycles_completed=0,
+                 sound_enabled=True, vibration_enabled=True):
+    """Progress record kept in the cache while a session is open."""
+    return {
+        'user_id': user_id,
+        'technique_id': technique_id,
+        'started_at': started_at,
+        'sound_enabled': sound_enabled,
+        'vibration_enabled': vibration_enabled,
+        'cycles_completed': cycles_completed,
+        'flushed_cycles': cycles_completed,
+        'flushed_at': time.time(),
+    }
+
+
+def save_progress(session_id, record):
+    get_progress_cache().set(
+        progress_key(session_id),
+        record,
+        timeout=settings.SESSION_PROGRESS_TIMEOUT
+    )
+
+
+def load_progress(user, session_id):
+    """The session's progress record, read from the database if it is not cached; None if not found."""
+    record = get_progress_cache().get(progress_key(session_id))
+    if record is not None and record['user_id'] == user.pk and 'sound_enabled' in record:
+        return record
+    row = (
+        BreathingSession.objects.filter(pk=session_id, user=user)
+        .values('technique_id', 'started_at', 'cycles_completed', 'sound_enabled', 'vibration_enabled')
+        .first()
+    )
+    if row is None:
+        return None
+    return new_progress(
+        user.pk,
+        row['technique_id'],
+        row['started_at'],
+        row['cycles_completed'] or 0,
+        row['sound_enabled'],
+        row['vibration_enabled'],
+    )
+
+
+def start_progress(session):
+    save_progress(
+        session.pk,
+        new_progress(
+            session.user_id,
+            session.technique_id,
+            session.started_at,
+            sound_enabled=session.sound_enabled,
+            vibration_enabled=session.vibration_enabled,
+        )
+    )
+
+
+def clamp_cycles(technique_id, started_at, cycles_completed, at):
+    """
+    Limit reported cycles to what the technique's timeline allows for a
+    session that started at `started_at` and reports at `at`.
+    """
+    technique = get_catalog().get_technique(technique_id)
+    if technique is None:
+        return max(0, cycles_completed)
+    elapsed_seconds = (at - started_at).total_seconds()
+    return get_timeline(technique).clamp_cycles(cycles_completed, elapsed_seconds)
+
+
+def flush_progress(session_id, record):
+    """Write the record's cycle count to an open session row if it changed."""
+    if record['cycles_completed'] != record['flushed_cycles']:
+        BreathingSession.objects.filter(
+            pk=session_id,
+            completed_at__isnull=True
+        ).update(cycles_completed=record['cycles_completed'])
+        record['flushed_cycles'] = record['cycles_completed']
+    record['flushed_at'] = time.time()
+
+
+def record_heartbeat(user, session_id, cycles_completed):
+    """Record progress of an open session. Returns False if the session is not found."""
+    record = load_progress(user, session_id)
+    if record is None:
+        return False
+    cycles_completed = clamp_cycles(
+        record['technique_id'], record['started_at'], cycles_completed, timezone.now()
+    )
+
+    if not settings.SESSION_PROGRESS_COALESCE:
+        return BreathingSession.objects.filter(
+            pk=session_id,
+            user=user
+        ).update(cycles_completed=cycles_completed) > 0
+
+    record['cycles_completed'] = cycles_completed
+    if time.time() - record['flushed_at'] >= settings.SESSION_PROGRESS_FLUSH_INTERVAL:
+        flush_progress(session_id, record)
+    save_progress(session_id, record)
+    return True
+
+
+def finish_session(user, session_id, completed, cycles_completed):
+    """
+    Complete or cancel a session with one UPDATE and add it to the analytics
+    summaries. A session that has already ended is left as it is.
+    Returns duration_seconds, or None if the session is not found.
+    """
+    record = load_progress(user, session_id)
+    if record is None:
+        return None
+
+    completed_at = timezone.now()
+    duration_seconds = int((completed_at - record['started_at']).total_seconds())
+    cycles_completed = clamp_cycles(
+        record['technique_id'], record['started_at'], cycles_completed, completed_at
+    )
+    with transaction.atomic():
+        updated = BreathingSession.objects.filter(
+            pk=session_id,
+            user=user,
+            completed_at__isnull=True
+        ).update(
+            completed_at=completed_at,
+            completed=completed,
+            cycles_completed=cycles_completed,
+            duration_seconds=duration_seconds,
+        )
+        if updated:
+            record_finished_sessions([{
+                'user_id': user.pk,
+                'technique_id': record['technique_id'],
+                'completed': completed,
+                'completed_at': completed_at,
+                'duration_seconds': duration_seconds,
+                'cycles_completed': cycles_completed,
+                'sound_enabled': record['sound_enabled'],
+                'vibration_enabled': record['vibration_enabled'],
+            }])
+    get_progress_cache().delete(progress_key(session_id))
+    if updated:
+        return duration_seconds
+    # Already completed or cancelled (e.g. a retried request): report the stored duration
+    return BreathingSession.objects.filter(pk=session_id, user=user).values_list(
+        'duration_seconds', flat=True
+    ).first()
+
+
+def flush_open_sessions():
+    """
+    Write cached progress of every open session started within
+    SESSION_PROGRESS_TIMEOUT. Returns the number of sessions written.
+    """
+    cache = get_progress_cache()
+    since = timezone.now() - timedelta(seconds=settings.SESSION_PROGRESS_TIMEOUT)
+    session_ids = list(
+        BreathingSession.objects.filter(
+            completed_at__isnull=True,
+            started_at__gte=since
+        ).values_list('id', flat=True)
+    )
+    records = cache.get_many([progress_key(session_id) for session_id in session_ids])
+
+    flushed = 0
+    for session_id in session_ids:
+        record = records.get(progress_key(session_id))
+        if record is None or record['cycles_completed'] == record['flushed_cycles']:
+            continue
+        flush_progress(session_id, record)
+        save_progress(session_id, record)
+        flushed += 1
+    return flushed
+
+
+def parse_session_event(event, now):
+    """
+    Validate one event from the batch endpoint.
+    Returns a dict with type, session_uuid, timestamp and the event's fields,
+    or raises ValueError with a message.
+    """
+    if not isinstance(event, dict):
+        raise ValueError('Invalid event')
+
+    event_type = event.get('type')
+    if event_type not in SESSION_EVENT_TYPES:
+        raise ValueError('Invalid event type')
+
+    try:
+        session_uuid = uuid.UUID(str(event.get('session_uuid')))
+    except ValueError:
+        raise ValueError('Invalid session UUID')
+
+    timestamp = now
+    if event.get('timestamp'):
+        timestamp = parse_datetime(str(event['timestamp']))
+        if timestamp is None:
+            raise ValueError('Invalid timestamp')
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+        # Clock skew: an event can't have happened after the server received it
+        timestamp = min(timestamp, now)
+
+    parsed = {'type': event_type, 'session_uuid': session_uuid, 'timestamp': timestamp}
+    if event_type == 'start':
+        try:
+            parsed['technique_id'] = int(event.get('technique_id'))
+        except (TypeError, ValueError):
+            raise ValueError('Technique ID required')
+        parsed['sound_enabled'] = bool(event.get('sound_enabled', True))
+        parsed['vibration_enabled'] = bool(event.get('vibration_enabled', True))
+    else:
+        cycles_completed = event.get('cycles_completed', 0)
+        if not isinstance(cycles_completed, int) or isinstance(cycles_completed, bool) or cycles_completed < 0:
+            raise ValueError('Invalid cycles_completed')
+        parsed['cycles_completed'] = cycles_completed
+    return parsed
+
+
+def apply_session_events(user, events, now=None):
+    """
+    Apply an ordered list of session events in one transaction.
+
+    Sessions are identified by the client-generated session_uuid, so a retried
+    batch never creates a second row: a repeated start, or any event for a
+    session that has already ended, is reported as a duplicate. New sessions
+    are written with one bulk_create and changed ones with one bulk_update;
+    sessions ended by the batch are added to the analytics summaries.
+    May raise IntegrityError if a concurrent request created the same session.
+
+    Returns one result per event: {'index', 'event_id', 'session_uuid',
+    'status' ('applied', 'duplicate' or 'rejected'), 'session_id' or 'error'}.
+    """
+    now = now or timezone.now()
+    catalog = get_catalog()
+
+    results = []
+    parsed_events = []
+    for index, event in enumerate(events):
+        result = {
+            'index': index,
+            'event_id': event.get('event_id') if isinstance(event, dict) else None,
+        }
+        results.append(result)
+        try:
+            parsed = parse_session_event(event, now)
+        except ValueError as e:
+            result.update(status='rejected', error=str(e))
+            continue
+        result['session_uuid'] = str(parsed['session_uuid'])
+        parsed_events.append((result, parsed))
+
+    with transaction.atomic():
+        # Lock known sessions so concurrent retries apply their events one after another
+        by_uuid = {
+            session.client_uuid: session
+            for session in BreathingSession.objects.select_for_update().filter(
+                user=user,
+                client_uuid__in={parsed['session_uuid'] for _, parsed in parsed_events}
+            )
+        } if parsed_events else {}
+        created = {}
+        changed = {}
+
+        for result, parsed in parsed_events:
+            session_uuid = parsed['session_uuid']
+            session = by_uuid.get(session_uuid)
+
+            if parsed['type'] == 'start':
+                if session is not None:
+                    result['status'] = 'duplicate'
+                    continue
+                technique = catalog.get_technique(parsed['technique_id'])
+                if technique is None:
+                    result.update(status='rejected', error='Technique not found')
+                    continue
+                session = BreathingSession(
+                    user=user,
+                    technique_id=technique.id,
+                    started_at=parsed['timestamp'],
+                    sound_enabled=parsed['sound_enabled'],
+                    vibration_enabled=parsed['vibration_enabled'],
+                    completed=False,
+                    cycles_completed=0,
+                    client_uuid=session_uuid
+                )
+                by_uuid[session_uuid] = created[session_uuid] = session
+                result['status'] = 'applied'
+                continue
+
+            if session is None:
+                result.update(status='rejected', error='Session not found')
+                continue
+            if session.completed_at is not None:
+                # Already completed or cancelled (e.g. a retried batch)
+                result['status'] = 'duplicate'
+                continue
+
+            cycles_completed = clamp_cycles(
+                session.technique_id, session.started_at, parsed['cycles_completed'], parsed['timestamp']
+            )
+            session.cycles_completed = max(session.cycles_completed or 0, cycles_completed)
+            if parsed['type'] in ('complete', 'cancel'):
+                session.completed_at = max(parsed['timestamp'], session.started_at)
+                session.completed = parsed['type'] == 'complete'
+                session.cycles_completed = cycles_completed
+                session.duration_seconds = int((session.completed_at - session.started_at).total_seconds())
+            if session_uuid not in created:
+                changed[session_uuid] = session
+            result['status'] = 'applied'
+
+        if created:
+            BreathingSession.objects.bulk_create(list(created.values()))
+        if changed:
+            BreathingSession.objects.bulk_update(
+                list(changed.values()),
+                ['completed_at', 'completed', 'cycles_completed', 'duration_seconds']
+            )
+        # Sessions that have already ended are never changed, so everything
+        # finished here has just ended
+        record_finished_sessions(
+            session for session in by_uuid.values()
+            if session.completed_at is not None and (
+                session.client_uuid in created or session.client_uuid in changed
+            )
+        )
+
+    finished = [session.pk for session in changed.values() if session.completed_at is not None]
+    if finished:
+        get_progress_cache().delete_many([progress_key(session_id) for session_id in finished])
+
+    for result, parsed in parsed_events:
+        session = by_uuid.get(parsed['session_uuid'])
+        if result['status'] != 'rejected' and session is not None:
+            result['session_id'] = session.pk
+    return results
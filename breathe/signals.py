@@ -0,0 +1,19 @@
+"""Signal handlers keeping the in-memory catalog snapshot up to date."""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .models import BreathingCategory, BreathingTechnique
+
+
+@receiver(post_save, sender=BreathingCategory)
+@receiver(post_delete, sender=BreathingCategory)
+@receiver(post_save, sender=BreathingTechnique)
+@receiver(post_delete, sender=BreathingTechnique)
+def catalog_changed(sender, **kwargs):
+    """Bump the catalog version once the change is committed."""
+    # Bumping before commit would let another process reload the old rows
+    # under the new version and keep serving them.
+    transaction.on_commit(bump_catalog_version)
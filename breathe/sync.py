@@ -0,0 +1,208 @@
+"""
+Idempotent sync of the breathing catalog from its fixture.
+
+`load_breathing_data` runs on every dyno start (see Procfile). Instead of
+`loaddata`, which rewrites every row on every run, the fixture is diffed
+against the database:
+
+- the SHA-256 of the fixture file is stored in CatalogFixture; when it is
+  unchanged the sync stops after one query
+- otherwise new and changed rows are upserted with
+  bulk_create(update_conflicts=True) in a single transaction, and the primary
+  key sequences are reset because fixture rows carry explicit ids
+- only the fields present in the fixture are compared and written, so fields
+  filled in through the admin (e.g. a category description) are kept
+- rows missing from the fixture are kept, unless `prune` is set; even then
+  techniques referenced by breathing sessions or session stats, and their
+  categories, are kept (archived sessions leave no row behind, but archiving
+  seeds their stats, see archive.segments)
+
+Bulk writes don't send post_save, so the catalog version is bumped
+explicitly after commit when anything changed.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+from django.core import serializers
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .catalog import bump_catalog_version
+from .models import (
+    BreathingCategory,
+    BreathingSession,
+    BreathingTechnique,
+    CatalogFixture,
+    TechniqueStats,
+    UserTechniqueStats,
+)
+
+# Models a fixture may contain, parents first
+SYNC_MODELS = (BreathingCategory, BreathingTechnique)
+
+
+class SyncResult:
+    """Outcome of sync_catalog: counts per model name, or skipped if the fixture was unchanged."""
+
+    def __init__(self, checksum, skipped=False):
+        self.checksum = checksum
+        self.skipped = skipped
+        self.counts = {
+            model._meta.model_name: {'created': 0, 'updated': 0, 'unchanged': 0, 'pruned': 0, 'kept': 0}
+            for model in SYNC_MODELS
+        }
+
+    @property
+    def changed(self):
+        return any(
+            counts['created'] or counts['updated'] or counts['pruned']
+            for counts in self.counts.values()
+        )
+
+
+def fixture_checksum(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_fixture(data):
+    """
+    Parse fixture bytes into {model: {pk: unsaved instance}} and
+    {model: [field names present in the fixture]}. Raises ValueError for
+    models other than SYNC_MODELS and for rows without a primary key.
+    """
+    rows = json.loads(data)
+    objects = {model: {} for model in SYNC_MODELS}
+    fields = {model: [] for model in SYNC_MODELS}
+    for deserialized in serializers.deserialize('python', rows):
+        instance = deserialized.object
+        model = type(instance)
+        if model not in objects:
+            raise ValueError(f'Unexpected model in fixture: {model._meta.label}')
+        if instance.pk is None:
+            raise ValueError(f'{model._meta.label} row without a primary key')
+        objects[model][instance.pk] = instance
+
+    for row in rows:
+        model = next(model for model in SYNC_MODELS if model._meta.label_lower == row['model'])
+        for name in row['fields']:
+            if name not in fields[model]:
+                fields[model].append(name)
+    return objects, fields
+
+
+def diff_model(model, instances, field_names):
+    """Split fixture instances into (new, changed, unchanged count, pks missing from the fixture)."""
+    attnames = [model._meta.get_field(name).attname for name in field_names]
+    existing = {row['pk']: row for row in model.objects.values('pk', *attnames)}
+
+    new, changed, unchanged = [], [], 0
+    for pk, instance in instances.items():
+        row = existing.get(pk)
+        if row is None:
+            new.append(instance)
+        elif any(getattr(instance, attname) != row[attname] for attname in attnames):
+            changed.append(instance)
+        else:
+            unchanged += 1
+    return new, changed, unchanged, set(existing) - set(instances)
+
+
+def reset_sequences():
+    """Move the id sequences past the fixture's explicit primary keys (no-op on SQLite)."""
+    statements = connection.ops.sequence_reset_sql(no_style(), list(SYNC_MODELS))
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def prune_missing(missing, result):
+    """Delete techniques and categories missing from the fixture that nothing references."""
+    techniques = result.counts[BreathingTechnique._meta.model_name]
+    categories = result.counts[BreathingCategory._meta.model_name]
+
+    # Stats rows stand in for sessions that have been moved to the archive
+    referenced = set()
+    for model in (BreathingSession, UserTechniqueStats, TechniqueStats):
+        referenced.update(
+            model.objects.filter(
+                technique_id__in=missing[BreathingTechnique]
+            ).values_list('technique_id', flat=True).distinct()
+        )
+    deletable = missing[BreathingTechnique] - referenced
+    pruned = 0
+    if deletable:
+        # Re-check in the DELETE itself, so a session started meanwhile is never cascaded
+        _, deleted = BreathingTechnique.objects.filter(
+            pk__in=deletable,
+            sessions__isnull=True,
+            user_stats__isnull=True,
+            stats__isnull=True,
+        ).delete()
+        pruned = deleted.get(BreathingTechnique._meta.label, 0)
+    techniques['pruned'] = pruned
+    techniques['kept'] = len(missing[BreathingTechnique]) - pruned
+
+    in_use = set(
+        BreathingTechnique.objects.filter(
+            category_id__in=missing[BreathingCategory]
+        ).values_list('category_id', flat=True).distinct()
+    )
+    deletable = missing[BreathingCategory] - in_use
+    pruned = 0
+    if deletable:
+        _, deleted = BreathingCategory.objects.filter(pk__in=deletable, techniques__isnull=True).delete()
+        pruned = deleted.get(BreathingCategory._meta.label, 0)
+    categories['pruned'] = pruned
+    categories['kept'] = len(missing[BreathingCategory]) - pruned
+
+
+def sync_catalog(path, prune=False, force=False):
+    """
+    Sync the catalog with the fixture at `path`. Returns a SyncResult.
+    With `force`, the fixture is diffed even if its checksum is unchanged.
+    """
+    path = Path(path)
+    data = path.read_bytes()
+    checksum = fixture_checksum(data)
+    if not force and CatalogFixture.objects.filter(name=path.name, checksum=checksum).exists():
+        return SyncResult(checksum, skipped=True)
+
+    objects, fields = read_fixture(data)
+    result = SyncResult(checksum)
+    with transaction.atomic():
+        state, _ = CatalogFixture.objects.get_or_create(name=path.name, defaults={'checksum': ''})
+        # Serialize concurrent boots: the second one sees the stored checksum
+        state = CatalogFixture.objects.select_for_update().get(pk=state.pk)
+        if not force and state.checksum == checksum:
+            return SyncResult(checksum, skipped=True)
+
+        missing = {}
+        for model in SYNC_MODELS:
+            counts = result.counts[model._meta.model_name]
+            new, changed, counts['unchanged'], missing[model] = diff_model(
+                model, objects[model], fields[model]
+            )
+            if new or changed:
+                model.objects.bulk_create(
+                    new + changed,
+                    update_conflicts=True,
+                    unique_fields=['id'],
+                    update_fields=fields[model],
+                )
+            counts['created'] = len(new)
+            counts['updated'] = len(changed)
+            counts['kept'] = len(missing[model])
+
+        if any(counts['created'] for counts in result.counts.values()):
+            reset_sequences()
+        if prune:
+            prune_missing(missing, result)
+
+        state.checksum = checksum
+        state.save(update_fields=['checksum', 'synced_at'])
+        if result.changed:
+            transaction.on_commit(bump_catalog_version)
+    return result
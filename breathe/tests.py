@@ -1,3 +1,830 @@
-from django.test import TestCase
+import json
+import tempfile
+import uuid
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from breathing import conditional
+from tracker.models import ActivityLog
+
+from .audio import FrameHeader, build_sprite, read_frames, write_sprite
+from .catalog import get_catalog
+from .correlation import compute_correlation, covered_share, followed_within, get_correlation, preceded_within
+from .models import (
+    BreathingCategory, BreathingTechnique, BreathingSession, CatalogFixture, TechniqueStats, UserTechniqueStats,
+)
+from .precache import get_precache
+from .sync import sync_catalog
+from .timeline import compile_timeline
+from .tts import TTSProvider, cue_phrases, generate_phrases, get_provider, russian_number
+
+
+class BreatheTestCase(TestCase):
+    """Creates a small catalog and a logged-in user."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        # Run the on_commit catalog version bump so the snapshot sees this catalog
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = BreathingCategory.objects.create(name_ru='Успокоение')
+            self.technique = BreathingTechnique.objects.create(
+                category=self.category,
+                name_ru='Квадратное дыхание',
+                inhale=4,
+                hold_start=4,
+                exhale=4,
+                hold_end=4,
+                recommended_time_min=3,
+                posture_ru='Сидя',
+                breath_origin='ABDOMEN',
+                instructions_ru='Дышите.',
+            )
+
+    def post_session(self, **data):
+        return self.client.post(
+            reverse('breathe:session_manage'),
+            data=json.dumps(data),
+            content_type='application/json',
+        )
+
+
+class SessionExportTests(BreatheTestCase):
+
+    def test_export_joins_technique_and_category(self):
+        BreathingSession.objects.create(
+            user=self.user,
+            technique=self.technique,
+            started_at=timezone.now(),
+        )
+        response = self.client.get(reverse('breathe:session_export'))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['technique'], 'Квадратное дыхание')
+        self.assertEqual(rows[0]['category'], 'Успокоение')
+
+
+class CatalogSnapshotTests(BreatheTestCase):
+
+    def test_snapshot_indexes_categories_and_techniques(self):
+        catalog = get_catalog()
+        category = catalog.get_category(self.category.id)
+        technique = catalog.get_technique(self.technique.id)
+        self.assertEqual(category.techniques, (technique,))
+        self.assertIs(technique.category, category)
+        self.assertEqual(technique.cycle_duration_seconds, 16)
+        self.assertIsNone(catalog.get_technique(self.technique.id + 1000))
+
+    def test_warm_catalog_pages_do_not_query_database(self):
+        self.client.logout()
+        get_catalog()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('breathe:categories')).status_code, 200)
+            self.assertEqual(self.client.get(reverse('breathe:techniques', args=[self.category.id])).status_code, 200)
+            self.assertEqual(self.client.get(reverse('breathe:technique', args=[self.technique.id])).status_code, 200)
+            self.assertEqual(self.client.get(reverse('breathe:guide', args=[self.technique.id])).status_code, 200)
+
+    def test_snapshot_reloads_after_committed_change(self):
+        old = get_catalog()
+        self.technique.name_ru = 'Дыхание по квадрату'
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.technique.save()
+        # Not bumped until the transaction commits
+        self.assertIs(get_catalog(), old)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(get_catalog().get_technique(self.technique.id).name_ru, 'Дыхание по квадрату')
+
+    def test_unknown_ids_return_404(self):
+        missing = self.technique.id + 1000
+        self.assertEqual(self.client.get(reverse('breathe:technique', args=[missing])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('breathe:techniques', args=[self.category.id + 1000])).status_code, 404)
+        response = self.post_session(action='start', technique_id=missing)
+        self.assertEqual(response.status_code, 404)
+
+    def test_start_session_uses_snapshot_technique(self):
+        response = self.post_session(action='start', technique_id=self.technique.id)
+        session = BreathingSession.objects.get(pk=response.json()['session_id'])
+        self.assertEqual(session.technique_id, self.technique.id)
+
+
+class CatalogConditionalGetTests(BreatheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('breathe:technique', args=[self.technique.id])
+        # First visit sets the CSRF cookie; pages are only revalidated once it exists
+        self.assertNotIn('ETag', self.client.get(self.url))
+
+    def test_unchanged_catalog_returns_304_without_rendering(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertTemplateNotUsed('breathe/preparation.html'):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_change_invalidates_etag(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.technique.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_csrf_cookie(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.cookies['csrftoken'] = 'x' * 32
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deploy_without_release_version_invalidates_etag(self):
+        # The fingerprint is computed once per process; clear it as a restart would
+        self.addCleanup(conditional._release_fingerprint.clear)
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(RELEASE_VERSION='', STATIC_ROOT=directory):
+            manifest = Path(directory) / conditional.STATICFILES_MANIFEST
+            manifest.write_text('{"paths": {"css/base.css": "css/base.1.css"}}')
+            conditional._release_fingerprint.clear()
+            etag = self.client.get(self.url)['ETag']
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+            manifest.write_text('{"paths": {"css/base.css": "css/base.2.css"}}')
+            conditional._release_fingerprint.clear()
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SessionProgressTests(BreatheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        response = self.post_session(action='start', technique_id=self.technique.id)
+        self.session_id = response.json()['session_id']
+        # Two minutes in: up to 7 cycles of 16 seconds are plausible
+        BreathingSession.objects.filter(pk=self.session_id).update(
+            started_at=timezone.now() - timedelta(minutes=2)
+        )
+        caches['progress'].clear()
+
+    def session(self):
+        return BreathingSession.objects.get(pk=self.session_id)
+
+    def test_heartbeats_do_not_write_session_row(self):
+        for cycles in (1, 2, 3):
+            response = self.post_session(action='update', session_id=self.session_id, cycles_completed=cycles)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session().cycles_completed, 0)
+
+    def test_complete_writes_progress_and_duration(self):
+        self.post_session(action='update', session_id=self.session_id, cycles_completed=2)
+        response = self.post_session(action='complete', session_id=self.session_id, cycles_completed=3)
+        self.assertEqual(response.json()['duration_seconds'], 120)
+        session = self.session()
+        self.assertTrue(session.completed)
+        self.assertIsNotNone(session.completed_at)
+        self.assertEqual(session.cycles_completed, 3)
+        self.assertEqual(session.duration_seconds, 120)
+
+    def test_reported_cycles_are_clamped_to_timeline(self):
+        self.post_session(action='complete', session_id=self.session_id, cycles_completed=50)
+        self.assertEqual(self.session().cycles_completed, 7)
+
+    def test_cancel_of_other_users_session_is_not_found(self):
+        other = User.objects.create_user('other', password='password')
+        self.client.force_login(other)
+        response = self.post_session(action='cancel', session_id=self.session_id, cycles_completed=1)
+        self.assertEqual(response.status_code, 404)
+        response = self.post_session(action='update', session_id=self.session_id, cycles_completed=1)
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SESSION_PROGRESS_FLUSH_INTERVAL=0)
+    def test_heartbeat_flushes_after_interval(self):
+        self.post_session(action='update', session_id=self.session_id, cycles_completed=4)
+        self.assertEqual(self.session().cycles_completed, 4)
+
+    def test_flush_command_writes_open_sessions(self):
+        self.post_session(action='update', session_id=self.session_id, cycles_completed=5)
+        call_command('flush_session_progress', stdout=StringIO())
+        self.assertEqual(self.session().cycles_completed, 5)
+        self.assertIsNone(self.session().completed_at)
+
+    @override_settings(SESSION_PROGRESS_COALESCE=False)
+    def test_heartbeat_writes_directly_when_coalescing_disabled(self):
+        self.post_session(action='update', session_id=self.session_id, cycles_completed=6)
+        self.assertEqual(self.session().cycles_completed, 6)
+
+
+@override_settings(ROOT_URLCONF='breathing.asgi_urls')
+class AsyncSessionManageTests(BreatheTestCase):
+    """Under ASGI, session calls are served by the async view with the same responses."""
+
+    async def post_async(self, **data):
+        return await self.async_client.post(
+            reverse('breathe:session_manage'),
+            data=json.dumps(data),
+            content_type='application/json',
+        )
+
+    async def test_start_update_complete(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.post_async(action='start', technique_id=self.technique.id)
+        self.assertEqual(response.status_code, 200)
+        session_id = response.json()['session_id']
+        response = await self.post_async(action='update', session_id=session_id, cycles_completed=0)
+        self.assertEqual(response.json()['message'], 'Session updated')
+        response = await self.post_async(action='complete', session_id=session_id, cycles_completed=0)
+        self.assertEqual(response.json()['duration_seconds'], 0)
+
+        session = await BreathingSession.objects.aget(pk=session_id)
+        self.assertTrue(session.completed)
+        stats = await UserTechniqueStats.objects.aget(user=self.user, technique=self.technique)
+        self.assertEqual(stats.sessions, 1)
+
+    async def test_errors(self):
+        await self.async_client.aforce_login(self.user)
+        self.assertEqual((await self.post_async(action='jump')).status_code, 400)
+        self.assertEqual((await self.post_async(action='start', technique_id=999)).status_code, 404)
+        self.assertEqual((await self.post_async(action='complete')).json()['error'], 'Session ID required')
+        self.assertEqual((await self.post_async(action='cancel', session_id=999)).status_code, 404)
+
+
+class SessionBatchTests(BreatheTestCase):
+
+    def post_events(self, events):
+        return self.client.post(
+            reverse('breathe:session_batch'),
+            data=json.dumps({'events': events}),
+            content_type='application/json',
+        )
+
+    def session_events(self, session_uuid):
+        return [
+            {'event_id': 'e1', 'type': 'start', 'session_uuid': session_uuid,
+             'timestamp': '2025-01-01T10:00:00Z', 'technique_id': self.technique.id},
+            {'event_id': 'e2', 'type': 'update', 'session_uuid': session_uuid,
+             'timestamp': '2025-01-01T10:00:16Z', 'cycles_completed': 1},
+            {'event_id': 'e3', 'type': 'complete', 'session_uuid': session_uuid,
+             'timestamp': '2025-01-01T10:03:00Z', 'cycles_completed': 11},
+        ]
+
+    def test_events_are_applied_in_order(self):
+        session_uuid = str(uuid.uuid4())
+        response = self.post_events(self.session_events(session_uuid))
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], ['applied'] * 3)
+        session = BreathingSession.objects.get(client_uuid=session_uuid)
+        self.assertEqual(results[0]['session_id'], session.id)
+        self.assertTrue(session.completed)
+        self.assertEqual(session.cycles_completed, 11)
+        self.assertEqual(session.duration_seconds, 180)
+
+    def test_retried_batch_creates_no_duplicates(self):
+        session_uuid = str(uuid.uuid4())
+        events = self.session_events(session_uuid)
+        self.post_events(events[:2])
+        response = self.post_events(events)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['duplicate', 'applied', 'applied'])
+        response = self.post_events(events)
+        statuses = [result['status'] for result in response.json()['results']]
+        self.assertEqual(statuses, ['duplicate'] * 3)
+        self.assertEqual(BreathingSession.objects.filter(client_uuid=session_uuid).count(), 1)
+
+    def test_invalid_events_are_rejected_individually(self):
+        session_uuid = str(uuid.uuid4())
+        response = self.post_events([
+            {'type': 'start', 'session_uuid': session_uuid, 'technique_id': self.technique.id + 1000},
+            {'type': 'update', 'session_uuid': session_uuid, 'cycles_completed': 1},
+            {'type': 'jump', 'session_uuid': session_uuid},
+            {'type': 'start', 'session_uuid': str(uuid.uuid4()), 'technique_id': self.technique.id},
+        ])
+        results = response.json()['results']
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['rejected', 'rejected', 'rejected', 'applied']
+        )
+        self.assertEqual(results[0]['error'], 'Technique not found')
+        self.assertEqual(BreathingSession.objects.count(), 1)
+
+    def test_guest_gets_401_instead_of_login_redirect(self):
+        self.client.logout()
+        response = self.post_events(self.session_events(str(uuid.uuid4())))
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(response.json()['success'])
+        self.assertEqual(BreathingSession.objects.count(), 0)
+
+    def test_guide_tells_the_client_whether_to_track_sessions(self):
+        url = reverse('breathe:guide', args=[self.technique.id])
+        self.assertContains(self.client.get(url), 'data-authenticated="true"')
+        self.client.logout()
+        self.assertContains(self.client.get(url), 'data-authenticated="false"')
+
+
+class TimelineTests(BreatheTestCase):
+
+    def test_timeline_schedule(self):
+        timeline = compile_timeline(4, 7, 8, 0, 3)
+        self.assertEqual(timeline.cycle_duration, 19)
+        self.assertEqual(timeline.phase_starts, (0, 4, 11))
+        self.assertEqual(timeline.phase_names, ('inhale', 'hold_start', 'exhale'))
+        self.assertEqual(timeline.total_cycles, 9)
+        self.assertEqual(timeline.count_values[:5], (4, 3, 2, 1, 7))
+        self.assertEqual(timeline.phase_at(19 + 4.5), ('hold_start', 0.5, 7))
+        self.assertEqual(timeline.phase_at(18.9)[2], 1)
+
+    def test_cycles_bounded_by_session_and_elapsed_time(self):
+        timeline = compile_timeline(4, 4, 4, 4, 3)
+        self.assertEqual(timeline.clamp_cycles(100), 11)
+        self.assertEqual(timeline.clamp_cycles(100, elapsed_seconds=40), 2)
+        self.assertEqual(timeline.clamp_cycles(-1), 0)
+
+    def test_guide_embeds_timeline_and_endpoint_serves_it(self):
+        response = self.client.get(reverse('breathe:guide', args=[self.technique.id]))
+        self.assertContains(response, 'id="technique-timeline"')
+        response = self.client.get(reverse('breathe:technique_timeline', args=[self.technique.id]))
+        self.assertEqual(response.json()['timeline']['phase_starts'], [0, 4, 8, 12])
+        self.assertEqual(
+            self.client.get(response.wsgi_request.path, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            304
+        )
+
+
+def mp3_frames(count, header=b'\xff\xfb\x90\xc4'):
+    """`count` silent MPEG-1 Layer III frames (128 kbps, 44.1 kHz, mono)."""
+    return FrameHeader(header).silent_frame() * count
+
+
+class AudioSpriteTests(TestCase):
+
+    def test_frames_are_parsed_after_id3_tag(self):
+        data = b'ID3\x04\x00\x00\x00\x00\x00\x05' + b'\x00' * 5 + mp3_frames(3) + b'TAG' + b'\x00' * 125
+        frames = read_frames(data)
+        self.assertEqual(len(frames), 3)
+        self.assertEqual(frames[0][0].sample_rate, 44100)
+        self.assertEqual(len(frames[0][1]), 417)
+
+    def test_sprite_offsets_include_gaps(self):
+        sprite, cues = build_sprite(
+            {'phase_inhale': mp3_frames(10), 'count_1': mp3_frames(5)},
+            gap_seconds=0.05
+        )
+        frame = 1152 / 44100
+        self.assertEqual(cues['phase_inhale'], {'offset': 0.0, 'duration': round(10 * frame, 4)})
+        # 0.05 s of silence rounds up to two frames
+        self.assertEqual(cues['count_1']['offset'], round(12 * frame, 4))
+        self.assertEqual(len(read_frames(sprite)), 17)
+
+    def test_write_sprite_uses_content_hashed_name(self):
+        with tempfile.TemporaryDirectory() as directory:
+            audio_dir = Path(directory)
+            for name, frames in (('phase_inhale', 4), ('count_10', 2), ('count_2', 3)):
+                (audio_dir / f'{name}.mp3').write_bytes(mp3_frames(frames))
+            (audio_dir / 'cues.0123456789ab.mp3').write_bytes(b'old')
+
+            manifest = write_sprite(audio_dir)
+            self.assertEqual(list(manifest['cues']), ['phase_inhale', 'count_2', 'count_10'])
+            self.assertRegex(manifest['file'], r'^cues\.[0-9a-f]{12}\.mp3$')
+            self.assertEqual([path.name for path in audio_dir.glob('cues.*.mp3')], [manifest['file']])
+            self.assertEqual(json.loads((audio_dir / 'cues.json').read_text()), manifest)
+
+
+class GenerateAudioTests(TestCase):
+
+    def test_russian_numbers_beyond_ten(self):
+        self.assertEqual(russian_number(10), 'Десять')
+        self.assertEqual(russian_number(11), 'Одиннадцать')
+        self.assertEqual(russian_number(21), 'Двадцать один')
+        self.assertEqual(russian_number(240), 'Двести сорок')
+        self.assertEqual(cue_phrases(12)['count_12'], 'Двенадцать')
+
+    def test_only_new_phrases_are_generated(self):
+        provider = get_provider('local')
+        with tempfile.TemporaryDirectory() as directory:
+            generated, skipped, errors = generate_phrases(provider, cue_phrases(10), directory)
+            self.assertEqual((len(generated), len(skipped), errors), (13, 0, {}))
+
+            generated, skipped, errors = generate_phrases(provider, cue_phrases(12), directory)
+            self.assertEqual(sorted(generated), ['count_11', 'count_12'])
+            self.assertEqual(len(skipped), 13)
+
+            slow = get_provider('local', slow=True)
+            generated, skipped, errors = generate_phrases(slow, cue_phrases(12), directory)
+            self.assertEqual(len(generated), 15)
+
+    def test_provider_without_synthesize_fails_when_created(self):
+        class IncompleteProvider(TTSProvider):
+            name = 'incomplete'
+
+        with self.assertRaises(TypeError):
+            IncompleteProvider()
+
+    def test_command_rebuilds_existing_sprite(self):
+        with tempfile.TemporaryDirectory() as directory:
+            out = StringIO()
+            call_command('generate_audio', provider='local', output_dir=directory, stdout=out)
+            call_command('generate_audio', sprite=True, output_dir=directory, stdout=out)
+            call_command('generate_audio', provider='local', output_dir=directory, max_count=11, stdout=out)
+            manifest = json.loads((Path(directory) / 'cues.json').read_text())
+            self.assertIn('count_11', manifest['cues'])
+
+
+class PrecacheTests(BreatheTestCase):
+
+    def test_build_precache_writes_asset_revisions(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(STATIC_ROOT=directory):
+            call_command('build_precache', stdout=StringIO())
+            manifest = json.loads((Path(directory) / 'precache.json').read_text())
+        urls = [asset['url'] for asset in manifest['assets']]
+        self.assertIn('/static/js/breathing-guide.js', urls)
+        self.assertIn('/static/css/guide.css', urls)
+        self.assertTrue(all(len(asset['revision']) == 16 for asset in manifest['assets']))
+
+    def test_service_worker_precaches_catalog_pages(self):
+        response = self.client.get(reverse('breathe:service_worker'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        content = response.content.decode()
+        self.assertIn(reverse('breathe:guide', args=[self.technique.id]), content)
+        self.assertIn(reverse('breathe:techniques', args=[self.category.id]), content)
+        self.assertIn('/static/js/breathing-guide.js', content)
+
+        etag = response['ETag']
+        response = self.client.get(reverse('breathe:service_worker'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_change_changes_version(self):
+        version = get_precache()['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.technique.save()
+        self.assertNotEqual(get_precache()['version'], version)
+
+    def test_release_changes_version(self):
+        with override_settings(RELEASE_VERSION='1'):
+            precache = get_precache()
+        self.assertIn(reverse('breathe:guide', args=[self.technique.id]), precache['pages'])
+        self.assertNotIn('/static/js/breathing-guide.js', precache['pages'])
+        with override_settings(RELEASE_VERSION='2'):
+            self.assertNotEqual(get_precache()['version'], precache['version'])
+
+
+class CatalogSyncTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = Path(self.directory.name) / 'catalog.json'
+        self.rows = [
+            {'model': 'breathe.breathingcategory', 'pk': 1, 'fields': {'name_ru': 'Фокус'}},
+            {'model': 'breathe.breathingcategory', 'pk': 2, 'fields': {'name_ru': 'Спокойствие'}},
+        ] + [
+            {
+                'model': 'breathe.breathingtechnique',
+                'pk': pk,
+                'fields': {
+                    'category': category,
+                    'name_ru': f'Техника {pk}',
+                    'inhale': 4, 'hold_start': 0, 'exhale': 4, 'hold_end': 0,
+                    'recommended_time_min': 3,
+                    'posture_ru': 'Сидя',
+                    'breath_origin': 'NOSTRILS',
+                    'instructions_ru': 'Дышите.',
+                },
+            }
+            for pk, category in ((1, 1), (2, 1), (3, 2))
+        ]
+        self.write_fixture()
+
+    def write_fixture(self):
+        self.path.write_text(json.dumps(self.rows, ensure_ascii=False), encoding='utf-8')
+
+    def test_unchanged_fixture_is_skipped_after_one_query(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = sync_catalog(self.path)
+        self.assertEqual(result.counts['breathingtechnique']['created'], 3)
+        self.assertEqual(CatalogFixture.objects.get(name='catalog.json').checksum, result.checksum)
+        with self.assertNumQueries(1):
+            self.assertTrue(sync_catalog(self.path).skipped)
+
+    def test_changed_rows_are_upserted_and_admin_fields_kept(self):
+        sync_catalog(self.path)
+        BreathingCategory.objects.filter(pk=1).update(description_ru='Из админки')
+        self.rows[2]['fields']['inhale'] = 6
+        self.write_fixture()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = sync_catalog(self.path)
+        self.assertEqual(result.counts['breathingtechnique'], {
+            'created': 0, 'updated': 1, 'unchanged': 2, 'pruned': 0, 'kept': 0,
+        })
+        self.assertEqual(BreathingTechnique.objects.get(pk=1).inhale, 6)
+        self.assertEqual(BreathingCategory.objects.get(pk=1).description_ru, 'Из админки')
+        # Bulk upserts send no signals; the sync bumps the catalog version itself
+        self.assertEqual(get_catalog().get_technique(1).inhale, 6)
+
+    def test_prune_keeps_techniques_with_sessions(self):
+        sync_catalog(self.path)
+        user = User.objects.create_user('user', password='password')
+        BreathingSession.objects.create(user=user, technique_id=3, started_at=timezone.now())
+        self.rows = [self.rows[0], self.rows[2]]  # Drop category 2 and techniques 2 and 3
+        self.write_fixture()
+
+        result = sync_catalog(self.path, prune=True)
+        self.assertEqual(result.counts['breathingtechnique']['pruned'], 1)
+        self.assertEqual(result.counts['breathingtechnique']['kept'], 1)
+        self.assertEqual(set(BreathingTechnique.objects.values_list('pk', flat=True)), {1, 3})
+        # Category 2 is still used by technique 3
+        self.assertEqual(set(BreathingCategory.objects.values_list('pk', flat=True)), {1, 2})
+        self.assertEqual(result.counts['breathingcategory']['kept'], 1)
+        self.assertEqual(BreathingSession.objects.count(), 1)
+
+    def test_prune_keeps_techniques_of_archived_sessions(self):
+        sync_catalog(self.path)
+        user = User.objects.create_user('user', password='password')
+        # What archiving leaves behind for technique 3: stats rows but no sessions
+        UserTechniqueStats.objects.create(user=user, technique_id=3, sessions=1)
+        TechniqueStats.objects.create(technique_id=3, sessions=1)
+        self.rows = [self.rows[0], self.rows[2]]
+        self.write_fixture()
+
+        result = sync_catalog(self.path, prune=True)
+        self.assertEqual(result.counts['breathingtechnique']['pruned'], 1)
+        self.assertEqual(result.counts['breathingtechnique']['kept'], 1)
+        self.assertEqual(set(BreathingTechnique.objects.values_list('pk', flat=True)), {1, 3})
+        self.assertEqual(TechniqueStats.objects.get(technique_id=3).sessions, 1)
+
+    def test_new_rows_after_sync_get_fresh_ids(self):
+        sync_catalog(self.path)
+        category = BreathingCategory.objects.create(name_ru='Новая')
+        self.assertGreater(category.pk, 2)
+
+    def test_command_reports_unchanged_fixture(self):
+        out = StringIO()
+        call_command('load_breathing_data', stdout=out)
+        self.assertEqual(BreathingTechnique.objects.count(), 18)
+        out = StringIO()
+        call_command('load_breathing_data', stdout=out)
+        self.assertIn('unchanged', out.getvalue())
+
+
+class SessionAnalyticsTests(BreatheTestCase):
+
+    def finish(self, action, cycles_completed=2, sound_enabled=True):
+        response = self.post_session(action='start', technique_id=self.technique.id, sound_enabled=sound_enabled)
+        session_id = response.json()['session_id']
+        BreathingSession.objects.filter(pk=session_id).update(started_at=timezone.now() - timedelta(minutes=1))
+        caches['progress'].clear()
+        return self.post_session(action=action, session_id=session_id, cycles_completed=cycles_completed)
+
+    def test_finished_sessions_update_summaries(self):
+        self.finish('complete')
+        self.finish('cancel', sound_enabled=False)
+        stats = UserTechniqueStats.objects.get(user=self.user, technique=self.technique)
+        self.assertEqual((stats.sessions, stats.completed), (2, 1))
+        self.assertEqual(stats.duration_seconds, 120)
+        self.assertEqual((stats.sound_sessions, stats.sound_completed), (1, 1))
+        self.assertEqual(TechniqueStats.objects.get(technique=self.technique).sessions, 2)
+
+    def test_repeated_complete_is_counted_once(self):
+        response = self.post_session(action='start', technique_id=self.technique.id)
+        session_id = response.json()['session_id']
+        self.post_session(action='complete', session_id=session_id, cycles_completed=0)
+        response = self.post_session(action='cancel', session_id=session_id, cycles_completed=0)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(BreathingSession.objects.get(pk=session_id).completed)
+        self.assertEqual(UserTechniqueStats.objects.get(user=self.user).sessions, 1)
+
+    def test_batch_completion_updates_summaries(self):
+        session_uuid = str(uuid.uuid4())
+        self.client.post(
+            reverse('breathe:session_batch'),
+            data=json.dumps({'events': [
+                {'type': 'start', 'session_uuid': session_uuid,
+                 'timestamp': '2025-01-01T10:00:00Z', 'technique_id': self.technique.id},
+                {'type': 'complete', 'session_uuid': session_uuid,
+                 'timestamp': '2025-01-01T10:03:00Z', 'cycles_completed': 11},
+            ]}),
+            content_type='application/json',
+        )
+        stats = TechniqueStats.objects.get(technique=self.technique)
+        self.assertEqual((stats.sessions, stats.completed, stats.cycles_completed), (1, 1, 11))
+
+    def test_endpoint_reads_summaries_only(self):
+        self.finish('complete')
+        self.finish('cancel', sound_enabled=False)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('breathe:session_analytics'))
+        self.assertFalse(any('breathe_breathingsession' in query['sql'] for query in queries))
+
+        data = response.json()
+        self.assertEqual(data['totals']['sessions'], 2)
+        self.assertEqual(data['totals']['completion_rate'], 0.5)
+        self.assertEqual(data['totals']['average_duration_seconds'], 60)
+        self.assertEqual(data['techniques'][0]['name_ru'], 'Квадратное дыхание')
+        self.assertEqual(data['categories'][0]['name_ru'], 'Успокоение')
+        self.assertEqual(data['preferences']['sound'], {
+            'on': {'sessions': 1, 'completion_rate': 1.0},
+            'off': {'sessions': 1, 'completion_rate': 0.0},
+        })
+
+    def test_all_users_scope_requires_staff(self):
+        self.client.force_login(User.objects.create_user('user', password='password'))
+        response = self.client.get(reverse('breathe:session_analytics'), {'scope': 'all'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_rebuild_command_fixes_drift(self):
+        self.finish('complete')
+        UserTechniqueStats.objects.update(sessions=5)
+        TechniqueStats.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_session_stats', '--check', stdout=out)
+        self.assertIn('2 summary row(s) out of date', out.getvalue())
+        self.assertEqual(UserTechniqueStats.objects.get().sessions, 5)
+
+        call_command('rebuild_session_stats', stdout=StringIO())
+        self.assertEqual(UserTechniqueStats.objects.get().sessions, 1)
+        self.assertEqual(TechniqueStats.objects.get().sessions, 1)
+
+
+class CorrelationTests(BreatheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.start = timezone.now() - timedelta(days=10)
+        # A session every day; a RESIST tap 10 minutes after the first five
+        for day in range(10):
+            started_at = self.start + timedelta(days=day)
+            BreathingSession.objects.create(user=self.user, technique=self.technique, started_at=started_at)
+            if day < 5:
+                ActivityLog.objects.create(
+                    user=self.user, activity_type='RESIST', timestamp=started_at + timedelta(minutes=10)
+                )
+        ActivityLog.objects.create(
+            user=self.user, activity_type='SMOKED', timestamp=self.start + timedelta(days=3, hours=12)
+        )
+
+    def test_as_of_joins(self):
+        starts = np.array([0.0, 100.0, 200.0])
+        events = np.array([50.0, 260.0])
+        self.assertEqual(followed_within(starts, events, 60).tolist(), [True, False, True])
+        self.assertEqual(preceded_within(events, starts, 60).tolist(), [True, True])
+        self.assertEqual(preceded_within(events, starts, 40).tolist(), [False, False])
+        # [0, 60] and [50, 110] cover 110 of 300 seconds
+        self.assertAlmostEqual(covered_share(np.array([0.0, 50.0]), 60, 0, 300, forward=True), 110 / 300)
+
+    def test_rates_and_lift_per_technique(self):
+        report = compute_correlation(self.user, window_minutes=60)
+        self.assertEqual(report['sessions'], 10)
+        self.assertEqual(report['activities'], {'RESIST': 5, 'SMOKED': 1, 'SPORT': 0})
+        overall, technique = report['techniques']
+        self.assertIsNone(overall['technique_id'])
+        self.assertEqual(technique['name_ru'], 'Квадратное дыхание')
+
+        resist = technique['after_session']['RESIST']
+        self.assertEqual(resist['rate'], 0.5)
+        self.assertGreater(resist['lift'], 10)
+        self.assertEqual(technique['before_activity']['RESIST']['rate'], 1.0)
+        self.assertEqual(technique['before_activity']['SMOKED']['rate'], 0.0)
+        self.assertIsNone(technique['before_activity']['SPORT']['rate'])
+
+    def test_report_is_cached_until_new_data(self):
+        report = get_correlation(self.user)
+        with self.assertNumQueries(2):
+            self.assertEqual(get_correlation(self.user), report)
+        ActivityLog.objects.create(user=self.user, activity_type='SPORT', timestamp=timezone.now())
+        self.assertEqual(get_correlation(self.user)['activities']['SPORT'], 1)
+
+    def test_command_prints_json(self):
+        out = StringIO()
+        call_command('correlate_sessions', '--user', 'admin', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['sessions'], 10)
+        out = StringIO()
+        call_command('correlate_sessions', '--user', 'admin', stdout=out)
+        self.assertIn('RESIST', out.getvalue())
+
+
+class SessionHistoryTests(BreatheTestCase):
+    """Session history pages follow (started_at, id) cursors newest first."""
+
+    def setUp(self):
+        super().setUp()
+        self.other_technique = BreathingTechnique.objects.create(
+            category=self.category,
+            name_ru='Дыхание 4-7-8',
+            inhale=4,
+            hold_start=7,
+            exhale=8,
+            hold_end=0,
+            recommended_time_min=3,
+            posture_ru='Сидя',
+            breath_origin='ABDOMEN',
+            instructions_ru='Дышите.',
+        )
+        moment = timezone.now()
+        # Equal start times must neither repeat nor skip rows across pages
+        for index, hours in enumerate([0, 1, 1, 1, 2]):
+            BreathingSession.objects.create(
+                user=self.user,
+                technique=self.technique if index % 2 else self.other_technique,
+                started_at=moment - timedelta(hours=hours),
+                completed=True,
+                completed_at=moment,
+            )
+
+    def get_page(self, **params):
+        return self.client.get(reverse('breathe:session_history'), params).json()
+
+    def test_pages_cover_history_newest_first(self):
+        rows = []
+        cursor = None
+        while True:
+            data = self.get_page(limit=2, **({'cursor': cursor} if cursor else {}))
+            rows.extend(data['results'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        expected = list(
+            BreathingSession.objects.filter(user=self.user).order_by('-started_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual([row['id'] for row in rows], expected)
+
+    def test_technique_filter_and_names(self):
+        data = self.get_page(technique=self.technique.pk)
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual({row['technique'] for row in data['results']}, {'Квадратное дыхание'})
+        self.assertIsNone(data['next_cursor'])
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': 'e30'}, {'limit': '500'}, {'technique': 'x'}):
+            response = self.client.get(reverse('breathe:session_history'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class SessionAdminTests(BreatheTestCase):
+    """The session changelist filters by user through the admin autocomplete view."""
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user('other', password='password')
+        for user in (self.user, self.other):
+            BreathingSession.objects.create(user=user, technique=self.technique, started_at=timezone.now())
+
+    def test_user_filter(self):
+        response = self.client.get(
+            reverse('admin:breathe_breathingsession_changelist'),
+            {'user__id__exact': self.other.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertIsNone(response.context['cl'].date_hierarchy)
+        self.assertContains(response, 'data-field-name="user"')
+
+    def test_autocomplete_finds_users(self):
+        response = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'breathe',
+            'model_name': 'breathingsession',
+            'field_name': 'user',
+            'term': 'oth',
+        })
+        self.assertEqual(response.json()['results'], [{'id': str(self.other.pk), 'text': 'other'}])
+
+
+class SessionIndexTests(BreatheTestCase):
+    """The hot session queries are answered from the new indexes (EXPLAIN)."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise be read sequentially
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn(index_name, queryset.explain())
+
+    def test_history_uses_user_started_at_index(self):
+        # Meta.ordering is -started_at
+        self.assertUsesIndex(
+            BreathingSession.objects.filter(user=self.user)[:50],
+            'breathe_session_user_start_idx'
+        )
+
+    def test_history_by_technique_uses_technique_index(self):
+        self.assertUsesIndex(
+            BreathingSession.objects.filter(user=self.user, technique=self.technique).order_by('-started_at', '-id')[:51],
+            'breathe_session_user_tech_idx'
+        )
+
+    def test_open_sessions_use_partial_index(self):
+        since = timezone.now() - timedelta(hours=6)
+        open_sessions = BreathingSession.objects.filter(
+            completed_at__isnull=True,
+            started_at__gte=since
+        ).values_list('id', flat=True)
+        self.assertUsesIndex(open_sessions, 'breathe_session_open_idx')
@@ -0,0 +1,105 @@
+"""
+Precomputed phase timeline of a breathing technique.
+
+The guide used to work out the current phase and countdown number every
+animation frame from inhale/hold_start/exhale/hold_end. The timeline
+materializes that schedule once per technique: the start offset of every
+phase within a cycle, the offset at which each countdown number is shown,
+and how many cycles fit into the recommended session time. The client
+binary-searches these arrays; the server uses the same schedule to validate
+the `cycles_completed` reported by the client.
+
+Timelines are cached by the technique's timing fields, so editing a technique
+produces a new timeline (and a new version) without explicit invalidation.
+"""
+
+import hashlib
+from bisect import bisect_right
+from functools import lru_cache
+
+# Phases of one cycle, in order; phases with a zero duration are left out
+PHASES = ('inhale', 'hold_start', 'exhale', 'hold_end')
+
+
+class Timeline:
+    """Read-only schedule of one breathing cycle plus the session length."""
+
+    __slots__ = (
+        'version', 'cycle_duration', 'session_duration', 'total_cycles',
+        'phase_starts', 'phase_names', 'phase_durations',
+        'count_starts', 'count_values',
+    )
+
+    def __init__(self, inhale, hold_start, exhale, hold_end, recommended_time_min):
+        durations = dict(zip(PHASES, (inhale, hold_start, exhale, hold_end)))
+        self.cycle_duration = sum(durations.values())
+        self.session_duration = recommended_time_min * 60
+        # Cycles fully completed when the session timer runs out
+        self.total_cycles = (
+            self.session_duration // self.cycle_duration if self.cycle_duration > 0 else 0
+        )
+
+        phase_starts, phase_names, phase_durations = [], [], []
+        count_starts, count_values = [], []
+        offset = 0
+        for phase in PHASES:
+            duration = durations[phase]
+            if duration <= 0:
+                continue
+            phase_starts.append(offset)
+            phase_names.append(phase)
+            phase_durations.append(duration)
+            # Countdown: the phase's duration at its start, then one less every second
+            for second in range(duration):
+                count_starts.append(offset + second)
+                count_values.append(duration - second)
+            offset += duration
+
+        self.phase_starts = tuple(phase_starts)
+        self.phase_names = tuple(phase_names)
+        self.phase_durations = tuple(phase_durations)
+        self.count_starts = tuple(count_starts)
+        self.count_values = tuple(count_values)
+
+        key = f'{inhale}-{hold_start}-{exhale}-{hold_end}-{recommended_time_min}'
+        self.version = hashlib.blake2b(key.encode('ascii'), digest_size=6).hexdigest()
+
+    def phase_at(self, elapsed):
+        """(phase, seconds into the phase, count shown) at `elapsed` session seconds."""
+        cycle_elapsed = elapsed % self.cycle_duration
+        index = bisect_right(self.phase_starts, cycle_elapsed) - 1
+        count = self.count_values[bisect_right(self.count_starts, cycle_elapsed) - 1]
+        return self.phase_names[index], cycle_elapsed - self.phase_starts[index], count
+
+    def max_cycles(self, elapsed_seconds=None):
+        """
+        Most cycles a session can have completed: bounded by the session length
+        and, if given, by the wall-clock time since it started (pauses only add time).
+        """
+        if elapsed_seconds is None or self.cycle_duration <= 0:
+            return self.total_cycles
+        return min(self.total_cycles, int(max(elapsed_seconds, 0) // self.cycle_duration))
+
+    def clamp_cycles(self, cycles_completed, elapsed_seconds=None):
+        """Reported cycles limited to what the schedule allows."""
+        return max(0, min(cycles_completed, self.max_cycles(elapsed_seconds)))
+
+    def as_dict(self):
+        """Compact JSON form embedded in guide.html and served by the timeline endpoint."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@lru_cache(maxsize=256)
+def compile_timeline(inhale, hold_start, exhale, hold_end, recommended_time_min):
+    return Timeline(inhale, hold_start, exhale, hold_end, recommended_time_min)
+
+
+def get_timeline(technique):
+    """Timeline for a BreathingTechnique or catalog TechniqueRecord."""
+    return compile_timeline(
+        technique.inhale,
+        technique.hold_start,
+        technique.exhale,
+        technique.hold_end,
+        technique.recommended_time_min,
+    )
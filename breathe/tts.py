@@ -0,0 +1,281 @@
+"""
+Text-to-speech generation of the guide's voice cues.
+
+Providers turn a phrase into MP3 bytes:
+
+- gtts: Google Translate TTS through the gTTS package (default, no API key)
+- google_cloud: Google Cloud Text-to-Speech (needs credentials, supports voices)
+- local: offline stub producing silent MP3s sized to the phrase, for tests and
+  for working without network access
+
+Phrases are generated on a thread pool. A manifest (tts-manifest.json in the
+output directory) records the hash of (text, provider, slow, voice) for
+every file, so a run only synthesizes phrases whose inputs changed or whose
+file is missing: adding counts beyond 10 or switching one setting costs only
+the affected phrases.
+"""
+
+import hashlib
+import io
+import json
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+
+from .audio import FrameHeader
+
+MANIFEST_NAME = 'tts-manifest.json'
+
+PHASE_CUES = {
+    'phase_inhale': 'Вдох',
+    'phase_exhale': 'Выдох',
+    'phase_hold': 'Задержка',
+}
+
+DEFAULT_MAX_COUNT = 10
+
+_UNITS = ('', 'один', 'два', 'три', 'четыре', 'пять', 'шесть', 'семь', 'восемь', 'девять')
+_TEENS = (
+    'десять', 'одиннадцать', 'двенадцать', 'тринадцать', 'четырнадцать',
+    'пятнадцать', 'шестнадцать', 'семнадцать', 'восемнадцать', 'девятнадцать',
+)
+_TENS = (
+    '', '', 'двадцать', 'тридцать', 'сорок', 'пятьдесят',
+    'шестьдесят', 'семьдесят', 'восемьдесят', 'девяносто',
+)
+_HUNDREDS = (
+    '', 'сто', 'двести', 'триста', 'четыреста', 'пятьсот',
+    'шестьсот', 'семьсот', 'восемьсот', 'девятьсот',
+)
+
+
+def russian_number(number):
+    """Spoken Russian name of 1..999, capitalized like the other cues ('Двадцать один')."""
+    if not 1 <= number <= 999:
+        raise ValueError(f'Count out of range: {number}')
+    hundreds, rest = divmod(number, 100)
+    words = [_HUNDREDS[hundreds]]
+    if 10 <= rest < 20:
+        words.append(_TEENS[rest - 10])
+    else:
+        tens, units = divmod(rest, 10)
+        words += [_TENS[tens], _UNITS[units]]
+    return ' '.join(word for word in words if word).capitalize()
+
+
+def cue_phrases(max_count=DEFAULT_MAX_COUNT):
+    """File name (without .mp3) -> phrase for every cue the guide can play."""
+    phrases = dict(PHASE_CUES)
+    for number in range(1, max_count + 1):
+        phrases[f'count_{number}'] = russian_number(number)
+    return phrases
+
+
+class ProviderUnavailable(Exception):
+    """The provider's package or credentials are missing."""
+
+
+class TTSProvider(ABC):
+    """Interface of TTS providers."""
+
+    name = None
+    # Voice used when none is given (None: the provider's only voice)
+    default_voice = None
+
+    def __init__(self, voice=None, slow=False):
+        self.voice = voice or self.default_voice
+        self.slow = slow
+
+    def check(self):
+        """Raise ProviderUnavailable if the provider can't be used."""
+
+    @abstractmethod
+    def synthesize(self, text):
+        """Return MP3 bytes for `text` (Russian). Must be safe to call from several threads."""
+
+    def cache_key(self, text):
+        """Hash of everything that affects the audio for `text`."""
+        value = json.dumps([text, self.name, self.slow, self.voice], ensure_ascii=False)
+        return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+class GTTSProvider(TTSProvider):
+    """Google Translate TTS via gTTS (no API key; one voice)."""
+
+    name = 'gtts'
+
+    def check(self):
+        try:
+            import gtts  # noqa: F401
+        except ImportError:
+            raise ProviderUnavailable('gTTS is not installed. Install it with: pip install gTTS')
+
+    def synthesize(self, text):
+        from gtts import gTTS
+
+        buffer = io.BytesIO()
+        gTTS(text=text, lang='ru', slow=self.slow).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class GoogleCloudProvider(TTSProvider):
+    """Google Cloud Text-to-Speech (credentials from settings; selectable voice)."""
+
+    name = 'google_cloud'
+    default_voice = 'ru-RU-Wavenet-A'
+
+    def __init__(self, voice=None, slow=False):
+        super().__init__(voice=voice, slow=slow)
+        self._client = None
+
+    def check(self):
+        try:
+            from google.cloud import texttospeech  # noqa: F401
+        except ImportError:
+            raise ProviderUnavailable(
+                'google-cloud-texttospeech is not installed. '
+                'Install it with: pip install google-cloud-texttospeech'
+            )
+        if not (settings.GOOGLE_TTS_API_KEY or settings.GOOGLE_APPLICATION_CREDENTIALS):
+            raise ProviderUnavailable(
+                'Set GOOGLE_TTS_API_KEY or GOOGLE_APPLICATION_CREDENTIALS to use Google Cloud TTS'
+            )
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google.cloud import texttospeech
+
+            client_options = None
+            if settings.GOOGLE_TTS_API_KEY:
+                client_options = {'api_key': settings.GOOGLE_TTS_API_KEY}
+            self._client = texttospeech.TextToSpeechClient(client_options=client_options)
+        return self._client
+
+    def synthesize(self, text):
+        from google.cloud import texttospeech
+
+        response = self.client.synthesize_speech(
+            input=texttospeech.SynthesisInput(text=text),
+            voice=texttospeech.VoiceSelectionParams(language_code='ru-RU', name=self.voice),
+            audio_config=texttospeech.AudioConfig(
+                audio_encoding=texttospeech.AudioEncoding.MP3,
+                speaking_rate=0.75 if self.slow else 1.0,
+            ),
+        )
+        return response.audio_content
+
+
+class LocalProvider(TTSProvider):
+    """Offline stub: silent MP3s about as long as the phrase would take to say."""
+
+    name = 'local'
+
+    # 24 kHz mono frames, like gTTS output
+    FRAME_HEADER = b'\xff\xf3\x44\xc4'
+    SECONDS_PER_CHARACTER = 0.08
+
+    def synthesize(self, text):
+        header = FrameHeader(self.FRAME_HEADER)
+        seconds = max(len(text), 1) * self.SECONDS_PER_CHARACTER * (1.5 if self.slow else 1.0)
+        frames = max(1, round(seconds * header.sample_rate / header.samples))
+        return header.silent_frame() * frames
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (GTTSProvider, GoogleCloudProvider, LocalProvider)
+}
+
+
+def get_provider(name, voice=None, slow=False):
+    """Instantiate and check the provider registered under `name`."""
+    try:
+        provider_class = PROVIDERS[name]
+    except KeyError:
+        raise ProviderUnavailable(f'Unknown TTS provider: {name}')
+    provider = provider_class(voice=voice, slow=slow)
+    provider.check()
+    return provider
+
+
+def load_manifest(audio_dir):
+    path = Path(audio_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(audio_dir, manifest):
+    path = Path(audio_dir) / MANIFEST_NAME
+    path.write_text(
+        json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True) + '\n',
+        encoding='utf-8'
+    )
+
+
+def write_atomic(path, data):
+    """Write via a temporary file, so an interrupted run never leaves a half-written MP3."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def generate_phrases(provider, phrases, audio_dir, jobs=4, force=False, on_result=None):
+    """
+    Synthesize every phrase whose manifest entry is missing or stale.
+
+    `phrases` maps file name (without .mp3) -> text. `on_result(name, text,
+    error)` is called for each synthesized phrase as it finishes (error is None
+    on success). Returns (generated, skipped, errors) where errors maps file
+    name -> message. The manifest is saved even if some phrases fail.
+    """
+    audio_dir = Path(audio_dir)
+    audio_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(audio_dir)
+
+    pending = {}
+    skipped = []
+    for name, text in phrases.items():
+        key = provider.cache_key(text)
+        entry = manifest.get(name)
+        if not force and entry and entry['key'] == key and (audio_dir / f'{name}.mp3').exists():
+            skipped.append(name)
+        else:
+            pending[name] = (text, key)
+
+    generated = []
+    errors = {}
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {
+                executor.submit(provider.synthesize, text): name
+                for name, (text, key) in pending.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                text, key = pending[name]
+                try:
+                    write_atomic(audio_dir / f'{name}.mp3', future.result())
+                except Exception as e:
+                    errors[name] = str(e)
+                    if on_result:
+                        on_result(name, text, e)
+                    continue
+                manifest[name] = {
+                    'key': key,
+                    'text': text,
+                    'provider': provider.name,
+                    'voice': provider.voice,
+                    'slow': provider.slow,
+                }
+                generated.append(name)
+                if on_result:
+                    on_result(name, text, None)
+        save_manifest(audio_dir, manifest)
+
+    return generated, skipped, errors
@@ -8,6 +8,12 @@ urlpatterns = [
     path('<int:category_id>/', views.technique_list_view, name='techniques'),
     path('technique/<int:technique_id>/', views.technique_detail_view, name='technique'),
     path('guide/<int:technique_id>/', views.guide_view, name='guide'),
+    path('sw.js', views.service_worker, name='service_worker'),
+    path('api/technique/<int:technique_id>/timeline/', views.technique_timeline, name='technique_timeline'),
     path('api/session/', views.session_manage, name='session_manage'),
+    path('api/session/batch/', views.session_batch, name='session_batch'),
+    path('api/session/export/', views.session_export, name='session_export'),
+    path('api/session/analytics/', views.session_analytics, name='session_analytics'),
+    path('api/session/history/', views.session_history, name='session_history'),
 ]
 
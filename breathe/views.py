@@ -1,37 +1,74 @@
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.shortcuts import render
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import condition, require_http_methods
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError
+from asgiref.sync import sync_to_async
+from datetime import datetime, timezone as dt_timezone
 import json
-from .models import BreathingCategory, BreathingTechnique, BreathingSession
+from breathing.conditional import csrf_cookie_digest, make_etag
+from breathing.exports import parse_export_params, streaming_export_response
+from breathing.pagination import keyset_page, parse_page_params
+from breathing.ratelimit import rate_limit
+from .analytics import technique_analytics, user_analytics
+from .audio import get_sprite_manifest
+from .catalog import get_catalog, get_catalog_version
+from .models import BreathingSession
+from .precache import get_precache
+from .timeline import get_timeline
+from . import sessions
+from .exports import SESSION_EXPORT_FIELDS, session_export_rows
 
 
+def catalog_etag(request, *args, **kwargs):
+    """ETag for catalog pages: catalog version plus the CSRF cookie the page embeds."""
+    csrf_digest = csrf_cookie_digest(request)
+    if csrf_digest is None:
+        # The response will set a new CSRF cookie, so it must not be revalidated
+        return None
+    return make_etag('catalog', get_catalog_version(), request.path, csrf_digest)
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    """Last-Modified for catalog pages: time of the last catalog change."""
+    if csrf_cookie_digest(request) is None:
+        return None
+    return datetime.fromtimestamp(get_catalog_version(), tz=dt_timezone.utc)
+
+
+catalog_condition = condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+
+
+@catalog_condition
 def category_list_view(request):
     """Display all breathing categories."""
-    # Use prefetch_related to optimize queries - related_name is 'techniques'
-    categories = BreathingCategory.objects.all().order_by('pk').prefetch_related('techniques')
+    # Served from the in-memory catalog snapshot, no database queries
     context = {
-        'categories': categories,
+        'categories': get_catalog().categories,
     }
     return render(request, 'breathe/categories.html', context)
 
 
+@catalog_condition
 def technique_list_view(request, category_id):
     """Display all techniques for a specific category."""
-    category = get_object_or_404(BreathingCategory, pk=category_id)
-    # Use select_related to optimize foreign key lookups
-    techniques = BreathingTechnique.objects.filter(category=category).select_related('category').order_by('id')
+    category = get_catalog().get_category(category_id)
+    if category is None:
+        raise Http404('Category not found')
     context = {
         'category': category,
-        'techniques': techniques,
+        'techniques': category.techniques,
     }
     return render(request, 'breathe/techniques.html', context)
 
 
+@catalog_condition
 def technique_detail_view(request, technique_id):
     """Display technique detail/preparation screen."""
-    technique = get_object_or_404(BreathingTechnique.objects.select_related('category'), pk=technique_id)
+    technique = get_catalog().get_technique(technique_id)
+    if technique is None:
+        raise Http404('Technique not found')
     # Map breath_origin to Russian description for display
     breath_origin_map = {
         'ABDOMEN': 'Брюшное дыхание',
@@ -49,9 +86,12 @@ def technique_detail_view(request, technique_id):
     return render(request, 'breathe/preparation.html', context)
 
 
+@catalog_condition
 def guide_view(request, technique_id):
     """Display active breathing guide screen."""
-    technique = get_object_or_404(BreathingTechnique.objects.select_related('category'), pk=technique_id)
+    technique = get_catalog().get_technique(technique_id)
+    if technique is None:
+        raise Http404('Technique not found')
     # Map breath_origin to Russian description for display
     breath_origin_map = {
         'ABDOMEN': 'Брюшное дыхание',
@@ -65,12 +105,67 @@ def guide_view(request, technique_id):
     context = {
         'technique': technique,
         'technique_breath_origin_ru': technique_breath_origin_ru,
+        'timeline': get_timeline(technique).as_dict(),
+        'audio_sprite': get_sprite_manifest(),
     }
     return render(request, 'breathe/guide.html', context)
 
 
+def timeline_etag(request, technique_id):
+    technique = get_catalog().get_technique(technique_id)
+    if technique is None:
+        return None
+    return make_etag('timeline', technique_id, get_timeline(technique).version)
+
+
+@require_http_methods(["GET"])
+@condition(etag_func=timeline_etag)
+def technique_timeline(request, technique_id):
+    """JSON phase timeline of a technique (see breathe.timeline)."""
+    technique = get_catalog().get_technique(technique_id)
+    if technique is None:
+        return JsonResponse({'success': False, 'error': 'Technique not found'}, status=404)
+    
+    return JsonResponse({
+        'success': True,
+        'technique_id': technique.id,
+        'timeline': get_timeline(technique).as_dict()
+    })
+
+
+def service_worker_etag(request):
+    return make_etag('sw', get_precache()['version'])
+
+
+@require_http_methods(["GET"])
+@condition(etag_func=service_worker_etag)
+def service_worker(request):
+    """Service worker precaching the guide's assets and catalog pages (see breathe.precache)."""
+    response = render(
+        request,
+        'breathe/sw.js',
+        {'precache': json.dumps(get_precache())},
+        content_type='application/javascript'
+    )
+    # Browsers must see a new version as soon as the catalog or an asset changes
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def session_progress_params(data):
+    """(session_id, cycles_completed) of an update/complete/cancel call; ValueError with the error message."""
+    session_id = data.get('session_id')
+    cycles_completed = data.get('cycles_completed', 0)
+    if not session_id:
+        raise ValueError('Session ID required')
+    if not isinstance(cycles_completed, int) or isinstance(cycles_completed, bool):
+        raise ValueError('Invalid cycles_completed')
+    return session_id, cycles_completed
+
+
 @require_http_methods(["POST"])
 @login_required
+@rate_limit('session_manage')
 def session_manage(request):
     """
     AJAX endpoint for creating and updating BreathingSession records.
@@ -78,28 +173,34 @@ def session_manage(request):
     """
     try:
         data = json.loads(request.body)
-        action = data.get('action')  # 'start', 'complete', 'cancel'
-        technique_id = data.get('technique_id')
-        
-        if not technique_id:
-            return JsonResponse({'success': False, 'error': 'Technique ID required'}, status=400)
-        
-        technique = get_object_or_404(BreathingTechnique.objects.select_related('category'), pk=technique_id)
+        action = data.get('action')  # 'start', 'update', 'complete', 'cancel'
         
         if action == 'start':
             # Create new session
+            technique_id = data.get('technique_id')
+            if not technique_id:
+                return JsonResponse({'success': False, 'error': 'Technique ID required'}, status=400)
+            
+            try:
+                technique = get_catalog().get_technique(int(technique_id))
+            except (TypeError, ValueError):
+                technique = None
+            if technique is None:
+                return JsonResponse({'success': False, 'error': 'Technique not found'}, status=404)
+            
             sound_enabled = data.get('sound_enabled', True)
             vibration_enabled = data.get('vibration_enabled', True)
             
             session = BreathingSession.objects.create(
                 user=request.user,
-                technique=technique,
+                technique_id=technique.id,
                 started_at=timezone.now(),
                 sound_enabled=sound_enabled,
                 vibration_enabled=vibration_enabled,
                 completed=False,
                 cycles_completed=0
             )
+            sessions.start_progress(session)
             
             return JsonResponse({
                 'success': True,
@@ -108,74 +209,264 @@ def session_manage(request):
             })
         
         elif action == 'update':
-            # Update existing session (cycles_completed)
-            session_id = data.get('session_id')
-            cycles_completed = data.get('cycles_completed', 0)
-            
-            if not session_id:
-                return JsonResponse({'success': False, 'error': 'Session ID required'}, status=400)
-            
+            # Heartbeat with cycles_completed; coalesced in the cache (see breathe.sessions)
             try:
-                session = BreathingSession.objects.select_related('technique', 'technique__category').get(pk=session_id, user=request.user)
-                session.cycles_completed = cycles_completed
-                session.save()
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': 'Session updated'
-                })
-            except BreathingSession.DoesNotExist:
+                session_id, cycles_completed = session_progress_params(data)
+            except ValueError as e:
+                return JsonResponse({'success': False, 'error': str(e)}, status=400)
+            
+            if not sessions.record_heartbeat(request.user, session_id, cycles_completed):
                 return JsonResponse({'success': False, 'error': 'Session not found'}, status=404)
+            
+            return JsonResponse({
+                'success': True,
+                'message': 'Session updated'
+            })
         
-        elif action == 'complete':
-            # Mark session as completed
-            session_id = data.get('session_id')
-            cycles_completed = data.get('cycles_completed', 0)
+        elif action in ('complete', 'cancel'):
+            # Mark session as completed or cancelled with a single UPDATE
+            try:
+                session_id, cycles_completed = session_progress_params(data)
+            except ValueError as e:
+                return JsonResponse({'success': False, 'error': str(e)}, status=400)
             
-            if not session_id:
-                return JsonResponse({'success': False, 'error': 'Session ID required'}, status=400)
+            duration_seconds = sessions.finish_session(
+                request.user,
+                session_id,
+                completed=(action == 'complete'),
+                cycles_completed=cycles_completed
+            )
+            if duration_seconds is None:
+                return JsonResponse({'success': False, 'error': 'Session not found'}, status=404)
             
-            try:
-                session = BreathingSession.objects.select_related('technique', 'technique__category').get(pk=session_id, user=request.user)
-                session.completed_at = timezone.now()
-                session.completed = True
-                session.cycles_completed = cycles_completed
-                session.save()  # duration_seconds calculated in save() method
-                
+            if action == 'complete':
                 return JsonResponse({
                     'success': True,
                     'message': 'Session completed',
-                    'duration_seconds': session.duration_seconds
+                    'duration_seconds': duration_seconds
                 })
-            except BreathingSession.DoesNotExist:
-                return JsonResponse({'success': False, 'error': 'Session not found'}, status=404)
+            return JsonResponse({
+                'success': True,
+                'message': 'Session cancelled'
+            })
         
-        elif action == 'cancel':
-            # Mark session as cancelled
-            session_id = data.get('session_id')
-            cycles_completed = data.get('cycles_completed', 0)
-            
-            if not session_id:
-                return JsonResponse({'success': False, 'error': 'Session ID required'}, status=400)
+        else:
+            return JsonResponse({'success': False, 'error': 'Invalid action'}, status=400)
+    
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@require_http_methods(["POST"])
+@login_required
+@rate_limit('session_manage')
+async def session_manage_async(request):
+    """
+    Async session_manage for ASGI serving (see breathing.asgi_urls), with the
+    same actions and responses. Sessions are created with the async ORM;
+    heartbeats and complete/cancel go through breathe.sessions in a thread,
+    since finishing a session updates the summaries in one transaction.
+    """
+    user = await request.auser()
+    try:
+        data = json.loads(request.body)
+        action = data.get('action')
+        
+        if action == 'start':
+            technique_id = data.get('technique_id')
+            if not technique_id:
+                return JsonResponse({'success': False, 'error': 'Technique ID required'}, status=400)
             
+            # The catalog checks its version in the shared cache
+            catalog = await sync_to_async(get_catalog)()
             try:
-                session = BreathingSession.objects.select_related('technique', 'technique__category').get(pk=session_id, user=request.user)
-                session.completed_at = timezone.now()
-                session.completed = False
-                session.cycles_completed = cycles_completed
-                session.save()
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': 'Session cancelled'
-                })
-            except BreathingSession.DoesNotExist:
-                return JsonResponse({'success': False, 'error': 'Session not found'}, status=404)
+                technique = catalog.get_technique(int(technique_id))
+            except (TypeError, ValueError):
+                technique = None
+            if technique is None:
+                return JsonResponse({'success': False, 'error': 'Technique not found'}, status=404)
+            
+            session = await BreathingSession.objects.acreate(
+                user=user,
+                technique_id=technique.id,
+                started_at=timezone.now(),
+                sound_enabled=data.get('sound_enabled', True),
+                vibration_enabled=data.get('vibration_enabled', True),
+                completed=False,
+                cycles_completed=0
+            )
+            await sync_to_async(sessions.start_progress)(session)
+            
+            return JsonResponse({
+                'success': True,
+                'session_id': session.id,
+                'message': 'Session started'
+            })
         
-        else:
+        if action not in ('update', 'complete', 'cancel'):
             return JsonResponse({'success': False, 'error': 'Invalid action'}, status=400)
+        
+        try:
+            session_id, cycles_completed = session_progress_params(data)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        
+        if action == 'update':
+            if not await sync_to_async(sessions.record_heartbeat)(user, session_id, cycles_completed):
+                return JsonResponse({'success': False, 'error': 'Session not found'}, status=404)
+            return JsonResponse({
+                'success': True,
+                'message': 'Session updated'
+            })
+        
+        duration_seconds = await sync_to_async(sessions.finish_session)(
+            user,
+            session_id,
+            completed=(action == 'complete'),
+            cycles_completed=cycles_completed
+        )
+        if duration_seconds is None:
+            return JsonResponse({'success': False, 'error': 'Session not found'}, status=404)
+        
+        if action == 'complete':
+            return JsonResponse({
+                'success': True,
+                'message': 'Session completed',
+                'duration_seconds': duration_seconds
+            })
+        return JsonResponse({
+            'success': True,
+            'message': 'Session cancelled'
+        })
     
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@require_http_methods(["POST"])
+@rate_limit('session_batch')
+def session_batch(request):
+    """
+    AJAX endpoint for session events queued by the client.
+    Expects {"events": [{"type", "session_uuid", "timestamp", ...}, ...]} in
+    the order they happened: 'start' events carry technique_id, sound_enabled
+    and vibration_enabled; 'update', 'complete' and 'cancel' carry
+    cycles_completed. All events are applied in one transaction and
+    retries are recognised by session_uuid (see breathe.sessions).
+    Guests get 401 rather than a login redirect so the client drops its queue.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'success': False, 'error': 'Authentication required'}, status=401)
+    
+    try:
+        data = json.loads(request.body)
+        events = data.get('events')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    
+    if not isinstance(events, list) or len(events) > sessions.SESSION_BATCH_MAX_EVENTS:
+        return JsonResponse({'success': False, 'error': 'Invalid events'}, status=400)
+    
+    try:
+        results = sessions.apply_session_events(request.user, events)
+    except IntegrityError:
+        # A concurrent retry created the same session first; resending is safe
+        return JsonResponse({'success': False, 'error': 'Conflict, please retry'}, status=409)
+    
+    return JsonResponse({
+        'success': True,
+        'results': results
+    })
+
+
+@require_http_methods(["GET"])
+@login_required
+def session_export(request):
+    """
+    Download the user's BreathingSession history (with technique and category
+    names) as NDJSON or CSV, streamed in chunks.
+    Query parameters: format ('ndjson' or 'csv'), gzip (1 to compress),
+    start/end (ISO dates or datetimes; end date inclusive).
+    """
+    try:
+        export_format, compress, start, end = parse_export_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return streaming_export_response(
+        session_export_rows(user=request.user, start=start, end=end),
+        SESSION_EXPORT_FIELDS,
+        export_format,
+        compress,
+        filename='breathing_sessions'
+    )
+
+
+SESSION_HISTORY_FIELDS = [
+    'id', 'technique_id', 'started_at', 'completed_at', 'duration_seconds',
+    'completed', 'cycles_completed',
+]
+
+
+@require_http_methods(["GET"])
+@login_required
+def session_history(request):
+    """
+    The user's breathing sessions, newest first, one keyset page at a time
+    (see breathing.pagination). Query parameters: cursor (next_cursor of the
+    previous page), limit (default 50, at most 200) and technique (technique id).
+    Technique names come from the catalog snapshot, not a join.
+    """
+    try:
+        position, limit = parse_page_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    history = BreathingSession.objects.filter(user=request.user)
+    technique_id = request.GET.get('technique')
+    if technique_id:
+        try:
+            history = history.filter(technique_id=int(technique_id))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid technique'}, status=400)
+    
+    results, next_cursor = keyset_page(history, 'started_at', SESSION_HISTORY_FIELDS, position, limit)
+    catalog = get_catalog()
+    for row in results:
+        technique = catalog.get_technique(row['technique_id'])
+        row['technique'] = technique.name_ru if technique else None
+    
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'next_cursor': next_cursor
+    })
+
+
+@require_http_methods(["GET"])
+@login_required
+def session_analytics(request):
+    """
+    Breathing session analytics from the summary tables (see breathe.analytics):
+    totals, usage and completion per technique and category, and the effect of
+    sound/vibration cues on completion. scope=all (staff only) covers all users.
+    """
+    scope = request.GET.get('scope', 'user')
+    if scope == 'all':
+        if not request.user.is_staff:
+            return JsonResponse({'success': False, 'error': 'Forbidden'}, status=403)
+        analytics = technique_analytics()
+    elif scope == 'user':
+        analytics = user_analytics(request.user)
+    else:
+        return JsonResponse({'success': False, 'error': 'Invalid scope'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'scope': scope,
+        **analytics
+    })
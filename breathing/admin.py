@@ -0,0 +1,126 @@
+"""
+Admin changelist helpers for tables that grow without bound (ActivityLog,
+BreathingSession).
+
+The stock changelist runs an exact COUNT(*) for paging (and a second one for
+the unfiltered total), lists every user in a related-field filter and, with
+date_hierarchy, scans the table for its distinct dates. Here:
+
+- EstimatedCountPaginator takes the planner's row estimate on PostgreSQL and
+  only counts exactly when the estimate is small; elsewhere the count stops
+  at COUNT_LIMIT rows
+- AutocompleteFilter filters by a foreign key with a select2 search box
+  backed by the admin's autocomplete view, instead of a list of all rows
+- LargeTableAdmin turns off the full result count and facet counts
+
+Date filtering uses the DateFieldListFilter ranges (today, past 7 days, ...),
+which are index range scans, rather than date_hierarchy.
+"""
+
+import json
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.utils import get_last_value_from_parameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.forms.utils import flatatt
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+
+# Results up to this size are counted exactly
+COUNT_LIMIT = 10000
+
+
+def planner_estimate(queryset):
+    """Rows PostgreSQL's planner expects `queryset` to return (EXPLAIN, nothing is executed)."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator whose count is estimated for large results: the planner's
+    estimate on PostgreSQL when it exceeds COUNT_LIMIT, otherwise a count that
+    reads at most COUNT_LIMIT + 1 rows. Beyond the limit the page count is
+    approximate, which is fine for browsing the newest rows.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = planner_estimate(queryset)
+            if estimate > COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:COUNT_LIMIT + 1].count()
+
+
+class AutocompleteFilter(admin.FieldListFilter):
+    """
+    Foreign key filter with a search box, for related tables too big to list.
+    The related model's admin must define search_fields.
+
+        list_filter = [('user', AutocompleteFilter)]
+    """
+
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = get_last_value_from_parameters(params, self.lookup_kwarg)
+        self.admin_site = model_admin.admin_site
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    @cached_property
+    def selected(self):
+        """The related object filtered by, if any."""
+        if not self.lookup_val:
+            return None
+        try:
+            return self.field.remote_field.model._default_manager.filter(pk=self.lookup_val).first()
+        except (ValueError, ValidationError):
+            return None
+
+    @cached_property
+    def select_attrs(self):
+        """Attributes that make the filter's <select> an admin autocomplete widget."""
+        widget = AutocompleteSelect(self.field, self.admin_site)
+        return flatatt(widget.build_attrs({}, {'name': self.lookup_kwarg}))
+
+    def choices(self, changelist):
+        self.clear_query_string = changelist.get_query_string(remove=[self.lookup_kwarg])
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': self.clear_query_string,
+            'display': _('All'),
+        }
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ModelAdmin for tables with millions of rows (see the module docstring)."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, tuple) and issubclass(list_filter[1], AutocompleteFilter):
+                field = self.model._meta.get_field(list_filter[0])
+                media += AutocompleteSelect(field, self.admin_site).media
+                media += forms.Media(js=['js/admin-autocomplete-filter.js'])
+                break
+        return media
@@ -3,6 +3,14 @@ ASGI config for breathing project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through ASGI is required for the long-lived Server-Sent Events stream
+of live activity counts (``tracker.views.activity_stream``); under WSGI that
+endpoint answers 204 so clients stop reconnecting.
+
+Unless ASYNC_VIEWS is set, the ASGI application routes activity taps and
+session calls to their async views (``breathing.asgi_urls``), so a request
+waiting for the database doesn't hold a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -12,5 +20,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'breathing.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
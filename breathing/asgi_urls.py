@@ -0,0 +1,42 @@
+"""
+URL configuration for ASGI serving (settings.ASYNC_VIEWS).
+
+The routes of breathing.urls, with the write APIs taps and session calls
+served by their async variants. URL names are unchanged, so templates and
+`reverse()` work the same under either configuration.
+"""
+from django.urls import URLPattern, URLResolver
+
+from breathe import views as breathe_views
+from tracker import views as tracker_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+# View name -> async view replacing the sync one
+ASYNC_VIEWS = {
+    'tracker:activity_tap': tracker_views.activity_tap_async,
+    'breathe:session_manage': breathe_views.session_manage_async,
+}
+
+
+def with_async_views(patterns, namespace=None):
+    """Copy of `patterns` with the views listed in ASYNC_VIEWS swapped in."""
+    swapped = []
+    for entry in patterns:
+        if isinstance(entry, URLResolver):
+            swapped.append(URLResolver(
+                entry.pattern,
+                with_async_views(entry.url_patterns, entry.namespace),
+                entry.default_kwargs,
+                app_name=entry.app_name,
+                namespace=entry.namespace,
+            ))
+            continue
+        view = ASYNC_VIEWS.get(f'{namespace}:{entry.name}' if namespace else entry.name)
+        if view is not None:
+            entry = URLPattern(entry.pattern, view, entry.default_args, entry.name)
+        swapped.append(entry)
+    return swapped
+
+
+urlpatterns = with_async_views(sync_urlpatterns)
@@ -0,0 +1,498 @@
+"""
+Endpoint latency benchmarks on seeded data (see the benchmark_endpoints command).
+
+A dataset of `rows` ActivityLog rows (plus one BreathingSession per ten taps)
+is spread over two years and a number of users that grows with the scale,
+with the rollups, counters and session summary tables brought up to date as
+in production. Each hot endpoint is then driven through the Django test
+client as the heaviest user, recording p50/p95/p99 latency and the number of
+queries per request.
+
+`tap_throughput` answers a different question: how many activity taps per
+second one worker serves when many arrive at once. It drives the real WSGI
+handler from a thread pool the size of the Procfile's gunicorn threads, or
+the real ASGI handler (with the async views of breathing.asgi_urls) with many
+requests in flight on one event loop. The handlers run in-process, without
+an HTTP server or network in front, and `db_latency` adds a sleep to every
+query to stand in for the round trip to a database server.
+
+Results are compared with a committed baseline (benchmarks/baseline.json):
+an endpoint regresses when its p95 grows by more than the threshold (and by
+at least MIN_REGRESSION_MS, so sub-millisecond noise doesn't fail a run) or
+when its median request runs more queries than before. Query counts don't depend on the
+machine; latencies only compare meaningfully on similar hardware, so the
+baseline records the environment it was measured in.
+"""
+
+import asyncio
+import io
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_test_environment, teardown_test_environment,
+)
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from breathe.analytics import rebuild_stats
+from breathe.catalog import get_catalog
+from breathe.models import BreathingSession, TechniqueStats, UserTechniqueStats
+from breathe.sync import sync_catalog
+from tracker.models import ActivityCounter, ActivityLog
+from tracker.rollups import update_rollups
+
+SCALES = {
+    '10k': 10_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+BASELINE_PATH = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+DEFAULT_REQUESTS = 200
+DEFAULT_WARMUP = 10
+DEFAULT_THRESHOLD = 0.25
+
+# p95 growth below this is treated as noise
+MIN_REGRESSION_MS = 2.0
+
+SEED_BATCH_SIZE = 10_000
+HISTORY_DAYS = 730
+USERNAME_PREFIX = 'bench'
+
+FIXTURE_PATH = Path(settings.BASE_DIR) / 'breathe' / 'fixtures' / 'breathing_techniques.json'
+
+DEFAULT_TAPS = 1000
+WSGI_THREADS = 2  # gunicorn --workers 1 --threads 2 (Procfile `web`)
+ASGI_CONCURRENCY = 50
+
+# SQLite test database shared by the throughput benchmark's threads
+SQLITE_BENCHMARK_PATH = Path(tempfile.gettempdir()) / 'breathing-benchmark.sqlite3'
+
+# Limits high enough never to trigger, so the limiter's cache round trips are still measured
+BENCHMARK_RATE_LIMITS = {
+    scope: {'default': (10 ** 9, 60)}
+    for scope in settings.RATE_LIMITS
+}
+
+
+@contextmanager
+def benchmark_database(keepdb=False, shared=False):
+    """
+    Run the block against a new test database (reused with `keepdb`), like
+    `manage.py test`. With `shared`, a SQLite test database is a file rather
+    than in memory, so concurrent requests wait for each other's writes
+    instead of failing.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict['TEST']
+    options = connection.settings_dict['OPTIONS']
+    old_test_name = test_settings.get('NAME')
+    old_options = dict(options)
+    if shared and connection.vendor == 'sqlite':
+        if not old_test_name:
+            test_settings['NAME'] = str(SQLITE_BENCHMARK_PATH)
+        # Take the write lock when a transaction starts, so two writers never deadlock,
+        # and skip fsync: a throwaway database shouldn't turn the run into a disk benchmark
+        options.update(
+            transaction_mode='IMMEDIATE',
+            timeout=30,
+            init_command='PRAGMA synchronous=OFF',
+        )
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        test_settings['NAME'] = old_test_name
+        options.clear()
+        options.update(old_options)
+        teardown_test_environment()
+
+
+def seed_once(rows):
+    """
+    (benchmark user, seeded), seeding `rows` taps first unless a kept
+    database already has them.
+    """
+    user = User.objects.filter(username=f'{USERNAME_PREFIX}0').first()
+    if user is not None and ActivityLog.objects.count() >= rows:
+        return user, False
+    return seed(rows), True
+
+
+def user_count(rows):
+    """Users sharing a dataset of `rows` taps: 1 for 10k, 11 for 1M, 101 for 10M."""
+    return 1 + rows // 100_000
+
+
+def seed(rows, seed_value=0, batch_size=SEED_BATCH_SIZE):
+    """
+    Seed the catalog, users, `rows` activity logs and rows // 10 finished
+    sessions, then update the derived tables. Deterministic for a given
+    `seed_value`. Returns the benchmark user (a superuser owning the largest share).
+    """
+    sync_catalog(FIXTURE_PATH)
+    technique_ids = sorted(get_catalog().techniques_by_id)
+    activity_types = [activity_type for activity_type, _ in ActivityLog.ACTIVITY_CHOICES]
+
+    User.objects.bulk_create([
+        User(
+            username=f'{USERNAME_PREFIX}{index}',
+            password=make_password(None),
+            is_staff=index == 0,
+            is_superuser=index == 0,
+        )
+        for index in range(user_count(rows))
+    ])
+    user_ids = [user.id for user in User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id')]
+
+    generator = random.Random(seed_value)
+    now = timezone.now()
+    span = HISTORY_DAYS * 24 * 60 * 60
+
+    def moments(count):
+        return sorted(now - timedelta(seconds=generator.uniform(0, span)) for _ in range(count))
+
+    # The first user gets half of the rows, the others share the rest
+    def owner(index):
+        return user_ids[0] if index % 2 == 0 or len(user_ids) == 1 else user_ids[1 + index % (len(user_ids) - 1)]
+
+    for start in range(0, rows, batch_size):
+        count = min(batch_size, rows - start)
+        ActivityLog.objects.bulk_create([
+            ActivityLog(user_id=owner(start + index), activity_type=generator.choice(activity_types), timestamp=moment)
+            for index, moment in enumerate(moments(count))
+        ])
+
+    sessions = rows // 10
+    for start in range(0, sessions, batch_size):
+        count = min(batch_size, sessions - start)
+        batch = []
+        for index, moment in enumerate(moments(count)):
+            completed = generator.random() < 0.8
+            duration = generator.randint(60, 600) if completed else generator.randint(10, 120)
+            batch.append(BreathingSession(
+                user_id=owner(start + index),
+                technique_id=generator.choice(technique_ids),
+                started_at=moment,
+                completed_at=moment + timedelta(seconds=duration),
+                duration_seconds=duration,
+                completed=completed,
+                cycles_completed=duration // 16,
+                sound_enabled=generator.random() < 0.7,
+                vibration_enabled=generator.random() < 0.5,
+            ))
+        BreathingSession.objects.bulk_create(batch)
+
+    update_rollups(lag=0)
+    for user in User.objects.filter(id__in=user_ids):
+        ActivityCounter.rebuild_for_user(user)
+    rebuild_stats(UserTechniqueStats)
+    rebuild_stats(TechniqueStats)
+    with connection.cursor() as cursor:
+        # Fresh planner statistics, as autovacuum would have by now
+        cursor.execute('ANALYZE')
+    return User.objects.get(username=f'{USERNAME_PREFIX}0')
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def measure(call, requests, warmup):
+    """Latency percentiles (ms) and the median query count of `requests` calls to `call`."""
+    for _ in range(warmup):
+        call()
+    timings = []
+    queries = []
+    for _ in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = call()
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{response.status_code} from {response.request["PATH_INFO"]}')
+        queries.append(len(captured))
+    timings.sort()
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        # The typical request: an occasional one also runs periodic work (cache generation check, progress flush)
+        'queries': statistics.median_low(queries),
+    }
+
+
+def endpoints(client):
+    """(name, call) pairs for the hot endpoints, as the logged-in benchmark user."""
+    catalog = get_catalog()
+    category = catalog.categories[0]
+    technique = category.techniques[0]
+    activity_types = [activity_type for activity_type, _ in ActivityLog.ACTIVITY_CHOICES]
+    taps = iter(range(10 ** 9))
+    open_sessions = []
+
+    def post(name, data):
+        return client.post(reverse(name), data=json.dumps(data), content_type='application/json')
+
+    def tap():
+        return post('tracker:activity_tap', {'activity_type': activity_types[next(taps) % len(activity_types)]})
+
+    def start_session():
+        response = post('breathe:session_manage', {'action': 'start', 'technique_id': technique.id})
+        open_sessions.append(response.json()['session_id'])
+        return response
+
+    def complete_session():
+        if not open_sessions:
+            start_session()
+        return post('breathe:session_manage', {
+            'action': 'complete', 'session_id': open_sessions.pop(), 'cycles_completed': 5,
+        })
+
+    return [
+        ('home', lambda: client.get(reverse('home'))),
+        ('categories', lambda: client.get(reverse('breathe:categories'))),
+        ('techniques', lambda: client.get(reverse('breathe:techniques', args=[category.id]))),
+        ('technique', lambda: client.get(reverse('breathe:technique', args=[technique.id]))),
+        ('guide', lambda: client.get(reverse('breathe:guide', args=[technique.id]))),
+        ('activity_tap', tap),
+        ('session_start', start_session),
+        ('session_complete', complete_session),
+        ('activity_history', lambda: client.get(reverse('tracker:activity_history'))),
+        ('session_history', lambda: client.get(reverse('breathe:session_history'))),
+    ]
+
+
+def run_benchmarks(user, requests=DEFAULT_REQUESTS, warmup=DEFAULT_WARMUP, only=None):
+    """{endpoint name: measurements} for `user`, optionally limited to the names in `only`."""
+    client = Client()
+    client.force_login(user)
+    results = {}
+    with override_settings(RATE_LIMITS=BENCHMARK_RATE_LIMITS):
+        for name, call in endpoints(client):
+            if only and name not in only:
+                continue
+            results[name] = measure(call, requests, warmup)
+    return results
+
+
+@contextmanager
+def simulated_db_latency(seconds):
+    """Sleep `seconds` before every query on connections opened inside the block."""
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def instrument(sender, connection, **kwargs):
+        # Fired on every reconnect of a thread's connection (each request with CONN_MAX_AGE=0)
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    if seconds <= 0:
+        yield
+        return
+    connection_created.connect(instrument)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(instrument)
+        for wrapper in connections.all(initialized_only=True):
+            if delay in wrapper.execute_wrappers:
+                wrapper.execute_wrappers.remove(delay)
+
+
+def tap_requests(user):
+    """(path, cookie header, CSRF token, bodies cycling through the activity types) for raw handler calls."""
+    client = Client()
+    client.force_login(user)
+    csrf_token = get_random_string(32)
+    cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; ' \
+             f'{settings.CSRF_COOKIE_NAME}={csrf_token}'
+    bodies = [
+        json.dumps({'activity_type': activity_type}).encode()
+        for activity_type, _ in ActivityLog.ACTIVITY_CHOICES
+    ]
+    return reverse('tracker:activity_tap'), cookie, csrf_token, bodies
+
+
+def run_wsgi_taps(user, taps, threads=WSGI_THREADS):
+    """Latencies (ms) and statuses of `taps` taps through the WSGI handler from `threads` threads."""
+    path, cookie, csrf_token, bodies = tap_requests(user)
+    handler = WSGIHandler()
+
+    def call(index):
+        body = bodies[index % len(bodies)]
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': path,
+            'SCRIPT_NAME': '',
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'HTTP_COOKIE': cookie,
+            'HTTP_X_CSRFTOKEN': csrf_token,
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        statuses = []
+        started = time.perf_counter()
+        response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        b''.join(response)
+        response.close()
+        return (time.perf_counter() - started) * 1000, int(statuses[0].split()[0])
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(call, range(taps)))
+
+
+def run_asgi_taps(user, taps, concurrency=ASGI_CONCURRENCY):
+    """Latencies (ms) and statuses of `taps` taps through the ASGI handler, `concurrency` at a time."""
+    path, cookie, csrf_token, bodies = tap_requests(user)
+    handler = ASGIHandler()
+
+    async def call(index, slots):
+        body = bodies[index % len(bodies)]
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'POST',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'root_path': '',
+            'query_string': b'',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'cookie', cookie.encode()),
+                (b'x-csrftoken', csrf_token.encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        statuses = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # The client never disconnects; Django cancels this once the response is sent
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        async with slots:
+            started = time.perf_counter()
+            await handler(scope, receive, send)
+            return (time.perf_counter() - started) * 1000, statuses[0]
+
+    async def main():
+        slots = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(call(index, slots) for index in range(taps)))
+
+    return asyncio.run(main())
+
+
+def tap_throughput(user, mode, taps=DEFAULT_TAPS, threads=WSGI_THREADS, concurrency=ASGI_CONCURRENCY,
+                   db_latency=0.0):
+    """
+    Serve `taps` activity taps through the 'wsgi' (sync views, `threads`
+    threads) or 'asgi' (async views, `concurrency` requests in flight)
+    handler. Returns taps per second, latency percentiles and the number of
+    failed requests.
+    """
+    urlconf = 'breathing.asgi_urls' if mode == 'asgi' else 'breathing.urls'
+    with override_settings(RATE_LIMITS=BENCHMARK_RATE_LIMITS, ROOT_URLCONF=urlconf), \
+            simulated_db_latency(db_latency):
+        started = time.perf_counter()
+        if mode == 'asgi':
+            results = run_asgi_taps(user, taps, concurrency)
+        else:
+            results = run_wsgi_taps(user, taps, threads)
+        elapsed = time.perf_counter() - started
+    timings = sorted(timing for timing, _ in results)
+    return {
+        'taps_per_second': round(taps / elapsed, 1),
+        'p50_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'errors': sum(1 for _, status in results if status != 200),
+    }
+
+
+def environment():
+    """Where a run was measured; stored next to baseline numbers."""
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+        'measured_at': timezone.now().date().isoformat(),
+    }
+
+
+def load_baseline(path=BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(baseline, path=BASELINE_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+
+
+def compare(results, baseline_endpoints, threshold=DEFAULT_THRESHOLD):
+    """Regression messages for `results` against one scale's baseline endpoints."""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline_endpoints.get(name)
+        if expected is None:
+            continue
+        limit = expected['p95_ms'] * (1 + threshold)
+        if result['p95_ms'] > limit and result['p95_ms'] - expected['p95_ms'] >= MIN_REGRESSION_MS:
+            regressions.append(
+                f'{name}: p95 {result["p95_ms"]:.2f} ms > {expected["p95_ms"]:.2f} ms + {threshold:.0%}'
+            )
+        if result['queries'] > expected['queries']:
+            regressions.append(f'{name}: {result["queries"]} queries > {expected["queries"]}')
+    return regressions
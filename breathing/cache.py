@@ -0,0 +1,315 @@
+"""
+Two-level cache backend: a bounded in-process LRU in front of another cache.
+
+Hits served from the local tier cost no I/O at all; misses fall through to the
+backing cache (e.g. DatabaseCache) and are copied into the local tier. Writes
+go to both tiers. Local entries live at most LOCAL_TIMEOUT seconds, so values
+changed by another process are picked up within that window.
+
+For immediate invalidation across processes, a generation number is stored in
+the backing cache. Each process re-reads it at most every
+GENERATION_CHECK_INTERVAL seconds and drops its local tier when it changed;
+`invalidate_local()` and `clear()` bump it.
+
+Atomic operations (add, incr, decr) always go to the backing cache, so rate
+limiting and counters keep working across workers.
+
+Configuration:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'breathing.cache.TieredCache',
+            'LOCATION': 'db',  # alias of the backing cache
+            'OPTIONS': {
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 5,
+                'GENERATION_CHECK_INTERVAL': 5,
+            },
+        },
+        'db': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache_table',
+        },
+    }
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .metrics import record_cache_lookup
+
+GENERATION_KEY = 'tiered-cache:generation'
+
+_MISSING = object()
+
+
+class _LocalTier:
+    """
+    Process-wide state of one local tier. Django creates cache instances per
+    thread, so the LRU and counters live here (keyed by LOCATION, like
+    LocMemCache does) to be shared by all threads of the worker.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()  # key -> (expires_at, pickled value)
+        self.lock = threading.Lock()
+        self.generation = None
+        self.generation_checked_at = 0.0
+        self.counters = {
+            'local_hits': 0,
+            'local_misses': 0,
+            'backing_hits': 0,
+            'backing_misses': 0,
+        }
+
+
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """Bounded per-process LRU (tier 1) layered over any Django cache (tier 2)."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.backing_alias = location
+        self.local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self.local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self.generation_check_interval = float(options.get('GENERATION_CHECK_INTERVAL', 5))
+
+        with _local_tiers_lock:
+            self._tier = _local_tiers.setdefault(location, _LocalTier())
+        self._local = self._tier.entries
+        self._lock = self._tier.lock
+
+    @property
+    def backing(self):
+        return caches[self.backing_alias]
+
+    def _version(self, version):
+        return self.version if version is None else version
+
+    # Local tier -------------------------------------------------------------
+
+    def _local_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def _local_expiry(self, timeout):
+        """Monotonic expiry for a local entry: the smaller of the value's timeout and LOCAL_TIMEOUT."""
+        timeout = self._backing_timeout(timeout)
+        local_timeout = self.local_timeout
+        if timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        return time.monotonic() + local_timeout
+
+    def _local_get(self, local_key):
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is None:
+                return _MISSING
+            expires_at, pickled = entry
+            if expires_at <= time.monotonic():
+                del self._local[local_key]
+                return _MISSING
+            self._local.move_to_end(local_key)
+        return pickle.loads(pickled)
+
+    def _local_set(self, local_key, value, timeout=DEFAULT_TIMEOUT):
+        if self.local_max_entries <= 0:
+            return
+        timeout = self._backing_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            # Non-positive timeouts mean "expire immediately"
+            self._local_delete(local_key)
+            return
+        expires_at = self._local_expiry(timeout)
+        # Stored pickled, like LocMemCache, so callers can't mutate cached values
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[local_key] = (expires_at, pickled)
+            self._local.move_to_end(local_key)
+            while len(self._local) > self.local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, local_key):
+        with self._lock:
+            self._local.pop(local_key, None)
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self._tier.counters[name] += amount
+        # Per-request hits/misses for /metrics (a local miss may still hit the backing cache)
+        record_cache_lookup(
+            hits=amounts.get('local_hits', 0) + amounts.get('backing_hits', 0),
+            misses=amounts.get('backing_misses', 0),
+        )
+
+    def _check_generation(self):
+        """Drop the local tier if another process bumped the shared generation."""
+        now = time.monotonic()
+        if now - self._tier.generation_checked_at < self.generation_check_interval:
+            return
+        self._tier.generation_checked_at = now
+        generation = self.backing.get(GENERATION_KEY)
+        if generation != self._tier.generation:
+            with self._lock:
+                self._local.clear()
+            self._tier.generation = generation
+
+    def invalidate_local(self):
+        """Clear the local tier here and (within the check interval) in every other process."""
+        generation = time.time_ns()
+        self.backing.set(GENERATION_KEY, generation, timeout=None)
+        with self._lock:
+            self._local.clear()
+        self._tier.generation = generation
+        self._tier.generation_checked_at = time.monotonic()
+
+    # Cache API --------------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        version = self._version(version)
+        local_key = self._local_key(key, version)
+        self._check_generation()
+
+        value = self._local_get(local_key)
+        if value is not _MISSING:
+            self._count(local_hits=1)
+            return value
+
+        value = self.backing.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count(local_misses=1, backing_misses=1)
+            return default
+        self._count(local_misses=1, backing_hits=1)
+        self._local_set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        version = self._version(version)
+        self._check_generation()
+        found = {}
+        remaining = []
+        for key in keys:
+            value = self._local_get(self._local_key(key, version))
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+        self._count(local_hits=len(found), local_misses=len(remaining))
+        if remaining:
+            fetched = self.backing.get_many(remaining, version=version)
+            self._count(
+                backing_hits=len(fetched),
+                backing_misses=len(remaining) - len(fetched)
+            )
+            for key, value in fetched.items():
+                self._local_set(self._local_key(key, version), value)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        self.backing.set(key, value, timeout=self._backing_timeout(timeout), version=version)
+        self._local_set(self._local_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        failed = self.backing.set_many(data, timeout=self._backing_timeout(timeout), version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._local_set(self._local_key(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        added = self.backing.add(key, value, timeout=self._backing_timeout(timeout), version=version)
+        local_key = self._local_key(key, version)
+        if added:
+            self._local_set(local_key, value, timeout)
+        else:
+            self._local_delete(local_key)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        self._local_delete(self._local_key(key, version))
+        return self.backing.touch(key, timeout=self._backing_timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        version = self._version(version)
+        self._local_delete(self._local_key(key, version))
+        return self.backing.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        version = self._version(version)
+        for key in keys:
+            self._local_delete(self._local_key(key, version))
+        self.backing.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        version = self._version(version)
+        if self._local_get(self._local_key(key, version)) is not _MISSING:
+            return True
+        return self.backing.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        version = self._version(version)
+        self._local_delete(self._local_key(key, version))
+        return self.backing.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        version = self._version(version)
+        self._local_delete(self._local_key(key, version))
+        return self.backing.decr(key, delta, version=version)
+
+    def clear(self):
+        self.backing.clear()
+        self.invalidate_local()
+
+    def close(self, **kwargs):
+        self.backing.close(**kwargs)
+
+    def _backing_timeout(self, timeout):
+        # Resolve DEFAULT_TIMEOUT with this cache's TIMEOUT, not the backing cache's
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    # Introspection ----------------------------------------------------------
+
+    def stats(self):
+        """Hit/miss counters for each tier since the process started."""
+        with self._lock:
+            size = len(self._local)
+            counters = dict(self._tier.counters)
+        return {
+            'local': {
+                'hits': counters['local_hits'],
+                'misses': counters['local_misses'],
+                'entries': size,
+                'max_entries': self.local_max_entries,
+            },
+            'backing': {
+                'alias': self.backing_alias,
+                'hits': counters['backing_hits'],
+                'misses': counters['backing_misses'],
+            },
+        }
+
+
+def cache_stats():
+    """Per-alias tier statistics for every configured TieredCache."""
+    from django.conf import settings
+
+    stats = {}
+    for alias in settings.CACHES:
+        cache = caches[alias]
+        if isinstance(cache, TieredCache):
+            stats[alias] = cache.stats()
+    return stats
@@ -0,0 +1,217 @@
+"""
+Streaming NDJSON/CSV export helpers shared by the tracker and breathe apps.
+
+Rows are produced lazily (QuerySet.iterator) and encoded/compressed chunk by
+chunk, so memory use stays constant regardless of how many rows are exported.
+The same generators back both the HTTP endpoints (StreamingHttpResponse) and
+the export management commands (written to a file or stdout).
+"""
+
+import csv
+import io
+import json
+import uuid
+import zlib
+from datetime import date, datetime, time, timedelta
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+FORMATS = ('ndjson', 'csv')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Rows fetched per database round trip
+CHUNK_SIZE = 2000
+
+# Encoded bytes buffered before a chunk is yielded to the client
+BUFFER_SIZE = 64 * 1024
+
+
+def to_json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def ndjson_rows(rows):
+    """Encode dict rows as newline-delimited JSON strings."""
+    for row in rows:
+        yield json.dumps(
+            {key: to_json_value(value) for key, value in row.items()},
+            ensure_ascii=False
+        ) + '\n'
+
+
+def csv_rows(rows, fields):
+    """Encode dict rows as CSV lines, starting with a header line."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for row in rows:
+        writer.writerow([to_json_value(row[field]) for field in fields])
+        if buffer.tell() >= BUFFER_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def encode_chunks(lines):
+    """Join small text pieces into UTF-8 byte chunks of about BUFFER_SIZE."""
+    parts = []
+    size = 0
+    for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(parts).encode('utf-8')
+            parts = []
+            size = 0
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of byte chunks on the fly into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_chunks(rows, fields, export_format='ndjson', compress=False):
+    """Byte chunks for `rows` in the requested format, optionally gzipped."""
+    if export_format == 'csv':
+        lines = csv_rows(rows, fields)
+    else:
+        lines = ndjson_rows(rows)
+    chunks = encode_chunks(lines)
+    if compress:
+        chunks = gzip_chunks(chunks)
+    return chunks
+
+
+def parse_bound(value, end=False):
+    """
+    Parse a date-range bound: an ISO date (whole day, in the current time zone)
+    or an ISO datetime. An end date is exclusive of the following day, so
+    ?start=2025-01-01&end=2025-01-31 covers all of January.
+    Raises ValueError for unparseable input.
+    """
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is not None:
+        if end:
+            day += timedelta(days=1)
+        parsed = datetime.combine(day, time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f'Invalid date: {value}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_date_range(start, end):
+    """Return (start, end) datetimes for optional ISO bounds; end is exclusive."""
+    return parse_bound(start), parse_bound(end, end=True)
+
+
+def parse_export_params(params):
+    """
+    Read format/gzip/start/end from a QueryDict.
+    Returns (export_format, compress, start, end); raises ValueError on bad input.
+    """
+    export_format = params.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        raise ValueError(f'Invalid format: {export_format}')
+    compress = params.get('gzip', '').lower() in ('1', 'true', 'yes')
+    start, end = parse_date_range(params.get('start'), params.get('end'))
+    return export_format, compress, start, end
+
+
+def streaming_export_response(rows, fields, export_format, compress, filename):
+    """StreamingHttpResponse that downloads `rows` as `filename`."""
+    extension = export_format + ('.gz' if compress else '')
+    response = StreamingHttpResponse(
+        export_chunks(rows, fields, export_format, compress),
+        content_type=CONTENT_TYPES[export_format] + '; charset=utf-8'
+    )
+    if compress:
+        # A .gz download, not transfer encoding: the client keeps the compressed file
+        response['Content-Type'] = 'application/gzip'
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    return response
+
+
+def add_export_arguments(parser):
+    """Common options for the export_* management commands."""
+    parser.add_argument(
+        '--user',
+        type=str,
+        default=None,
+        help='Only export rows of the user with this username (default: all users)',
+    )
+    parser.add_argument(
+        '--format',
+        type=str,
+        default='ndjson',
+        choices=FORMATS,
+        help='Output format (default: ndjson)',
+    )
+    parser.add_argument(
+        '--gzip',
+        action='store_true',
+        help='Compress the output with gzip',
+    )
+    parser.add_argument(
+        '--start',
+        type=str,
+        default=None,
+        help='Earliest date/datetime to include (ISO format)',
+    )
+    parser.add_argument(
+        '--end',
+        type=str,
+        default=None,
+        help='Latest date to include (ISO format, inclusive) or exclusive datetime',
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        default='-',
+        help='Output file path (default: stdout)',
+    )
+
+
+def write_chunks(chunks, output, stdout):
+    """Write byte chunks to the file at `output`, or to `stdout` for '-'. Returns bytes written."""
+    written = 0
+    if output == '-':
+        stream = getattr(stdout, 'buffer', None)
+        for chunk in chunks:
+            if stream is not None:
+                stream.write(chunk)
+            else:
+                stdout.write(chunk.decode('utf-8'))
+            written += len(chunk)
+        return written
+    with open(output, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            written += len(chunk)
+    return written
@@ -0,0 +1,324 @@
+"""
+Request metrics in the Prometheus text format, served at /metrics.
+
+MetricsMiddleware records, per resolved URL name (`tracker:activity_tap`,
+`breathe:session_manage`, ...; `unresolved` for 404s outside the URLconf):
+
+- breathing_request_duration_seconds: latency histogram, also labelled by
+  method and status code
+- breathing_db_queries_total / breathing_db_query_duration_seconds_total:
+  queries run and time spent in the database while serving the request
+- breathing_cache_hits_total / breathing_cache_misses_total: lookups through
+  TieredCache caches (breathing.cache)
+- breathing_response_size_bytes: size histogram of non-streaming responses
+
+Each process keeps its metrics in memory. With settings.METRICS_DIR set, it
+also writes a snapshot to <METRICS_DIR>/<pid>.json (atomically, at most every
+METRICS_FLUSH_INTERVAL seconds and at exit), and a scrape merges every file
+with the serving process's own live values, so several gunicorn workers
+report as one. Files of exited workers are kept so counters never go
+backwards; empty the directory when the whole server restarts.
+
+The endpoint is protected: it answers requests carrying
+`Authorization: Bearer <METRICS_TOKEN>` and logged-in staff users.
+"""
+
+import atexit
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from inspect import iscoroutinefunction
+from pathlib import Path
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_http_methods
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'breathing_request_duration_seconds': (
+        'histogram', 'Time spent serving requests, per URL name', DURATION_BUCKETS,
+    ),
+    'breathing_db_queries_total': ('counter', 'Database queries run while serving requests', None),
+    'breathing_db_query_duration_seconds_total': ('counter', 'Time spent in database queries', None),
+    'breathing_cache_hits_total': ('counter', 'TieredCache lookups that found a value', None),
+    'breathing_cache_misses_total': ('counter', 'TieredCache lookups that found nothing', None),
+    'breathing_response_size_bytes': ('histogram', 'Size of non-streaming response bodies', SIZE_BUCKETS),
+}
+
+UNRESOLVED = 'unresolved'
+
+
+class MetricsRegistry:
+    """Thread-safe in-process counters and histograms, keyed by metric name and labels."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(buckets) + 2)
+            # Non-cumulative here; rendering accumulates
+            series[bisect_left(buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        """JSON-serializable copy of every series."""
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+            }
+
+
+def merge(snapshots):
+    """Sum snapshots of several processes into {'counters': {...}, 'histograms': {...}} keyed like the registry."""
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, series in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            if key in histograms:
+                histograms[key] = [total + value for total, value in zip(histograms[key], series)]
+            else:
+                histograms[key] = list(series)
+    return {'counters': counters, 'histograms': histograms}
+
+
+registry = MetricsRegistry()
+
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def get_metrics_dir():
+    directory = getattr(settings, 'METRICS_DIR', '')
+    return Path(directory) if directory else None
+
+
+def flush(force=False):
+    """Write this process's snapshot to METRICS_DIR (if configured), at most every METRICS_FLUSH_INTERVAL seconds."""
+    global _last_flush
+    directory = get_metrics_dir()
+    if directory is None:
+        return
+    with _flush_lock:
+        now = time.monotonic()
+        if not force and now - _last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            return
+        _last_flush = now
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'{os.getpid()}.json'
+        temporary = path.with_name(path.name + '.tmp')
+        temporary.write_text(json.dumps(registry.snapshot()))
+        os.replace(temporary, path)
+
+
+atexit.register(lambda: flush(force=True))
+
+
+def collect():
+    """Merged metrics of every process: the snapshot files plus this process's live values."""
+    snapshots = [registry.snapshot()]
+    directory = get_metrics_dir()
+    if directory is not None and directory.is_dir():
+        own = f'{os.getpid()}.json'
+        for path in directory.glob('*.json'):
+            if path.name == own:
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                # Deleted or replaced while reading; the next scrape sees it
+                continue
+    return merge(snapshots)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(metrics):
+    """Prometheus text exposition of `collect()` output."""
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (series_name, labels), value in sorted(metrics['counters'].items()):
+                if series_name == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+            continue
+        for (series_name, labels), series in sorted(metrics['histograms'].items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], series):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(series[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {series[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+# Per-request accounting ------------------------------------------------------
+
+class RequestSample:
+    """Database and cache activity of the request being served."""
+
+    __slots__ = ('queries', 'query_seconds', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+# Context variables follow the request into sync_to_async threads
+_current_sample = ContextVar('breathing_metrics_sample', default=None)
+
+
+def record_cache_lookup(hits=0, misses=0):
+    """Count cache lookups towards the current request (no-op outside one)."""
+    sample = _current_sample.get()
+    if sample is not None:
+        sample.cache_hits += hits
+        sample.cache_misses += misses
+
+
+def _record_query(execute, sql, params, many, context):
+    sample = _current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        sample.queries += 1
+        sample.query_seconds += time.perf_counter() - started
+
+
+def instrument(connection):
+    """Install the query timer on a database connection (idempotent)."""
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _instrument_new_connection(sender, connection, **kwargs):
+    instrument(connection)
+
+
+connection_created.connect(_instrument_new_connection)
+
+
+class MetricsMiddleware:
+    """Record latency, DB, cache and response size metrics per resolved URL name."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        # Connections opened before this module was imported missed the signal
+        for connection in connections.all(initialized_only=True):
+            instrument(connection)
+        sample = RequestSample()
+        token = _current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_sample.reset(token)
+        self.record(request, response, sample, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        sample = RequestSample()
+        token = _current_sample.set(sample)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_sample.reset(token)
+        self.record(request, response, sample, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, sample, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or UNRESOLVED
+        labels = (('view', view),)
+        registry.observe(
+            'breathing_request_duration_seconds',
+            labels + (('method', request.method), ('status', str(response.status_code))),
+            elapsed,
+        )
+        registry.inc('breathing_db_queries_total', labels, sample.queries)
+        registry.inc('breathing_db_query_duration_seconds_total', labels, sample.query_seconds)
+        registry.inc('breathing_cache_hits_total', labels, sample.cache_hits)
+        registry.inc('breathing_cache_misses_total', labels, sample.cache_misses)
+        if not response.streaming:
+            registry.observe('breathing_response_size_bytes', labels, len(response.content))
+        flush()
+
+
+def is_authorized(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    if token and header.startswith('Bearer '):
+        if hmac.compare_digest(header[len('Bearer '):].encode(), token.encode()):
+            return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus scrape endpoint (bearer token or staff session)."""
+    if not is_authorized(request):
+        return HttpResponseForbidden('Forbidden', content_type='text/plain')
+    return HttpResponse(render(collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,168 @@
+"""
+Minimal publish/subscribe used to push live updates to Server-Sent Events streams.
+
+Publishers are ordinary (sync) views; subscribers are async SSE views running
+under ASGI. The backend is chosen with settings.PUBSUB_BACKEND:
+
+- InProcessBackend (default): fan-out through asyncio queues inside one
+  process. Zero overhead, but only reaches subscribers in the same worker.
+- CacheBackend: stores the latest message per channel in a shared Django
+  cache and subscribers poll it every POLL_INTERVAL seconds, so several
+  workers/processes can share it. Delivers the latest state per channel
+  (intermediate messages may be skipped), which is what count updates need.
+
+Options for the backend are passed as settings.PUBSUB_OPTIONS.
+"""
+
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'breathing.pubsub.InProcessBackend'
+
+
+class BaseBackend:
+    """Interface for pub/sub backends."""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def publish(self, channel, message):
+        """Send a JSON-serializable `message` to everyone subscribed to `channel`."""
+        raise NotImplementedError
+
+    def subscribe(self, channel, keepalive=None):
+        """
+        Return an async iterator of messages published to `channel` (call from
+        a running event loop; close it with `await subscription.aclose()`).
+        If `keepalive` seconds pass without a message, None is produced so
+        the caller can write a heartbeat.
+        """
+        raise NotImplementedError
+
+
+class InProcessSubscription:
+    """
+    Async iterator over one subscriber's queue. Registered as soon as it is
+    created, so nothing published between subscribe() and the first read is lost.
+    """
+
+    def __init__(self, backend, channel, keepalive=None):
+        self.backend = backend
+        self.channel = channel
+        self.keepalive = keepalive
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        backend._add(channel, self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=self.keepalive)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        self.backend._remove(self.channel, self)
+
+
+class InProcessBackend(BaseBackend):
+    """Fan-out to asyncio queues of subscribers in this process."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def _add(self, channel, subscription):
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscription)
+
+    def _remove(self, channel, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            # Publishers usually run in a worker thread, not the subscriber's loop
+            subscription.loop.call_soon_threadsafe(subscription.queue.put_nowait, message)
+
+    def subscribe(self, channel, keepalive=None):
+        return InProcessSubscription(self, channel, keepalive)
+
+
+class CacheBackend(BaseBackend):
+    """Latest message per channel in a shared cache, polled by subscribers."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.cache_alias = options.get('CACHE', 'default')
+        self.poll_interval = options.get('POLL_INTERVAL', 1.0)
+        self.timeout = options.get('TIMEOUT', 3600)
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def make_key(self, channel):
+        return f'pubsub:{channel}'
+
+    def publish(self, channel, message):
+        self.cache.set(
+            self.make_key(channel),
+            {'seq': time.time_ns(), 'message': message},
+            timeout=self.timeout
+        )
+
+    async def subscribe(self, channel, keepalive=None):
+        key = self.make_key(channel)
+        current = await self.cache.aget(key)
+        last_seq = current['seq'] if current else None
+        idle = 0.0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await self.cache.aget(key)
+            if current and current['seq'] != last_seq:
+                last_seq = current['seq']
+                idle = 0.0
+                yield current['message']
+                continue
+            idle += self.poll_interval
+            if keepalive is not None and idle >= keepalive:
+                idle = 0.0
+                yield None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide backend configured in settings."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_class = import_string(getattr(settings, 'PUBSUB_BACKEND', DEFAULT_BACKEND))
+                _backend = backend_class(**getattr(settings, 'PUBSUB_OPTIONS', {}))
+    return _backend
+
+
+def publish(channel, message):
+    get_backend().publish(channel, message)
+
+
+def subscribe(channel, keepalive=None):
+    return get_backend().subscribe(channel, keepalive=keepalive)
@@ -0,0 +1,181 @@
+"""
+Cache-backed rate limiting shared by the AJAX write endpoints.
+
+Each limit is a token bucket holding up to `limit` tokens that refills at
+`limit / period` tokens per second; a hit takes one token. The bucket is
+stored in the Django cache as (tokens, refilled_at), so there are no window
+boundaries: with (1, 3) any two hits less than 3 seconds apart are rejected.
+A caller's first hit creates the bucket with an atomic `add`; later hits read
+the bucket and write it back only when a token is taken. The key expires
+`period` seconds after the last accepted hit, when the bucket would be full
+anyway. Because the bucket lives in the shared cache rather than in process
+memory, every gunicorn worker and thread sees the same bucket, and no database
+query is needed to decide whether a request is allowed. Concurrent hits on an
+existing bucket may both take the same token (under-counted, never
+over-counted).
+
+Limits are configured per scope and group in settings.RATE_LIMITS, e.g.:
+
+    RATE_LIMITS = {
+        'activity_tap': {'default': (1, 3)},    # 1 tap per 3 seconds per type
+        'session_manage': {'default': (30, 60)},
+    }
+
+If settings.RATE_LIMIT_CACHE names a cache alias that is not configured, a
+process-local LocMemCache is used instead so the limiter works offline and in
+tests without a cache table.
+"""
+
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import JsonResponse
+
+DEFAULT_CACHE_ALIAS = 'default'
+
+_fallback_cache = None
+
+
+def get_rate_limit_cache():
+    """Return the cache used for rate-limit counters (LocMem if not configured)."""
+    global _fallback_cache
+    alias = getattr(settings, 'RATE_LIMIT_CACHE', DEFAULT_CACHE_ALIAS)
+    if alias in settings.CACHES:
+        return caches[alias]
+    if _fallback_cache is None:
+        _fallback_cache = LocMemCache('ratelimit', {})
+    return _fallback_cache
+
+
+def get_rate(scope, group=None):
+    """Return the configured (limit, period_seconds) for a scope and group, or None."""
+    scope_limits = getattr(settings, 'RATE_LIMITS', {}).get(scope)
+    if not scope_limits:
+        return None
+    if group is not None and group in scope_limits:
+        return scope_limits[group]
+    return scope_limits.get('default')
+
+
+class RateLimiter:
+    """Token bucket of `limit` hits per `period` seconds in the cache."""
+
+    def __init__(self, scope, limit, period, cache=None):
+        self.scope = scope
+        self.limit = limit
+        self.period = period
+        self.cache = cache if cache is not None else get_rate_limit_cache()
+
+    def make_key(self, ident, group=None):
+        return f'ratelimit:{self.scope}:{group or "default"}:{ident}'
+
+    def take(self, bucket, now):
+        """Return the bucket after taking one token at `now`, or None if it is empty."""
+        tokens, refilled_at = bucket
+        tokens = min(self.limit, tokens + (now - refilled_at) * self.limit / self.period)
+        if tokens < 1:
+            return None
+        return (tokens - 1, now)
+
+    def hit(self, ident, group=None):
+        """
+        Record one hit for `ident` and return True if it is within the limit.
+        The first hit creates a full bucket and takes a token from it.
+        """
+        key = self.make_key(ident, group)
+        now = time.time()
+        if self.cache.add(key, (self.limit - 1, now), timeout=self.period):
+            return True
+        bucket = self.cache.get(key)
+        if bucket is None:
+            # Key expired between add() and get(); the bucket is full again.
+            self.cache.add(key, (self.limit - 1, now), timeout=self.period)
+            return True
+        bucket = self.take(bucket, now)
+        if bucket is None:
+            return False
+        self.cache.set(key, bucket, timeout=self.period)
+        return True
+
+    async def ahit(self, ident, group=None):
+        """Async hit() for async views, using the cache's async API."""
+        key = self.make_key(ident, group)
+        now = time.time()
+        if await self.cache.aadd(key, (self.limit - 1, now), timeout=self.period):
+            return True
+        bucket = await self.cache.aget(key)
+        if bucket is None:
+            await self.cache.aadd(key, (self.limit - 1, now), timeout=self.period)
+            return True
+        bucket = self.take(bucket, now)
+        if bucket is None:
+            return False
+        await self.cache.aset(key, bucket, timeout=self.period)
+        return True
+
+    def reset(self, ident, group=None):
+        """Refill the bucket of `ident`."""
+        self.cache.delete(self.make_key(ident, group))
+
+
+def rate_limit(scope, group=None, key=None, exempt=None, message='Too many requests'):
+    """
+    View decorator applying the limits configured for `scope`.
+
+    `group(request)` selects a per-group limit (e.g. the activity type) and
+    `key(request)` identifies the caller (default: the authenticated user's
+    id, falling back to the remote address). Requests for which
+    `exempt(request)` is true are neither counted nor limited (e.g. retries
+    the view will answer as duplicates). Rejected requests get the same
+    JSON error shape as the rest of the API, with status 429. Async views get
+    an async wrapper (`key` is still called synchronously, `exempt` in a
+    thread since it may query the database).
+    """
+    def rejected():
+        return JsonResponse({
+            'success': False,
+            'error': message,
+            'rate_limited': True
+        }, status=429)
+
+    def get_ident(request, user):
+        if key:
+            return key(request)
+        if user.is_authenticated:
+            return user.pk
+        return request.META.get('REMOTE_ADDR', 'anonymous')
+
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                group_name = group(request) if group else None
+                rate = get_rate(scope, group_name)
+                if rate is not None and exempt and await sync_to_async(exempt)(request):
+                    rate = None
+                if rate is not None:
+                    limiter = RateLimiter(scope, *rate)
+                    ident = get_ident(request, await request.auser())
+                    if not await limiter.ahit(ident, group_name):
+                        return rejected()
+                return await view_func(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            group_name = group(request) if group else None
+            rate = get_rate(scope, group_name)
+            if rate is not None and exempt and exempt(request):
+                rate = None
+            if rate is not None:
+                limiter = RateLimiter(scope, *rate)
+                if not limiter.hit(get_ident(request, request.user), group_name):
+                    return rejected()
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -55,11 +55,13 @@ INSTALLED_APPS = [
     # Local apps
     'tracker',
     'breathe',
+    'archive',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Serve static files in production
+    'breathing.middleware.WhiteNoiseMiddleware',  # Serve static files in production (async-capable WhiteNoise)
+    'breathing.metrics.MetricsMiddleware',  # Per-view Prometheus metrics (after WhiteNoise: static files aren't counted)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -68,7 +70,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'breathing.urls'
+# Serve the write APIs (activity taps, session calls) with their async views.
+# breathing.asgi turns this on unless ASYNC_VIEWS is set; keep it off under WSGI,
+# where every async view would need its own event loop
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+
+ROOT_URLCONF = 'breathing.asgi_urls' if ASYNC_VIEWS else 'breathing.urls'
 
 TEMPLATES = [
     {
@@ -147,6 +154,11 @@ else:
         }
     }
 
+# The ActivityLog/BreathingSession indexes use INCLUDE columns, which only PostgreSQL
+# (production) builds; SQLite creates them without the included columns, which is
+# fine for development and tests, so its models.W040 warning is silenced.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -186,15 +198,103 @@ LOGIN_REDIRECT_URL = '/'  # After login, redirect to home
 
 
 # Caching Configuration
-# Use database cache for SQLite, or simple in-memory cache
+# 'default' keeps a small per-process LRU in front of the database cache ('db'), so
+# repeated reads (catalog version, etc.) don't cost a SQL round trip each time.
+# The 'db' alias is the DatabaseCache created by `createcachetable` (see Procfile).
 # For better performance, consider Redis or Memcached in production
 CACHES = {
     'default': {
+        'BACKEND': 'breathing.cache.TieredCache',
+        'LOCATION': 'db',  # Alias of the backing cache
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 1000,  # Entries kept in each process
+            'LOCAL_TIMEOUT': 5,  # Max seconds a process may serve a value without re-reading it
+            'GENERATION_CHECK_INTERVAL': 5,  # Seconds between checks for cross-process invalidation
+        },
+    },
+    'db': {
         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
         'LOCATION': 'cache_table',
-    }
+    },
+    # Breathing session heartbeats (see SESSION_PROGRESS_CACHE). Shared by all workers
+    # and by `flush_session_progress`, in a table of its own so culling of the 'db'
+    # cache can't drop the progress of running sessions.
+    'progress': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'session_progress_cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # Opt-in per-process alternative (SESSION_PROGRESS_CACHE=progress_local) for a single
+    # process; `flush_session_progress` can't see it, so abandoned sessions keep their
+    # last flushed progress.
+    'progress_local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'breathe-session-progress',
+    },
 }
 
+# Rate limits for AJAX write endpoints: scope -> group -> (max hits, period in seconds)
+# Counted in RATE_LIMIT_CACHE (falls back to per-process LocMem if that alias is missing)
+RATE_LIMIT_CACHE = 'db'
+RATE_LIMITS = {
+    'activity_tap': {
+        'default': (1, 3),  # One tap of each activity type per 3 seconds
+    },
+    'activity_tap_batch': {
+        'default': (10, 60),  # Offline queue flushes per minute
+    },
+    'session_manage': {
+        'default': (30, 60),  # Start/update/complete calls per minute
+    },
+    'session_batch': {
+        'default': (10, 60),  # Batched session event uploads per minute
+    },
+}
+
+# Live activity count updates (Server-Sent Events at /api/activity/stream/)
+# Only enable when serving through ASGI (breathing.asgi): each open page holds a connection
+ACTIVITY_LIVE_UPDATES = os.getenv('ACTIVITY_LIVE_UPDATES', 'False').lower() == 'true'
+
+# Pub/sub fan-out for live updates. InProcessBackend reaches subscribers in the same
+# process only; use 'breathing.pubsub.CacheBackend' to share updates across workers.
+PUBSUB_BACKEND = os.getenv('PUBSUB_BACKEND', 'breathing.pubsub.InProcessBackend')
+PUBSUB_OPTIONS = {
+    'CACHE': 'db',
+    'POLL_INTERVAL': 1.0,
+}
+
+# Breathing session heartbeats update a cached progress record instead of the row;
+# the row is written on complete/cancel, at most every FLUSH_INTERVAL seconds while
+# the session runs, and by `flush_session_progress` for sessions left open
+SESSION_PROGRESS_COALESCE = os.getenv('SESSION_PROGRESS_COALESCE', 'True').lower() == 'true'
+SESSION_PROGRESS_CACHE = os.getenv('SESSION_PROGRESS_CACHE', 'progress')
+SESSION_PROGRESS_FLUSH_INTERVAL = 60  # seconds
+SESSION_PROGRESS_TIMEOUT = 6 * 60 * 60  # Progress records (and flushed sessions) older than this are dropped
+
+# ActivityLog rows are folded into the rollups (update_activity_rollups) only once
+# this many seconds have passed since their id was first seen, so taps whose
+# transaction commits after a later tap's are not skipped (tracker.rollups)
+ROLLUP_SAFETY_LAG = 300
+
+# Archival of cold ActivityLog/BreathingSession rows (`archive_rows`): rows older than
+# ARCHIVE_AFTER_DAYS are moved to gzipped NDJSON files under ARCHIVE_ROOT, which must
+# be persistent storage (not the ephemeral filesystem of a dyno or app container)
+ARCHIVE_ROOT = os.getenv('ARCHIVE_ROOT', str(BASE_DIR / 'archive_data'))
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+
+# Prometheus metrics at /metrics (breathing.metrics), readable with
+# `Authorization: Bearer <METRICS_TOKEN>` or as a staff user. With several worker
+# processes, set METRICS_DIR to a directory they share: each writes its snapshot
+# there every METRICS_FLUSH_INTERVAL seconds and a scrape merges them
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 5  # seconds
+
+# Identifies the deployed release; part of every ETag so clients re-fetch pages
+# after a deploy that changed templates or static files. When unset, a digest of
+# the templates and the staticfiles manifest is used (breathing.conditional)
+RELEASE_VERSION = os.getenv('RELEASE_VERSION') or os.getenv('HEROKU_SLUG_COMMIT', '')
+
 # Cache timeout settings (in seconds)
 CACHE_MIDDLEWARE_SECONDS = 300  # 5 minutes for general pages
 CACHE_MIDDLEWARE_KEY_PREFIX = 'breathing'
@@ -221,7 +321,7 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 #
 # Optional: Google Cloud Text-to-Speech API (only if you want to use it instead)
 # Set TTS_PROVIDER='google_cloud' and provide credentials below
-TTS_PROVIDER = os.getenv('TTS_PROVIDER', 'gtts')  # 'gtts' (default) or 'google_cloud'
+TTS_PROVIDER = os.getenv('TTS_PROVIDER', 'gtts')  # 'gtts' (default), 'google_cloud' or 'local' (offline stub)
 
 # Google Cloud TTS credentials (ONLY needed if TTS_PROVIDER='google_cloud')
 # Leave these as None if using gTTS (default)
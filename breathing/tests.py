@@ -0,0 +1,152 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import metrics
+from .cache import TieredCache
+
+TIERED_CACHES = {
+    'default': {
+        'BACKEND': 'breathing.cache.TieredCache',
+        'LOCATION': 'backing',
+        'OPTIONS': {'LOCAL_MAX_ENTRIES': 2, 'LOCAL_TIMEOUT': 60},
+    },
+    'backing': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-cache-tests',
+    },
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTests(TestCase):
+    """Local LRU tier in front of a backing cache."""
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.backing = caches['backing']
+        self.cache.clear()
+        self.stats = self.cache.stats()
+
+    def delta(self, tier, counter):
+        return self.cache.stats()[tier][counter] - self.stats[tier][counter]
+
+    def test_is_tiered(self):
+        self.assertIsInstance(self.cache, TieredCache)
+
+    def test_hit_served_from_local_tier(self):
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertEqual(self.delta('local', 'hits'), 1)
+        self.assertEqual(self.delta('backing', 'hits'), 0)
+
+    def test_miss_falls_through_and_populates_local(self):
+        self.backing.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.delta('backing', 'hits'), 1)
+        self.assertEqual(self.delta('local', 'hits'), 1)
+
+    def test_lru_is_bounded(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.assertEqual(self.cache.stats()['local']['entries'], 2)
+        self.assertEqual(self.cache.get('a'), 'a')  # Evicted locally, still in backing
+        self.assertEqual(self.delta('backing', 'hits'), 1)
+
+    def test_invalidate_local_drops_stale_values(self):
+        self.cache.set('key', 'old')
+        self.backing.set('key', 'new')
+        self.assertEqual(self.cache.get('key'), 'old')
+        self.cache.invalidate_local()
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_atomic_operations_use_backing(self):
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 1))
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(self.backing.get('counter'), 2)
+        self.assertEqual(self.cache.get('counter'), 2)
+
+
+@override_settings(METRICS_TOKEN='secret', METRICS_DIR='')
+class MetricsTests(TestCase):
+    """Per-view request metrics, merged across processes and served in the Prometheus format."""
+
+    def setUp(self):
+        metrics.registry.counters.clear()
+        metrics.registry.histograms.clear()
+        self.user = User.objects.create_user('admin', password='password')
+
+    def scrape(self, **headers):
+        return self.client.get(reverse('metrics'), headers=headers)
+
+    def test_records_latency_queries_and_size_per_view(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('tracker:activity_tap'), data=json.dumps({'activity_type': 'RESIST'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.get('/no-such-page/')
+
+        body = self.scrape(Authorization='Bearer secret').content.decode()
+        labels = '{view="tracker:activity_tap",method="POST",status="200"}'
+        self.assertIn(f'breathing_request_duration_seconds_count{labels} 1', body)
+        self.assertIn(f'breathing_request_duration_seconds_bucket{labels[:-1]},le="+Inf"}} 1', body)
+        self.assertIn('breathing_request_duration_seconds_count{view="unresolved",method="GET",status="404"} 1', body)
+        queries = next(line for line in body.splitlines() if line.startswith('breathing_db_queries_total{view="tracker:activity_tap"}'))
+        self.assertGreater(int(queries.split()[-1]), 0)
+        self.assertIn(f'breathing_response_size_bytes_sum{{view="tracker:activity_tap"}} {len(response.content)}', body)
+
+    def test_counts_tiered_cache_lookups(self):
+        with override_settings(CACHES=TIERED_CACHES):
+            cache = caches['default']
+            cache.set('key', 'value')
+            sample = metrics.RequestSample()
+            token = metrics._current_sample.set(sample)
+            try:
+                cache.get('key')
+                cache.get('missing')
+                cache.get_many(['key', 'other'])
+            finally:
+                metrics._current_sample.reset(token)
+        self.assertEqual((sample.cache_hits, sample.cache_misses), (2, 2))
+
+    def test_endpoint_is_protected(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(Authorization='Bearer wrong').status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.scrape().status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def test_merges_process_snapshots(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        labels = (('view', 'breathe:guide'),)
+        metrics.registry.inc('breathing_db_queries_total', labels, 3)
+        metrics.registry.observe('breathing_response_size_bytes', labels, 100)
+        with override_settings(METRICS_DIR=directory.name):
+            metrics.flush(force=True)
+            self.assertTrue(os.path.exists(os.path.join(directory.name, f'{os.getpid()}.json')))
+            # Another worker's snapshot
+            other = metrics.MetricsRegistry()
+            other.inc('breathing_db_queries_total', labels, 4)
+            other.observe('breathing_response_size_bytes', labels, 5000)
+            with open(os.path.join(directory.name, '1.json'), 'w') as snapshot:
+                json.dump(other.snapshot(), snapshot)
+
+            body = metrics.render(metrics.collect())
+        self.assertIn('breathing_db_queries_total{view="breathe:guide"} 7', body)
+        self.assertIn('breathing_response_size_bytes_bucket{view="breathe:guide",le="256"} 1', body)
+        self.assertIn('breathing_response_size_bytes_bucket{view="breathe:guide",le="16384"} 2', body)
+        self.assertIn('breathing_response_size_bytes_count{view="breathe:guide"} 2', body)
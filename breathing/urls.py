@@ -16,10 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from breathing.metrics import metrics_view
 from tracker import views as tracker_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('', tracker_views.home_view, name='home'),
     path('breathe/', include('breathe.urls')),
     path('', include('tracker.urls')),
@@ -33,6 +33,117 @@ if (window.activityTrackerInitialized) {
         csrftoken = getCookie('csrftoken');
     }
     
+    // Offline queue: taps that could not be sent are kept in Local Storage
+    // with a client UUID and timestamp, then flushed to the batch endpoint.
+    const QUEUE_KEY = 'activityTapQueue';
+    const FLUSH_INTERVAL_MS = 30000;
+    let flushInProgress = false;
+    
+    function generateUUID() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        // Fallback for non-secure contexts (RFC 4122 version 4)
+        const bytes = new Uint8Array(16);
+        crypto.getRandomValues(bytes);
+        bytes[6] = (bytes[6] & 0x0f) | 0x40;
+        bytes[8] = (bytes[8] & 0x3f) | 0x80;
+        const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+        return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+    }
+    
+    function loadQueue() {
+        try {
+            return JSON.parse(localStorage.getItem(QUEUE_KEY) || '[]');
+        } catch (error) {
+            return [];
+        }
+    }
+    
+    function saveQueue(queue) {
+        localStorage.setItem(QUEUE_KEY, JSON.stringify(queue));
+    }
+    
+    function queueTap(activityType, clientUuid, clientTimestamp) {
+        const queue = loadQueue();
+        queue.push({
+            'activity_type': activityType,
+            'client_uuid': clientUuid || generateUUID(),
+            'client_timestamp': clientTimestamp || new Date().toISOString()
+        });
+        saveQueue(queue);
+    }
+    
+    function updateCounts(counts) {
+        Object.keys(counts).forEach(function(key) {
+            const countElement = document.getElementById('count-' + key);
+            if (countElement) {
+                countElement.textContent = counts[key];
+            }
+        });
+    }
+    
+    // Send all queued taps in one request; entries the server has settled
+    // (accepted, duplicate, rate limited or rejected) are removed from the queue.
+    function flushQueue() {
+        const queue = loadQueue();
+        if (flushInProgress || queue.length === 0 || navigator.onLine === false) {
+            return;
+        }
+        flushInProgress = true;
+        const batch = queue.slice(0, 500);
+        
+        fetch('/api/activity/tap/batch/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrftoken
+            },
+            body: JSON.stringify({'taps': batch})
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                return;
+            }
+            const settled = new Set(
+                data.accepted
+                    .concat(data.duplicates, data.rate_limited)
+                    .concat(data.rejected.map(item => item.client_uuid))
+            );
+            // Re-read the queue: taps may have been added while the request was in flight
+            saveQueue(loadQueue().filter(tap => !settled.has(tap.client_uuid)));
+            if (data.counts) {
+                updateCounts(data.counts);
+            }
+            if (loadQueue().length > 0) {
+                setTimeout(flushQueue, 1000);
+            }
+        })
+        .catch(error => {
+            console.warn('Offline queue flush failed, will retry:', error);
+        })
+        .finally(() => {
+            flushInProgress = false;
+        });
+    }
+    
+    // Live updates: counts changed on another device arrive over Server-Sent Events
+    const tracker = document.querySelector('.activity-tracker');
+    if (tracker && tracker.dataset.streamUrl && window.EventSource) {
+        const stream = new EventSource(tracker.dataset.streamUrl);
+        stream.addEventListener('counts', function(e) {
+            // Keep optimistic offline counts until the queue has been flushed
+            if (loadQueue().length === 0) {
+                updateCounts(JSON.parse(e.data));
+            }
+        });
+    }
+    
+    window.addEventListener('online', flushQueue);
+    setInterval(flushQueue, FLUSH_INTERVAL_MS);
+    flushQueue();
+    
     // Get all activity badges
     const badges = document.querySelectorAll('.activity-badge');
     
@@ -65,6 +176,18 @@ if (window.activityTrackerInitialized) {
             const activityType = this.getAttribute('data-activity-type');
             const countElement = this.querySelector('.badge-count');
             const originalCount = parseInt(countElement.textContent) || 0;
+            // One id per tap, sent with the first attempt and any retry, so the
+            // server never saves a tap twice when only the response was lost
+            const clientUuid = generateUUID();
+            const tappedAt = new Date().toISOString();
+            
+            // Offline: keep the tap locally and show it right away
+            if (navigator.onLine === false) {
+                this.dataset.processing = 'false';
+                queueTap(activityType, clientUuid, tappedAt);
+                showQueuedTap(this, activityType, countElement);
+                return;
+            }
             
             // Disable badge temporarily to prevent rapid clicks
             this.style.pointerEvents = 'none';
@@ -78,7 +201,8 @@ if (window.activityTrackerInitialized) {
                     'X-CSRFToken': csrftoken
                 },
                 body: JSON.stringify({
-                    'activity_type': activityType
+                    'activity_type': activityType,
+                    'client_uuid': clientUuid
                 })
             })
             .then(response => {
@@ -111,21 +235,7 @@ if (window.activityTrackerInitialized) {
                     
                     // Visual feedback based on activity type - trigger immediately
                     console.log('Triggering animation for:', activityType, 'on badge:', this);
-                    // Use requestAnimationFrame to ensure DOM is ready
-                    requestAnimationFrame(() => {
-                        if (activityType === 'RESIST') {
-                            // Confetti effect (simple CSS animation)
-                            triggerConfetti(this);
-                        } else if (activityType === 'SMOKED') {
-                            // Dull grey-out effect
-                            triggerGreyOut(this);
-                        } else if (activityType === 'SPORT') {
-                            // Success glow effect
-                            triggerSuccessGlow(this);
-                        } else {
-                            console.warn('Unknown activity type:', activityType);
-                        }
-                    });
+                    triggerFeedback(this, activityType);
                 } else {
                     console.log('Request failed:', data);
                     // Handle error (rate limiting, etc.)
@@ -142,12 +252,42 @@ if (window.activityTrackerInitialized) {
                 this.style.opacity = '1';
                 this.dataset.processing = 'false';
                 
+                // Network failure (flaky mobile connection): queue the tap
+                // instead of losing it; it is sent with the next batch flush,
+                // which reports it as a duplicate if the first request was saved.
                 console.error('Error:', error);
-                showToast('Ошибка соединения.');
+                queueTap(activityType, clientUuid, tappedAt);
+                showQueuedTap(this, activityType, countElement);
             });
         });
     });
     
+    function triggerFeedback(badge, activityType) {
+        // Use requestAnimationFrame to ensure DOM is ready
+        requestAnimationFrame(() => {
+            if (activityType === 'RESIST') {
+                // Confetti effect (simple CSS animation)
+                triggerConfetti(badge);
+            } else if (activityType === 'SMOKED') {
+                // Dull grey-out effect
+                triggerGreyOut(badge);
+            } else if (activityType === 'SPORT') {
+                // Success glow effect
+                triggerSuccessGlow(badge);
+            } else {
+                console.warn('Unknown activity type:', activityType);
+            }
+        });
+    }
+    
+    function showQueuedTap(badge, activityType, countElement) {
+        // Optimistic count; the server's counts replace it after the flush
+        const currentCount = parseInt(countElement.textContent) || 0;
+        countElement.textContent = currentCount + 1;
+        triggerFeedback(badge, activityType);
+        showToast('Нет соединения. Сохранено и будет отправлено позже.');
+    }
+    
     // Visual feedback functions - using direct JavaScript animation for reliability
     function triggerConfetti(badge) {
         console.log('triggerConfetti called', badge);
@@ -0,0 +1,16 @@
+// Admin changelist filter by autocomplete (see breathing/admin.py AutocompleteFilter)
+// Reloads the changelist with the chosen object, keeping the other filters
+'use strict';
+{
+    const $ = django.jQuery;
+
+    $(function() {
+        $('.autocomplete-filter select').on('change', function() {
+            const params = new URLSearchParams(this.closest('.autocomplete-filter').dataset.queryString);
+            if (this.value) {
+                params.set(this.name, this.value);
+            }
+            window.location.search = params.toString();
+        });
+    });
+}
@@ -3,18 +3,162 @@
 
 // Torso Pulse Controller Class - Removed (torso graphic removed)
 
+// Offline queue of session start/complete/cancel events, sent to the batch
+// endpoint in order. Per-cycle progress goes to the heartbeat endpoint instead,
+// where it is coalesced (breathe/sessions.py), so a session needs only a couple
+// of batch uploads and stays well under RATE_LIMITS['session_batch'].
+const SESSION_QUEUE_KEY = 'sessionEventQueue';
+const SESSION_BATCH_URL = '/breathe/api/session/batch/';
+const SESSION_URL = '/breathe/api/session/';
+const SESSION_BATCH_MAX_EVENTS = 200;
+const SESSION_RETRY_MIN_MS = 2000;
+const SESSION_RETRY_MAX_MS = 60000;
+// How long the guide waits for its queued events before leaving the page
+const SESSION_LEAVE_WAIT_MS = 15000;
+let sessionFlushInProgress = null;
+let sessionRetryTimer = null;
+let sessionRetryDelay = SESSION_RETRY_MIN_MS;
+// Guests have no sessions: set from the page and cleared when the server answers 401/403
+let sessionTrackingEnabled = false;
+// Server session ids by session_uuid, learned from batch results
+const sessionIds = {};
+
+function generateUUID() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    // Fallback for non-secure contexts (RFC 4122 version 4)
+    const bytes = new Uint8Array(16);
+    crypto.getRandomValues(bytes);
+    bytes[6] = (bytes[6] & 0x0f) | 0x40;
+    bytes[8] = (bytes[8] & 0x3f) | 0x80;
+    const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+function loadSessionQueue() {
+    try {
+        return JSON.parse(localStorage.getItem(SESSION_QUEUE_KEY) || '[]');
+    } catch (e) {
+        return [];
+    }
+}
+
+function saveSessionQueue(queue) {
+    localStorage.setItem(SESSION_QUEUE_KEY, JSON.stringify(queue));
+}
+
+function scheduleSessionRetry(csrfToken) {
+    // Exponential backoff; queued events stay in Local Storage meanwhile
+    if (sessionRetryTimer) {
+        return;
+    }
+    sessionRetryTimer = setTimeout(() => {
+        sessionRetryTimer = null;
+        flushSessionQueue(csrfToken);
+    }, sessionRetryDelay);
+    sessionRetryDelay = Math.min(sessionRetryDelay * 2, SESSION_RETRY_MAX_MS);
+}
+
+function flushSessionQueue(csrfToken) {
+    // Never send the same events twice: wait for a running flush, then send what is left
+    if (sessionFlushInProgress) {
+        return sessionFlushInProgress.then(() => flushSessionQueue(csrfToken));
+    }
+    const batch = loadSessionQueue().slice(0, SESSION_BATCH_MAX_EVENTS);
+    if (batch.length === 0 || navigator.onLine === false) {
+        return Promise.resolve();
+    }
+    
+    sessionFlushInProgress = fetch(SESSION_BATCH_URL, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': csrfToken
+        },
+        body: JSON.stringify({events: batch})
+    })
+    .then(response => {
+        if (response.status === 401 || response.status === 403) {
+            return {status: response.status, data: null};
+        }
+        return response.json().then(data => ({status: response.status, data}));
+    })
+    .then(({status, data}) => {
+        if (!data) {
+            // Not logged in (any more): these events can never be stored, drop them
+            sessionTrackingEnabled = false;
+            saveSessionQueue([]);
+            return;
+        }
+        if (!data.success) {
+            // Rate limited (429), conflicting retry (409) or server error: try again later
+            if (status === 429 || status === 409 || status >= 500) {
+                scheduleSessionRetry(csrfToken);
+            }
+            return;
+        }
+        sessionRetryDelay = SESSION_RETRY_MIN_MS;
+        data.results.forEach(result => {
+            if (result.session_id) {
+                sessionIds[result.session_uuid] = result.session_id;
+            }
+        });
+        // Every event with a result is settled (applied, duplicate or rejected)
+        const settled = new Set(data.results.map(result => result.event_id));
+        // Re-read the queue: events may have been added while the request was in flight
+        saveSessionQueue(loadSessionQueue().filter(event => !settled.has(event.event_id)));
+    })
+    .catch(error => {
+        console.warn('Session event upload failed, will retry:', error);
+        scheduleSessionRetry(csrfToken);
+    })
+    .finally(() => {
+        sessionFlushInProgress = null;
+    });
+    return sessionFlushInProgress;
+}
+
+function waitForSessionEvents(sessionUuid, timeoutMs) {
+    // Resolves once no event of the session is queued, or after timeoutMs
+    const deadline = Date.now() + timeoutMs;
+    return new Promise(resolve => {
+        const check = () => {
+            const pending = sessionTrackingEnabled && loadSessionQueue().some(event => event.session_uuid === sessionUuid);
+            if (!pending || Date.now() >= deadline) {
+                resolve();
+            } else {
+                setTimeout(check, 500);
+            }
+        };
+        check();
+    });
+}
+
+// Index of the last entry in the sorted `starts` array that is <= value
+function findSegment(starts, value) {
+    let low = 0;
+    let high = starts.length - 1;
+    while (low < high) {
+        const mid = (low + high + 1) >> 1;
+        if (starts[mid] <= value) {
+            low = mid;
+        } else {
+            high = mid - 1;
+        }
+    }
+    return low;
+}
+
 // Main Breathing Guide Engine
 class BreathingGuideEngine {
-    constructor(techniqueData) {
+    constructor(techniqueData, timeline) {
         this.technique = techniqueData;
         
-        // Timing parameters
-        this.inhale = techniqueData.inhale;
-        this.holdStart = techniqueData.hold_start;
-        this.exhale = techniqueData.exhale;
-        this.holdEnd = techniqueData.hold_end;
-        this.cycleDuration = techniqueData.cycle_duration;
-        this.totalTimeSeconds = techniqueData.recommended_time_min * 60;
+        // Timing parameters from the server-compiled timeline (breathe/timeline.py)
+        this.timeline = timeline;
+        this.cycleDuration = timeline.cycle_duration;
+        this.totalTimeSeconds = timeline.session_duration;
         
         // State
         this.isRunning = false;
@@ -24,7 +168,7 @@ class BreathingGuideEngine {
         this.totalPauseTime = 0;
         this.currentCycle = 0;
         this.cyclesCompleted = 0;
-        this.sessionId = null;
+        this.sessionUuid = null;
         
         // Preferences from Local Storage
         this.soundEnabled = JSON.parse(localStorage.getItem('soundCueEnabled') || 'true');
@@ -38,6 +182,8 @@ class BreathingGuideEngine {
             counts: {}
         };
         this.phaseCueDuration = 0; // Measured at runtime
+        this.audioContext = null;
+        this.sprite = null; // {buffer, cues} when the audio sprite is used
         this.audioLoaded = false;
         this.lastCountPlayed = {}; // Track last count played per phase
         
@@ -137,31 +283,23 @@ class BreathingGuideEngine {
     }
     
     async createSession() {
-        try {
-            const response = await fetch('/breathe/api/session/', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': this.getCSRFToken()
-                },
-                body: JSON.stringify({
-                    action: 'start',
-                    technique_id: this.technique.id,
-                    sound_enabled: this.soundEnabled,
-                    vibration_enabled: this.vibrationEnabled
-                })
-            });
-            
-            const data = await response.json();
-            if (data.success) {
-                this.sessionId = data.session_id;
-            }
-        } catch (error) {
-            console.error('Error creating session:', error);
-        }
+        // Sessions are identified by a client UUID so queued events can be retried safely
+        this.sessionUuid = generateUUID();
+        await this.queueSessionEvent({
+            type: 'start',
+            technique_id: this.technique.id,
+            sound_enabled: this.soundEnabled,
+            vibration_enabled: this.vibrationEnabled
+        });
     }
     
     async loadAudio() {
+        // One request and one decode for all cues when an audio sprite has been built
+        if (await this.loadSprite()) {
+            this.audioLoaded = true;
+            return;
+        }
+        
         const audioBasePath = '/static/audio/ru/';
         
         // Load phase cues
@@ -192,6 +330,53 @@ class BreathingGuideEngine {
         });
     }
     
+    async loadSprite() {
+        const manifestElement = document.getElementById('audio-sprite');
+        const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+        if (!manifestElement || !AudioContextClass) {
+            return false;
+        }
+        
+        try {
+            const manifest = JSON.parse(manifestElement.textContent);
+            const response = await fetch(manifest.url);
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const data = await response.arrayBuffer();
+            this.audioContext = new AudioContextClass();
+            // Browsers keep the context suspended until the user interacts with the page
+            const unlock = () => this.audioContext.resume();
+            document.addEventListener('touchstart', unlock, {once: true});
+            document.addEventListener('click', unlock, {once: true});
+            // Older Safari only supports the callback form of decodeAudioData
+            const buffer = await new Promise((resolve, reject) => {
+                this.audioContext.decodeAudioData(data, resolve, reject);
+            });
+            this.sprite = {buffer: buffer, cues: manifest.cues};
+            if (manifest.cues.phase_inhale) {
+                this.phaseCueDuration = manifest.cues.phase_inhale.duration * 1000; // Convert to ms
+            }
+            return true;
+        } catch (error) {
+            console.warn('Audio sprite unavailable, loading separate files:', error);
+            this.sprite = null;
+            return false;
+        }
+    }
+    
+    playSpriteCue(name) {
+        const cue = this.sprite.cues[name];
+        if (!cue) return;
+        if (this.audioContext.state === 'suspended') {
+            this.audioContext.resume();
+        }
+        const source = this.audioContext.createBufferSource();
+        source.buffer = this.sprite.buffer;
+        source.connect(this.audioContext.destination);
+        source.start(0, cue.offset, cue.duration);
+    }
+    
     animate() {
         if (!this.isRunning || this.isPaused) {
             if (this.isPaused) {
@@ -212,29 +397,14 @@ class BreathingGuideEngine {
             return;
         }
         
-        // Calculate current phase and phase progress
+        // Look up the current phase and countdown in the precomputed timeline
         const cycleElapsed = elapsed % this.cycleDuration;
-        let phase, phaseElapsed, phaseDuration, phaseProgress;
-        
-        if (cycleElapsed < this.inhale) {
-            phase = 'inhale';
-            phaseElapsed = cycleElapsed;
-            phaseDuration = this.inhale;
-        } else if (cycleElapsed < this.inhale + this.holdStart) {
-            phase = 'hold_start';
-            phaseElapsed = cycleElapsed - this.inhale;
-            phaseDuration = this.holdStart;
-        } else if (cycleElapsed < this.inhale + this.holdStart + this.exhale) {
-            phase = 'exhale';
-            phaseElapsed = cycleElapsed - this.inhale - this.holdStart;
-            phaseDuration = this.exhale;
-        } else {
-            phase = 'hold_end';
-            phaseElapsed = cycleElapsed - this.inhale - this.holdStart - this.exhale;
-            phaseDuration = this.holdEnd;
-        }
-        
-        phaseProgress = phaseElapsed / phaseDuration;
+        const phaseIndex = findSegment(this.timeline.phase_starts, cycleElapsed);
+        const phase = this.timeline.phase_names[phaseIndex];
+        const phaseElapsed = cycleElapsed - this.timeline.phase_starts[phaseIndex];
+        const phaseDuration = this.timeline.phase_durations[phaseIndex];
+        const phaseProgress = phaseElapsed / phaseDuration;
+        const count = this.timeline.count_values[findSegment(this.timeline.count_starts, cycleElapsed)];
         
         // Update cycle count
         const newCycle = Math.floor(elapsed / this.cycleDuration);
@@ -248,8 +418,8 @@ class BreathingGuideEngine {
         try {
             this.updateBalloon(phase, phaseProgress);
             this.updateProgressBar(elapsed);
-            this.updatePhaseIndicator(phase, phaseElapsed, phaseDuration);
-            this.handleAudio(phase, phaseElapsed, phaseDuration);
+            this.updatePhaseIndicator(phase, count);
+            this.handleAudio(phase, phaseElapsed, count);
             this.handleHaptic(phase, phaseElapsed);
         } catch (error) {
             console.error('Error updating UI:', error);
@@ -319,24 +489,23 @@ class BreathingGuideEngine {
         }
     }
     
-    updatePhaseIndicator(phase, phaseElapsed, phaseDuration) {
+    updatePhaseIndicator(phase, count) {
         if (!this.phaseIndicator || !this.countdownNumber) return;
         
         this.phaseIndicator.textContent = this.phaseNames[phase] || phase;
         
-        const count = Math.ceil(phaseDuration - phaseElapsed);
-        if (count > 0 && count <= 10) {
+        if (count > 0) {
+            // Words up to ten, digits for longer phases
             this.countdownNumber.textContent = this.numberNames[count] || count;
         } else {
             this.countdownNumber.textContent = '';
         }
     }
     
-    handleAudio(phase, phaseElapsed, phaseDuration) {
+    handleAudio(phase, phaseElapsed, count) {
         if (!this.soundEnabled || !this.audioLoaded) return;
         
         const phaseElapsedMs = phaseElapsed * 1000;
-        const phaseDurationMs = phaseDuration * 1000;
         
         // Play phase cue at start (0s)
         if (phaseElapsedMs < 100) { // Within first 100ms
@@ -349,7 +518,9 @@ class BreathingGuideEngine {
                 phaseAudio = this.audioFiles.phaseHold;
             }
             
-            if (phaseAudio) {
+            if (this.sprite) {
+                this.playSpriteCue(phase === 'inhale' ? 'phase_inhale' : phase === 'exhale' ? 'phase_exhale' : 'phase_hold');
+            } else if (phaseAudio) {
                 phaseAudio.currentTime = 0;
                 phaseAudio.play().catch(e => console.warn('Audio play failed:', e));
             }
@@ -365,15 +536,17 @@ class BreathingGuideEngine {
         
         if (countTime >= 0) {
             const secondsElapsed = Math.floor(countTime / 1000);
-            const count = Math.ceil(phaseDuration - phaseElapsed); // Countdown number
             
-            // Play count audio every second (after phase cue delay)
-            if (count > 0 && count <= 10 && secondsElapsed >= 0) {
+            // Play count audio every second (after phase cue delay); counts beyond 10
+            // are only available in the sprite when generate_audio --max-count was raised
+            if (count > 0 && secondsElapsed >= 0) {
                 // Only play if we haven't played this count for this phase
                 if (this.lastCountPlayed[phase] !== count) {
                     this.lastCountPlayed[phase] = count;
                     const countAudio = this.audioFiles.counts[count];
-                    if (countAudio && countAudio.readyState >= 2) {
+                    if (this.sprite) {
+                        this.playSpriteCue(`count_${count}`);
+                    } else if (countAudio && countAudio.readyState >= 2) {
                         countAudio.currentTime = 0;
                         countAudio.play().catch(e => console.warn('Count audio play failed:', e));
                     }
@@ -447,8 +620,10 @@ class BreathingGuideEngine {
             }
             
             // Update session as cancelled
-            if (this.sessionId) {
+            if (this.sessionUuid) {
                 await this.updateSession('cancel');
+                // Don't leave while the cancel is still queued (e.g. rate limited)
+                await waitForSessionEvents(this.sessionUuid, SESSION_LEAVE_WAIT_MS);
             }
             
             // Redirect to categories
@@ -465,24 +640,31 @@ class BreathingGuideEngine {
         }
         
         // Update session as completed
-        if (this.sessionId) {
+        if (this.sessionUuid) {
             await this.updateSession('complete');
         }
         
         // Show success message
         alert('Сессия завершена! Вы молодец.');
         
-        // Redirect to categories after 2 seconds
-        setTimeout(() => {
-            window.location.href = '/breathe/';
-        }, 2000);
+        // Redirect to categories after 2 seconds, once the completion has been sent
+        const leave = new Promise(resolve => setTimeout(resolve, 2000));
+        if (this.sessionUuid) {
+            await Promise.all([leave, waitForSessionEvents(this.sessionUuid, SESSION_LEAVE_WAIT_MS)]);
+        } else {
+            await leave;
+        }
+        window.location.href = '/breathe/';
     }
     
     async updateSessionCycles() {
-        if (!this.sessionId) return;
+        // Progress is a heartbeat to the coalescing endpoint once the start has
+        // been uploaded; the complete/cancel event carries the final count anyway
+        const sessionId = sessionIds[this.sessionUuid];
+        if (!sessionId || navigator.onLine === false) return;
         
         try {
-            await fetch('/breathe/api/session/', {
+            await fetch(SESSION_URL, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -490,41 +672,38 @@ class BreathingGuideEngine {
                 },
                 body: JSON.stringify({
                     action: 'update',
-                    session_id: this.sessionId,
+                    session_id: sessionId,
                     cycles_completed: this.cyclesCompleted
                 })
             });
         } catch (error) {
-            console.error('Error updating session cycles:', error);
+            console.warn('Session heartbeat failed:', error);
         }
     }
     
     async updateSession(action) {
-        if (!this.sessionId) return;
-        
-        try {
-            await fetch('/breathe/api/session/', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': this.getCSRFToken()
-                },
-                body: JSON.stringify({
-                    action: action,
-                    session_id: this.sessionId,
-                    cycles_completed: this.cyclesCompleted
-                })
-            });
-        } catch (error) {
-            console.error(`Error ${action}ing session:`, error);
-        }
+        if (!this.sessionUuid) return;
+        await this.queueSessionEvent({
+            type: action,
+            cycles_completed: this.cyclesCompleted
+        });
+    }
+    
+    async queueSessionEvent(event) {
+        if (!sessionTrackingEnabled) return;
+        const queue = loadSessionQueue();
+        queue.push(Object.assign({
+            event_id: generateUUID(),
+            session_uuid: this.sessionUuid,
+            timestamp: new Date().toISOString()
+        }, event));
+        saveSessionQueue(queue);
+        await flushSessionQueue(this.getCSRFToken());
     }
     
     getCSRFToken() {
-        const csrfInput = document.querySelector('[name=csrfmiddlewaretoken]');
-        if (csrfInput) return csrfInput.value;
-        
-        // Fallback to cookie
+        // Cookie first: a page served from the offline precache may embed
+        // a token from before the last login
         const name = 'csrftoken';
         let cookieValue = null;
         if (document.cookie && document.cookie !== '') {
@@ -537,14 +716,31 @@ class BreathingGuideEngine {
                 }
             }
         }
-        return cookieValue;
+        if (cookieValue) return cookieValue;
+        
+        const csrfInput = document.querySelector('[name=csrfmiddlewaretoken]');
+        return csrfInput ? csrfInput.value : null;
     }
 }
 
 // Initialize when DOM is ready
 document.addEventListener('DOMContentLoaded', function() {
-    if (window.techniqueData) {
-        const engine = new BreathingGuideEngine(window.techniqueData);
+    const container = document.querySelector('.guide-container');
+    sessionTrackingEnabled = Boolean(container) && container.dataset.authenticated === 'true';
+    if (!sessionTrackingEnabled) {
+        // Left over from a user who has since logged out
+        saveSessionQueue([]);
+    }
+    
+    // Send events left over from sessions that ended while offline
+    const getCSRFToken = BreathingGuideEngine.prototype.getCSRFToken;
+    window.addEventListener('online', () => flushSessionQueue(getCSRFToken()));
+    flushSessionQueue(getCSRFToken());
+    
+    const timelineElement = document.getElementById('technique-timeline');
+    if (window.techniqueData && timelineElement) {
+        const timeline = JSON.parse(timelineElement.textContent);
+        const engine = new BreathingGuideEngine(window.techniqueData, timeline);
         // Store engine globally for debugging
         window.breathingEngine = engine;
     } else {
@@ -0,0 +1,82 @@
+/**
+ * Service worker of the breathing guide (generated by breathe.precache).
+ *
+ * Precaches the guide's static assets and the catalog pages when it installs
+ * and serves them cache-first, so repeat visits and running sessions need no
+ * network. Catalog pages served from the cache are refreshed in the background
+ * for the next visit. Everything else (the session API in particular) goes to
+ * the network.
+ */
+
+const PRECACHE = {{ precache|safe }};
+const CACHE_PREFIX = 'breathe-precache-';
+const CACHE_NAME = CACHE_PREFIX + PRECACHE.version;
+const PRECACHE_URLS = new Set(PRECACHE.urls.map(url => new URL(url, self.location.origin).href));
+const PAGE_URLS = new Set(PRECACHE.pages.map(url => new URL(url, self.location.origin).href));
+
+function cacheUrl(cache, url) {
+    // Bypass the HTTP cache, so an unhashed URL can't be stored with stale content
+    return fetch(new Request(url, { cache: 'reload', credentials: 'same-origin' }))
+        .then(response => {
+            if (response.ok && !response.redirected) {
+                return cache.put(url, response);
+            }
+        })
+        .catch(() => {
+            // Offline or failed: fetched again on first use
+        });
+}
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then(cache => Promise.all(PRECACHE.urls.map(url => cacheUrl(cache, url))))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names
+                    .filter(name => name.startsWith(CACHE_PREFIX) && name !== CACHE_NAME)
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    url.search = '';
+    url.hash = '';
+    if (!PRECACHE_URLS.has(url.href)) {
+        return;
+    }
+
+    const isPage = PAGE_URLS.has(url.href);
+    const served = caches.open(CACHE_NAME).then(cache => cache.match(url.href).then(cached => {
+        // Static assets are revisioned: only fetch them when missing from the cache
+        if (cached && !isPage) {
+            return {cached, fetched: null};
+        }
+        const fetched = fetch(request).then(response => {
+            if (response.ok && !response.redirected) {
+                return cache.put(url.href, response.clone()).then(() => response);
+            }
+            return response;
+        });
+        return {cached, fetched};
+    }));
+
+    event.respondWith(served.then(({cached, fetched}) => cached || fetched));
+    if (isPage) {
+        // Stale-while-revalidate: the page rendered now replaces the cached copy
+        event.waitUntil(served.then(({fetched}) => fetched.catch(() => {})));
+    }
+});
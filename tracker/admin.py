@@ -1,20 +1,43 @@
 from django.contrib import admin
-from .models import ActivityLog
+from breathing.admin import AutocompleteFilter, LargeTableAdmin
+from .models import ActivityLog, ActivityCounter, UserProfile
 
 
 @admin.register(ActivityLog)
-class ActivityLogAdmin(admin.ModelAdmin):
-    """Admin interface for ActivityLog model."""
+class ActivityLogAdmin(LargeTableAdmin):
+    """Admin interface for ActivityLog model (estimated counts, see breathing.admin)."""
     
     list_display = ['id', 'user', 'activity_type', 'timestamp']
-    list_filter = ['activity_type', 'timestamp', 'user']
+    # No date_hierarchy: its drill-down reads the distinct dates of the whole table
+    list_filter = ['activity_type', 'timestamp', ('user', AutocompleteFilter)]
     search_fields = ['user__username', 'activity_type']
-    readonly_fields = ['timestamp']
-    date_hierarchy = 'timestamp'
+    readonly_fields = ['timestamp', 'client_uuid']
+    autocomplete_fields = ['user']
     ordering = ['-timestamp']
     
     fieldsets = (
         ('Activity Information', {
-            'fields': ('user', 'activity_type', 'timestamp')
+            'fields': ('user', 'activity_type', 'timestamp', 'client_uuid')
         }),
     )
+
+
+@admin.register(ActivityCounter)
+class ActivityCounterAdmin(admin.ModelAdmin):
+    """Read-only view of materialized per-user activity counts."""
+    
+    list_display = ['user', 'resist', 'smoked', 'sport']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'resist', 'smoked', 'sport']
+    
+    def has_add_permission(self, request):
+        """Counters are maintained by the tap endpoints and rebuild_activity_counters."""
+        return False
+
+
+@admin.register(UserProfile)
+class UserProfileAdmin(admin.ModelAdmin):
+    """Admin interface for per-user tracker settings."""
+    
+    list_display = ['user', 'time_zone']
+    search_fields = ['user__username']
@@ -0,0 +1,46 @@
+"""Row sources for exporting ActivityLog (see breathing.exports for encoding)."""
+
+from django.contrib.auth.models import User
+
+from archive.query import archived_rows, union_rows
+from breathing.exports import CHUNK_SIZE
+
+from .models import ActivityLog
+
+ACTIVITY_EXPORT_FIELDS = ['id', 'username', 'activity_type', 'timestamp', 'client_uuid']
+
+
+def archived_activity_rows(user=None, start=None, end=None):
+    """Archived ActivityLog rows (see archive.query) in the export row shape."""
+    usernames = None
+    for row in archived_rows(ActivityLog, user_id=user.pk if user else None, start=start, end=end):
+        if usernames is None:
+            usernames = {user.pk: user.username} if user else dict(User.objects.values_list('id', 'username'))
+        yield {
+            'id': row['id'],
+            'username': usernames.get(row['user_id']),
+            'activity_type': row['activity_type'],
+            'timestamp': row['timestamp'],
+            'client_uuid': row['client_uuid'],
+        }
+
+
+def activity_export_rows(user=None, start=None, end=None):
+    """
+    Yield ActivityLog rows as dicts, oldest first, optionally limited to one
+    user and a [start, end) timestamp range. Rows are streamed from the
+    database in chunks rather than loaded all at once, merged with archived rows.
+    """
+    logs = ActivityLog.objects.all()
+    if user is not None:
+        logs = logs.filter(user=user)
+    if start is not None:
+        logs = logs.filter(timestamp__gte=start)
+    if end is not None:
+        logs = logs.filter(timestamp__lt=end)
+
+    values = logs.order_by('timestamp', 'id').values_list(
+        'id', 'user__username', 'activity_type', 'timestamp', 'client_uuid'
+    )
+    live = (dict(zip(ACTIVITY_EXPORT_FIELDS, row)) for row in values.iterator(chunk_size=CHUNK_SIZE))
+    yield from union_rows(ActivityLog, live, archived_activity_rows(user, start, end))
@@ -0,0 +1,126 @@
+"""
+Django management command to benchmark the hot endpoints on seeded data.
+
+Creates a throwaway test database (like `manage.py test`), seeds it with a
+10k, 1M or 10M-row dataset, drives home, the catalog pages, activity taps,
+session start/complete and the history APIs through the Django test client
+and reports p50/p95/p99 latency and queries per request (see
+breathing.benchmark). Exits with an error when an endpoint regressed against
+benchmarks/baseline.json.
+
+Usage:
+    python manage.py benchmark_endpoints                        # 10k rows, compare with the baseline
+    python manage.py benchmark_endpoints --scale 1m --keepdb    # Reuse the seeded database next time
+    python manage.py benchmark_endpoints --only activity_tap --requests 500
+    python manage.py benchmark_endpoints --update-baseline      # Record this run as the baseline
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from breathing.benchmark import (
+    BASELINE_PATH, DEFAULT_REQUESTS, DEFAULT_THRESHOLD, DEFAULT_WARMUP, SCALES,
+    benchmark_database, compare, environment, load_baseline, run_benchmarks, save_baseline, seed_once,
+)
+
+
+class Command(BaseCommand):
+    help = 'Measure endpoint latency and query counts on seeded data and compare with the baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            choices=list(SCALES),
+            default='10k',
+            help='Dataset size in activity log rows (default: 10k)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=DEFAULT_REQUESTS,
+            help=f'Measured requests per endpoint (default: {DEFAULT_REQUESTS})',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=DEFAULT_WARMUP,
+            help=f'Unmeasured requests per endpoint first (default: {DEFAULT_WARMUP})',
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            default=None,
+            help='Only benchmark these endpoints',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help=f'Allowed p95 growth over the baseline (default: {DEFAULT_THRESHOLD})',
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            default=str(BASELINE_PATH),
+            help='Baseline JSON file (default: benchmarks/baseline.json)',
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Store the results as the baseline for this scale instead of comparing',
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the seeded test database for later runs',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the results as JSON',
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] <= 0:
+            raise CommandError('--requests must be positive')
+        scale = options['scale']
+        rows = SCALES[scale]
+
+        with benchmark_database(keepdb=options['keepdb']):
+            user, seeded = seed_once(rows)
+            if seeded:
+                self.stdout.write(f'Seeded {rows} activity logs and {rows // 10} sessions')
+            results = run_benchmarks(user, options['requests'], options['warmup'], options['only'])
+
+        if options['json']:
+            self.stdout.write(json.dumps({'scale': scale, 'endpoints': results}, indent=2))
+        else:
+            self.stdout.write(self.style.SUCCESS('=' * 60))
+            self.stdout.write(self.style.SUCCESS(f'Endpoint benchmark: {scale} ({options["requests"]} requests each)'))
+            self.stdout.write(self.style.SUCCESS('=' * 60))
+            self.stdout.write(f'  {"endpoint":<18}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}')
+            for name, result in results.items():
+                self.stdout.write(
+                    f'  {name:<18}{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}'
+                    f'{result["p99_ms"]:>9.2f}{result["queries"]:>9}'
+                )
+
+        baseline = load_baseline(options['baseline'])
+        if options['update_baseline']:
+            entry = baseline.setdefault(scale, {'endpoints': {}})
+            entry['environment'] = environment()
+            entry['requests'] = options['requests']
+            entry['endpoints'].update(results)
+            save_baseline(baseline, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'✓ Baseline for {scale} written to {options["baseline"]}'))
+            return
+
+        if scale not in baseline:
+            self.stdout.write(self.style.WARNING(f'No baseline for {scale}; nothing to compare'))
+            return
+        regressions = compare(results, baseline[scale]['endpoints'], options['threshold'])
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f'  ✗ {regression}'))
+            raise CommandError(f'{len(regressions)} regression(s) against the {scale} baseline')
+        self.stdout.write(self.style.SUCCESS(f'✓ No regressions against the {scale} baseline'))
@@ -0,0 +1,109 @@
+"""
+Django management command comparing concurrent activity tap throughput under
+WSGI and ASGI.
+
+Seeds a throwaway test database (like benchmark_endpoints) and serves the
+same burst of taps through the WSGI handler with the sync `activity_tap`,
+from as many threads as the Procfile's gunicorn worker has, and through the
+ASGI handler with `activity_tap_async`, with many requests in flight on one
+event loop (see breathing.benchmark.tap_throughput). --db-latency adds a
+sleep to every query to stand in for the round trip to a database server;
+with the default of 0 a local SQLite file answers in microseconds.
+
+Usage:
+    python manage.py benchmark_tap_throughput                   # 1000 taps per mode
+    python manage.py benchmark_tap_throughput --db-latency 2    # 2 ms per query
+    python manage.py benchmark_tap_throughput --threads 4 --concurrency 100
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from breathing.benchmark import (
+    ASGI_CONCURRENCY, DEFAULT_TAPS, SCALES, WSGI_THREADS, benchmark_database, environment, seed_once,
+    tap_throughput,
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent activity tap throughput of the WSGI (sync) and ASGI (async) views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--taps',
+            type=int,
+            default=DEFAULT_TAPS,
+            help=f'Taps per mode (default: {DEFAULT_TAPS})',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=WSGI_THREADS,
+            help=f'WSGI threads (default: {WSGI_THREADS}, as in the Procfile)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=ASGI_CONCURRENCY,
+            help=f'ASGI requests in flight (default: {ASGI_CONCURRENCY})',
+        )
+        parser.add_argument(
+            '--db-latency',
+            type=float,
+            default=0.0,
+            help='Milliseconds added to every query (default: 0)',
+        )
+        parser.add_argument(
+            '--scale',
+            choices=list(SCALES),
+            default='10k',
+            help='Seeded dataset size (default: 10k)',
+        )
+        parser.add_argument(
+            '--keepdb',
+            action='store_true',
+            help='Keep the seeded test database for later runs',
+        )
+
+    def handle(self, *args, **options):
+        if options['taps'] <= 0 or options['threads'] <= 0 or options['concurrency'] <= 0:
+            raise CommandError('--taps, --threads and --concurrency must be positive')
+        if options['db_latency'] < 0:
+            raise CommandError('--db-latency must not be negative')
+
+        with benchmark_database(keepdb=options['keepdb'], shared=True):
+            user, seeded = seed_once(SCALES[options['scale']])
+            if seeded:
+                self.stdout.write(f'Seeded {SCALES[options["scale"]]} activity logs')
+            measured = environment()
+            results = {}
+            for mode in ('wsgi', 'asgi'):
+                # A short unmeasured run loads each handler's middleware and warms the caches
+                tap_throughput(user, mode, taps=10, threads=options['threads'],
+                               concurrency=options['concurrency'])
+                results[mode] = tap_throughput(
+                    user,
+                    mode,
+                    taps=options['taps'],
+                    threads=options['threads'],
+                    concurrency=options['concurrency'],
+                    db_latency=options['db_latency'] / 1000,
+                )
+
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        self.stdout.write(self.style.SUCCESS(
+            f'Activity tap throughput: {options["taps"]} taps, '
+            f'{options["db_latency"]:g} ms per query ({measured["database"]})'
+        ))
+        self.stdout.write(self.style.SUCCESS('=' * 60))
+        labels = {
+            'wsgi': f'WSGI, {options["threads"]} threads',
+            'asgi': f'ASGI, {options["concurrency"]} in flight',
+        }
+        self.stdout.write(f'  {"mode":<24}{"taps/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"errors":>8}')
+        for mode, result in results.items():
+            self.stdout.write(
+                f'  {labels[mode]:<24}{result["taps_per_second"]:>10.1f}{result["p50_ms"]:>10.2f}'
+                f'{result["p95_ms"]:>10.2f}{result["errors"]:>8}'
+            )
+        for mode, result in results.items():
+            if result['errors']:
+                self.stdout.write(self.style.WARNING(f'✗ {result["errors"]} {mode} request(s) failed'))
@@ -0,0 +1,115 @@
+"""
+Django management command to rebuild or reconcile ActivityCounter rows.
+
+Counters are normally kept up to date by the activity tap endpoints. This
+command recalculates them from ActivityLog and archived logs (see
+archive.segments), e.g. after rows were edited or deleted in the admin, or to
+verify that nothing has drifted.
+
+Usage:
+    python manage.py rebuild_activity_counters
+    python manage.py rebuild_activity_counters --check       # Report drift only
+    python manage.py rebuild_activity_counters --user admin  # Single user
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Q
+from archive.query import archived_rows
+from tracker.models import ActivityLog, ActivityCounter
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or reconcile per-user activity counters from ActivityLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=str,
+            default=None,
+            help='Only process the user with this username',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Report counters that differ from ActivityLog without changing them',
+        )
+
+    def handle(self, *args, **options):
+        username = options['user']
+        check_only = options['check']
+
+        users = User.objects.all()
+        if username:
+            users = users.filter(username=username)
+            if not users.exists():
+                raise CommandError(f'User not found: {username}')
+
+        with transaction.atomic():
+            stored_counters = ActivityCounter.objects.filter(user__in=users)
+            if not check_only:
+                # Lock existing counters first so taps committing while we
+                # aggregate wait for us and then increment the rebuilt value.
+                stored_counters = stored_counters.select_for_update()
+            stored = {
+                counter.user_id: counter.as_dict()
+                for counter in stored_counters
+            }
+
+            # One grouped aggregate for all users instead of one query per user
+            logs = ActivityLog.objects.filter(user__in=users)
+            actual = {
+                row['user']: {
+                    'resist': row['resist'],
+                    'smoked': row['smoked'],
+                    'sport': row['sport'],
+                }
+                for row in logs.values('user').order_by().annotate(
+                    resist=Count('id', filter=Q(activity_type='RESIST')),
+                    smoked=Count('id', filter=Q(activity_type='SMOKED')),
+                    sport=Count('id', filter=Q(activity_type='SPORT')),
+                )
+            }
+            empty = {'resist': 0, 'smoked': 0, 'sport': 0}
+            # Archived logs still count
+            archived_user = users.get().pk if username else None
+            for row in archived_rows(ActivityLog, user_id=archived_user):
+                counts = actual.setdefault(row['user_id'], dict(empty))
+                counts[ActivityCounter.COUNT_FIELDS[row['activity_type']]] += 1
+
+            drifted = []
+            for user_id, username_value in users.values_list('id', 'username'):
+                expected = actual.get(user_id, empty)
+                current = stored.get(user_id)
+                if current != expected and (current is not None or expected != empty):
+                    drifted.append((user_id, username_value, current, expected))
+
+            if not drifted:
+                self.stdout.write(self.style.SUCCESS('✓ All activity counters are up to date'))
+                return
+
+            for user_id, username_value, current, expected in drifted:
+                self.stdout.write(
+                    f'  {username_value}: stored={current} actual={expected}'
+                )
+
+            if check_only:
+                self.stdout.write(
+                    self.style.WARNING(f'{len(drifted)} counter(s) out of date')
+                )
+                return
+
+            ActivityCounter.objects.bulk_create(
+                [
+                    ActivityCounter(user_id=user_id, **expected)
+                    for user_id, _, _, expected in drifted
+                ],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['resist', 'smoked', 'sport'],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Rebuilt {len(drifted)} activity counter(s)')
+        )
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-17 05:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tracker', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('resist', models.PositiveIntegerField(default=0, help_text='Number of RESIST taps')),
+                ('smoked', models.PositiveIntegerField(default=0, help_text='Number of SMOKED taps')),
+                ('sport', models.PositiveIntegerField(default=0, help_text='Number of SPORT taps')),
+            ],
+            options={
+                'verbose_name': 'Activity Counter',
+                'verbose_name_plural': 'Activity Counters',
+            },
+        ),
+    ]
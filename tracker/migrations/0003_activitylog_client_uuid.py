@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-17 05:52
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0002_activitycounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitylog',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, help_text='Client-generated id for taps queued offline (used to drop retries)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='activitylog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When the activity was logged'),
+        ),
+        migrations.AddConstraint(
+            model_name='activitylog',
+            constraint=models.UniqueConstraint(fields=('user', 'client_uuid'), name='tracker_activitylog_unique_client_uuid'),
+        ),
+    ]
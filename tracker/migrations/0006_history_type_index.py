@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-17 06:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_per_user_time_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Create the new index before dropping the one it replaces
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', 'activity_type', '-timestamp'], include=('id',), name='tracker_log_user_type_ts_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='activitylog',
+            name='tracker_log_user_type_idx',
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0006_history_type_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='observed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='observed_id',
+            field=models.BigIntegerField(default=0, help_text='Highest ActivityLog id when observed_at was recorded'),
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='safe_id',
+            field=models.BigIntegerField(default=0, help_text='Rows up to this id have had time to commit and may be folded'),
+        ),
+    ]
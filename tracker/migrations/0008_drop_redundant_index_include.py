@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 07:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_rollupwatermark_safe_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='activitylog',
+            name='tracker_log_user_type_ts_idx',
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', 'activity_type', '-timestamp'], name='tracker_log_user_type_ts_idx'),
+        ),
+    ]
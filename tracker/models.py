@@ -1,5 +1,11 @@
+from asgiref.sync import sync_to_async
 from django.db import models
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
+from django.conf import settings
+from django.core.exceptions import ValidationError
+import zoneinfo
 
 
 class ActivityLog(models.Model):
@@ -14,7 +20,8 @@ class ActivityLog(models.Model):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='activity_logs'
+        related_name='activity_logs',
+        db_index=False  # Leading column of the composite indexes below
     )
     activity_type = models.CharField(
         max_length=20,
@@ -22,18 +29,287 @@ class ActivityLog(models.Model):
         help_text="Type of activity: RESIST, SMOKED, or SPORT"
     )
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         help_text="When the activity was logged"
     )
+    client_uuid = models.UUIDField(
+        blank=True,
+        null=True,
+        help_text="Client-generated id for taps queued offline (used to drop retries)"
+    )
     
     class Meta:
         verbose_name = "Activity Log"
         verbose_name_plural = "Activity Logs"
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['user', 'activity_type']),
+            # A user's logs newest first (home page, exports, correlation);
+            # activity_type is included so those reads never touch the table
+            models.Index(
+                fields=['user', '-timestamp'],
+                include=['activity_type'],
+                name='tracker_log_user_ts_idx'
+            ),
+            # Per-user counts by activity type (counters, correlation cache key)
+            # and one type's logs newest first (history filtered by type)
+            models.Index(
+                fields=['user', 'activity_type', '-timestamp'],
+                name='tracker_log_user_type_ts_idx'
+            ),
+            # All users' logs by time (admin changelist, full exports)
             models.Index(fields=['timestamp']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'client_uuid'],
+                name='tracker_activitylog_unique_client_uuid'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.activity_type} - {self.timestamp}"
+
+
+class ActivityCounter(models.Model):
+    """
+    Materialized per-user totals for each activity type.
+    Kept in step with ActivityLog inside the same transaction as every insert,
+    so reading the counts is a single primary-key lookup instead of an aggregate.
+    """
+    
+    COUNT_FIELDS = {
+        'RESIST': 'resist',
+        'SMOKED': 'smoked',
+        'SPORT': 'sport',
+    }
+    
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='activity_counter'
+    )
+    resist = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of RESIST taps"
+    )
+    smoked = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of SMOKED taps"
+    )
+    sport = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of SPORT taps"
+    )
+    
+    class Meta:
+        verbose_name = "Activity Counter"
+        verbose_name_plural = "Activity Counters"
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.resist}/{self.smoked}/{self.sport}"
+    
+    def as_dict(self):
+        """Return counts in the shape used by views and templates."""
+        return {
+            'resist': self.resist,
+            'smoked': self.smoked,
+            'sport': self.sport,
+        }
+    
+    @classmethod
+    def increment(cls, user, activity_type, amount=1):
+        """
+        Atomically add `amount` to the counter for `activity_type`.
+        Must be called inside the transaction that inserted the ActivityLog rows.
+        """
+        cls.increment_many(user, {activity_type: amount})
+    
+    @classmethod
+    def increment_many(cls, user, amounts):
+        """
+        Atomically add several activity types at once, e.g. {'RESIST': 2, 'SPORT': 1},
+        with a single UPDATE. Same transaction rules as increment().
+        """
+        changes = {
+            cls.COUNT_FIELDS[activity_type]: F(cls.COUNT_FIELDS[activity_type]) + amount
+            for activity_type, amount in amounts.items()
+            if amount
+        }
+        if not changes:
+            return
+        updated = cls.objects.filter(user=user).update(**changes)
+        if not updated:
+            # First tap for this user: seed the row from existing history
+            # (which already includes the rows just inserted).
+            cls.rebuild_for_user(user)
+    
+    @classmethod
+    def rebuild_for_user(cls, user):
+        """Recalculate the counter row for `user` from ActivityLog and archived logs."""
+        counts = count_activity_logs(user)
+        counter, _ = cls.objects.update_or_create(user=user, defaults=counts)
+        return counter
+    
+    @classmethod
+    async def arebuild_for_user(cls, user):
+        """Async rebuild_for_user() for async views."""
+        counts = await acount_activity_logs(user)
+        counter, _ = await cls.objects.aupdate_or_create(user=user, defaults=counts)
+        return counter
+
+
+def activity_count_aggregates():
+    """Aggregate expressions counting each activity type."""
+    from django.db.models import Count, Q
+    
+    return {
+        'resist': Count('id', filter=Q(activity_type='RESIST')),
+        'smoked': Count('id', filter=Q(activity_type='SMOKED')),
+        'sport': Count('id', filter=Q(activity_type='SPORT')),
+    }
+
+
+def count_archived_activity_logs(user_id):
+    """Counts dictionary of the archived ActivityLog rows of a user (see archive.segments)."""
+    # Imported here: the archive app imports these models
+    from archive.query import archived_rows
+    
+    counts = dict.fromkeys(ActivityCounter.COUNT_FIELDS.values(), 0)
+    for row in archived_rows(ActivityLog, user_id=user_id):
+        counts[ActivityCounter.COUNT_FIELDS[row['activity_type']]] += 1
+    return counts
+
+
+def count_activity_logs(user):
+    """Aggregate ActivityLog rows for `user`, live and archived, into a counts dictionary."""
+    counts = ActivityLog.objects.filter(user=user).aggregate(**activity_count_aggregates())
+    archived = count_archived_activity_logs(user.pk)
+    return {name: (count or 0) + archived[name] for name, count in counts.items()}
+
+
+async def acount_activity_logs(user):
+    """Async count_activity_logs()."""
+    counts = await ActivityLog.objects.filter(user=user).aaggregate(**activity_count_aggregates())
+    archived = await sync_to_async(count_archived_activity_logs)(user.pk)
+    return {name: (count or 0) + archived[name] for name, count in counts.items()}
+
+
+def validate_time_zone(value):
+    """Reject names that zoneinfo does not know (e.g. typos like 'Europe/Moskow')."""
+    if value and value not in zoneinfo.available_timezones():
+        raise ValidationError(f"Unknown time zone: {value}")
+
+
+class UserProfile(models.Model):
+    """Per-user settings for the activity tracker."""
+    
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='tracker_profile'
+    )
+    time_zone = models.CharField(
+        max_length=64,
+        blank=True,
+        validators=[validate_time_zone],
+        help_text="IANA time zone used for daily/hourly statistics (empty = site TIME_ZONE)"
+    )
+    
+    class Meta:
+        verbose_name = "User Profile"
+        verbose_name_plural = "User Profiles"
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.get_time_zone()}"
+    
+    def get_time_zone(self):
+        return self.time_zone or settings.TIME_ZONE
+
+
+class ActivityRollup(models.Model):
+    """
+    Pre-aggregated ActivityLog counts per user, activity type and time bucket.
+    Buckets start at local hour/day boundaries in the user's time zone.
+    Maintained incrementally by the update_activity_rollups command.
+    """
+    
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    ]
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='activity_rollups'
+    )
+    activity_type = models.CharField(
+        max_length=20,
+        choices=ActivityLog.ACTIVITY_CHOICES
+    )
+    granularity = models.CharField(
+        max_length=4,
+        choices=GRANULARITY_CHOICES
+    )
+    bucket_start = models.DateTimeField(
+        help_text="Start of the local hour/day this bucket covers"
+    )
+    count = models.PositiveIntegerField(
+        default=0
+    )
+    
+    class Meta:
+        verbose_name = "Activity Rollup"
+        verbose_name_plural = "Activity Rollups"
+        ordering = ['user', 'granularity', 'bucket_start']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'granularity', 'bucket_start', 'activity_type'],
+                name='tracker_activityrollup_unique_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.granularity} {self.bucket_start} - {self.activity_type}: {self.count}"
+
+
+class RollupWatermark(models.Model):
+    """
+    High-water mark: the last ActivityLog id already folded into the rollups.
+    Rows are only folded up to `safe_id`, the highest id seen at least
+    ROLLUP_SAFETY_LAG seconds ago (see tracker.rollups).
+    """
+    
+    name = models.CharField(
+        max_length=50,
+        unique=True
+    )
+    last_id = models.BigIntegerField(
+        default=0
+    )
+    safe_id = models.BigIntegerField(
+        default=0,
+        help_text="Rows up to this id have had time to commit and may be folded"
+    )
+    observed_id = models.BigIntegerField(
+        default=0,
+        help_text="Highest ActivityLog id when observed_at was recorded"
+    )
+    observed_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+    
+    class Meta:
+        verbose_name = "Rollup Watermark"
+        verbose_name_plural = "Rollup Watermarks"
+    
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
@@ -0,0 +1,196 @@
+"""
+Incremental hourly/daily rollups of ActivityLog.
+
+ActivityLog rows are folded into ActivityRollup buckets in id order, starting
+after the id stored in the RollupWatermark. Because the watermark is an id and
+not a timestamp, taps that arrive late from the offline batch endpoint (with
+old client timestamps) are still counted in the right bucket.
+
+Ids are assigned when a row is inserted, not when its transaction commits, so
+a row with a lower id can become visible after a higher one. Folding up to the
+highest visible id would put such a row below the watermark for good. Each run
+therefore records the highest id it sees, and a later run folds rows only up
+to an id recorded at least settings.ROLLUP_SAFETY_LAG seconds earlier, by
+which time every transaction that took a lower id has committed or rolled
+back. Rows above the watermark are counted live by activity_stats meanwhile.
+
+Rows that are edited or deleted after being rolled up are not tracked; run
+`update_activity_rollups --rebuild` to recompute from scratch. Archived rows
+(see archive.segments) were rolled up before they were moved, and a rebuild
+reads them back from the archive.
+"""
+
+from collections import Counter, defaultdict
+from itertools import islice
+import zoneinfo
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from archive.query import archived_rows
+
+from .models import ActivityLog, ActivityRollup, RollupWatermark, UserProfile
+
+WATERMARK_NAME = 'activity_rollups'
+GRANULARITIES = (ActivityRollup.HOUR, ActivityRollup.DAY)
+
+
+def get_user_time_zones(user_ids):
+    """Map user id -> ZoneInfo, using settings.TIME_ZONE for users without a profile."""
+    default = settings.TIME_ZONE
+    names = dict(
+        UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'time_zone')
+    )
+    return {
+        user_id: zoneinfo.ZoneInfo(names.get(user_id) or default)
+        for user_id in user_ids
+    }
+
+
+def bucket_start(timestamp, tz, granularity):
+    """Start of the local hour or day containing `timestamp` in `tz`."""
+    local = timestamp.astimezone(tz)
+    if granularity == ActivityRollup.DAY:
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return local.replace(minute=0, second=0, microsecond=0)
+
+
+def count_buckets(rows, time_zones):
+    """
+    Count (user_id, activity_type, timestamp) rows into
+    {(user_id, granularity, bucket_start, activity_type): count}.
+    """
+    counts = Counter()
+    for user_id, activity_type, timestamp in rows:
+        tz = time_zones[user_id]
+        for granularity in GRANULARITIES:
+            start = bucket_start(timestamp, tz, granularity)
+            counts[(user_id, granularity, start, activity_type)] += 1
+    return counts
+
+
+def apply_counts(counts):
+    """Add bucket counts to ActivityRollup: bulk_update existing rows, bulk_create new ones."""
+    if not counts:
+        return
+
+    by_user = defaultdict(set)
+    for user_id, granularity, start, activity_type in counts:
+        by_user[user_id].add(start)
+
+    existing = {}
+    for user_id, starts in by_user.items():
+        for rollup in ActivityRollup.objects.filter(user_id=user_id, bucket_start__in=starts):
+            key = (rollup.user_id, rollup.granularity, rollup.bucket_start, rollup.activity_type)
+            existing[key] = rollup
+
+    to_update = []
+    to_create = []
+    for key, amount in counts.items():
+        rollup = existing.get(key)
+        if rollup is not None:
+            rollup.count += amount
+            to_update.append(rollup)
+        else:
+            user_id, granularity, start, activity_type = key
+            to_create.append(ActivityRollup(
+                user_id=user_id,
+                granularity=granularity,
+                bucket_start=start,
+                activity_type=activity_type,
+                count=amount,
+            ))
+
+    if to_update:
+        ActivityRollup.objects.bulk_update(to_update, ['count'], batch_size=1000)
+    if to_create:
+        ActivityRollup.objects.bulk_create(to_create, batch_size=1000)
+
+
+def lock_watermark():
+    watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    # Lock the watermark so two runs never fold the same rows twice
+    return RollupWatermark.objects.select_for_update().get(pk=watermark.pk)
+
+
+def advance_safe_id(lag):
+    """
+    Move the watermark's safe_id to the highest id observed at least `lag`
+    seconds ago and record the current highest id for a later run. With a
+    lag of 0, every row visible now is considered safe. Returns safe_id.
+    """
+    with transaction.atomic():
+        watermark = lock_watermark()
+        now = timezone.now()
+        latest = ActivityLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        if lag <= 0:
+            watermark.safe_id = max(watermark.safe_id, latest)
+        elif watermark.observed_at is None or (now - watermark.observed_at).total_seconds() >= lag:
+            watermark.safe_id = max(watermark.safe_id, watermark.observed_id)
+        else:
+            # Keep the pending observation until it is old enough
+            return watermark.safe_id
+        watermark.observed_id = latest
+        watermark.observed_at = now
+        watermark.save(update_fields=['safe_id', 'observed_id', 'observed_at', 'updated_at'])
+        return watermark.safe_id
+
+
+def update_rollups(batch_size=5000, lag=None):
+    """
+    Fold ActivityLog rows newer than the watermark, up to the safe id (see the
+    module docstring; `lag` defaults to settings.ROLLUP_SAFETY_LAG), into the
+    rollups, one batch per transaction. Returns the number of rows processed.
+    """
+    safe_id = advance_safe_id(settings.ROLLUP_SAFETY_LAG if lag is None else lag)
+    processed = 0
+    while True:
+        with transaction.atomic():
+            watermark = lock_watermark()
+
+            rows = list(
+                ActivityLog.objects.filter(id__gt=watermark.last_id, id__lte=safe_id)
+                .order_by('id')
+                .values_list('id', 'user_id', 'activity_type', 'timestamp')[:batch_size]
+            )
+            if not rows:
+                return processed
+
+            time_zones = get_user_time_zones({row[1] for row in rows})
+            apply_counts(count_buckets((row[1:] for row in rows), time_zones))
+
+            watermark.last_id = rows[-1][0]
+            watermark.save(update_fields=['last_id', 'updated_at'])
+            processed += len(rows)
+
+        if len(rows) < batch_size:
+            return processed
+
+
+def rebuild_rollups(batch_size=5000, lag=None):
+    """Drop all rollups and fold the archived logs and the whole ActivityLog table again."""
+    archived = 0
+    with transaction.atomic():
+        ActivityRollup.objects.all().delete()
+        RollupWatermark.objects.update_or_create(
+            name=WATERMARK_NAME, defaults={'last_id': 0}
+        )
+        rows = (
+            (row['user_id'], row['activity_type'], row['timestamp'])
+            for row in archived_rows(ActivityLog)
+        )
+        while batch := list(islice(rows, batch_size)):
+            time_zones = get_user_time_zones({row[0] for row in batch})
+            apply_counts(count_buckets(batch, time_zones))
+            archived += len(batch)
+    return archived + update_rollups(batch_size=batch_size, lag=lag)
+
+
+def get_watermark():
+    """Last ActivityLog id included in the rollups (0 if never run)."""
+    return (
+        RollupWatermark.objects.filter(name=WATERMARK_NAME)
+        .values_list('last_id', flat=True)
+        .first()
+    ) or 0
@@ -1,3 +1,558 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import uuid
+import zoneinfo
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from breathe.models import BreathingSession
+from breathing.admin import COUNT_LIMIT, EstimatedCountPaginator
+from breathing.benchmark import compare, run_benchmarks, seed
+from breathing.pagination import decode_cursor, keyset_page
+from breathing.ratelimit import RateLimiter
+
+from .models import ActivityLog, ActivityCounter, ActivityRollup, UserProfile
+from .rollups import update_rollups
+from .views import activity_stats, activity_tap_async, get_activity_counts, publish_activity_counts, record_tap
+
+
+class ActivityCounterTests(TestCase):
+    """Materialized counters stay in step with ActivityLog."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def tap(self, activity_type):
+        return self.client.post(
+            reverse('tracker:activity_tap'),
+            data=json.dumps({'activity_type': activity_type}),
+            content_type='application/json',
+        )
+
+    def test_tap_increments_counter(self):
+        response = self.tap('RESIST')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['counts'], {'resist': 1, 'smoked': 0, 'sport': 0})
+        self.tap('SPORT')
+        counter = ActivityCounter.objects.get(user=self.user)
+        self.assertEqual(counter.as_dict(), {'resist': 1, 'smoked': 0, 'sport': 1})
+
+    def test_counts_seeded_from_existing_history(self):
+        ActivityLog.objects.create(user=self.user, activity_type='SMOKED')
+        ActivityLog.objects.create(user=self.user, activity_type='SMOKED')
+        self.assertEqual(get_activity_counts(self.user), {'resist': 0, 'smoked': 2, 'sport': 0})
+
+    def test_rebuild_command_reconciles_drift(self):
+        self.tap('RESIST')
+        ActivityLog.objects.create(user=self.user, activity_type='SPORT')
+        call_command('rebuild_activity_counters', stdout=StringIO())
+        counter = ActivityCounter.objects.get(user=self.user)
+        self.assertEqual(counter.as_dict(), {'resist': 1, 'smoked': 0, 'sport': 1})
+
+
+class ActivityTapRateLimitTests(TestCase):
+    """The cache-backed limiter rejects repeat taps of the same type."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        patcher = mock.patch('breathing.ratelimit.time')
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clock.time.return_value = 999.0
+
+    def tap(self, activity_type):
+        return self.client.post(
+            reverse('tracker:activity_tap'),
+            data=json.dumps({'activity_type': activity_type}),
+            content_type='application/json',
+        )
+
+    def test_same_type_is_rate_limited(self):
+        self.assertEqual(self.tap('RESIST').status_code, 200)
+        response = self.tap('RESIST')
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(response.json()['rate_limited'])
+        self.assertEqual(ActivityLog.objects.count(), 1)
+
+    def test_tap_is_allowed_again_after_period(self):
+        # DatabaseCache rewrites the key's TTL on set(); the stored refill time decides
+        self.assertEqual(self.tap('RESIST').status_code, 200)
+        self.clock.time.return_value = 1001.0
+        self.assertEqual(self.tap('RESIST').status_code, 429)
+        self.clock.time.return_value = 1002.0
+        self.assertEqual(self.tap('RESIST').status_code, 200)
+        self.clock.time.return_value = 1004.0
+        self.assertEqual(self.tap('RESIST').status_code, 429)
+        self.clock.time.return_value = 1005.0
+        self.assertEqual(self.tap('RESIST').status_code, 200)
+        self.assertEqual(ActivityLog.objects.count(), 3)
+
+    def test_taps_straddling_a_window_boundary_are_limited(self):
+        # 1002 is a multiple of the 3-second period: a fixed window would reset here
+        self.clock.time.return_value = 1001.95
+        self.assertEqual(self.tap('RESIST').status_code, 200)
+        self.clock.time.return_value = 1002.05
+        self.assertEqual(self.tap('RESIST').status_code, 429)
+        self.assertEqual(ActivityLog.objects.count(), 1)
+
+    def test_retry_of_saved_tap_is_not_rate_limited(self):
+        # The tap was saved but its response was lost; the retry reuses its client_uuid
+        tap = {'activity_type': 'RESIST', 'client_uuid': str(uuid.uuid4())}
+        url = reverse('tracker:activity_tap')
+        first = self.client.post(url, data=json.dumps(tap), content_type='application/json')
+        retry = self.client.post(url, data=json.dumps(tap), content_type='application/json')
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(retry.json()['duplicate'])
+        self.assertEqual(retry.json()['activity_id'], first.json()['activity_id'])
+        self.assertEqual(self.tap('RESIST').status_code, 429)
+        self.assertEqual(ActivityLog.objects.count(), 1)
+
+    def test_other_types_are_limited_independently(self):
+        self.assertEqual(self.tap('RESIST').status_code, 200)
+        self.assertEqual(self.tap('SMOKED').status_code, 200)
+
+    @override_settings(RATE_LIMIT_CACHE='missing')
+    def test_locmem_fallback(self):
+        limiter = RateLimiter('test', 2, 60)
+        self.assertTrue(limiter.hit('x'))
+        self.assertTrue(limiter.hit('x'))
+        self.assertFalse(limiter.hit('x'))
+        limiter.reset('x')
+        self.assertTrue(limiter.hit('x'))
+
+
+@override_settings(ROOT_URLCONF='breathing.asgi_urls')
+class AsyncActivityTapTests(TestCase):
+    """Under ASGI, taps are served by the async view with the same responses."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    async def tap(self, activity_type):
+        return await self.async_client.post(
+            reverse('tracker:activity_tap'),
+            data=json.dumps({'activity_type': activity_type}),
+            content_type='application/json',
+        )
+
+    def test_routes_to_async_view(self):
+        self.assertIs(resolve(reverse('tracker:activity_tap')).func, activity_tap_async)
+        self.assertEqual(resolve(reverse('tracker:activity_stats')).func, activity_stats)
+
+    async def test_tap_counts_and_rate_limit(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.tap('RESIST')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['counts'], {'resist': 1, 'smoked': 0, 'sport': 0})
+        self.assertEqual((await self.tap('RESIST')).status_code, 429)
+        self.assertEqual((await self.tap('SPORT')).json()['counts']['sport'], 1)
+        self.assertEqual((await self.tap('JUMP')).status_code, 400)
+        self.assertEqual(await ActivityLog.objects.acount(), 2)
+
+    async def test_retry_of_saved_tap_is_not_rate_limited(self):
+        await self.async_client.aforce_login(self.user)
+        tap = json.dumps({'activity_type': 'RESIST', 'client_uuid': str(uuid.uuid4())})
+        url = reverse('tracker:activity_tap')
+        await self.async_client.post(url, data=tap, content_type='application/json')
+        retry = await self.async_client.post(url, data=tap, content_type='application/json')
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(retry.json()['duplicate'])
+        self.assertEqual(await ActivityLog.objects.acount(), 1)
+
+    async def test_requires_login(self):
+        self.assertEqual((await self.tap('RESIST')).status_code, 302)
+        self.assertEqual(await ActivityLog.objects.acount(), 0)
+
+
+class ActivityTapBatchTests(TestCase):
+    """Offline taps are deduplicated, rate limited in memory and bulk inserted."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def send(self, taps):
+        return self.client.post(
+            reverse('tracker:activity_tap_batch'),
+            data=json.dumps({'taps': taps}),
+            content_type='application/json',
+        )
+
+    def make_tap(self, activity_type, timestamp):
+        return {
+            'activity_type': activity_type,
+            'client_uuid': str(uuid.uuid4()),
+            'client_timestamp': timestamp,
+        }
+
+    def test_batch_insert_and_retry_is_idempotent(self):
+        taps = [
+            self.make_tap('RESIST', '2025-01-01T10:00:00Z'),
+            self.make_tap('RESIST', '2025-01-01T10:00:10Z'),
+            self.make_tap('SPORT', '2025-01-01T10:00:01Z'),
+        ]
+        data = self.send(taps).json()
+        self.assertEqual(len(data['accepted']), 3)
+        self.assertEqual(data['counts'], {'resist': 2, 'smoked': 0, 'sport': 1})
+
+        data = self.send(taps).json()
+        self.assertEqual(data['accepted'], [])
+        self.assertEqual(len(data['duplicates']), 3)
+        self.assertEqual(ActivityLog.objects.count(), 3)
+        self.assertEqual(data['counts'], {'resist': 2, 'smoked': 0, 'sport': 1})
+
+    def test_rate_limit_applied_within_batch(self):
+        first = self.make_tap('SMOKED', '2025-01-01T10:00:00Z')
+        second = self.make_tap('SMOKED', '2025-01-01T10:00:01Z')
+        data = self.send([second, first]).json()
+        self.assertEqual(data['accepted'], [first['client_uuid']])
+        self.assertEqual(data['rate_limited'], [second['client_uuid']])
+
+    def test_client_timestamp_is_kept(self):
+        self.send([self.make_tap('SPORT', '2025-01-01T10:00:00Z')])
+        log = ActivityLog.objects.get()
+        self.assertEqual(log.timestamp.isoformat(), '2025-01-01T10:00:00+00:00')
+
+    def test_invalid_taps_are_rejected(self):
+        data = self.send([{'activity_type': 'NAP', 'client_uuid': str(uuid.uuid4())}]).json()
+        self.assertEqual(len(data['rejected']), 1)
+        self.assertEqual(ActivityLog.objects.count(), 0)
+
+    def test_single_tap_retried_through_batch_is_counted_once(self):
+        # The single tap was saved but its response was lost; the client queues it with the same id
+        tap = self.make_tap('RESIST', '2025-01-01T10:00:00Z')
+        response = self.client.post(
+            reverse('tracker:activity_tap'),
+            data=json.dumps({'activity_type': 'RESIST', 'client_uuid': tap['client_uuid']}),
+            content_type='application/json',
+        )
+        self.assertFalse(response.json()['duplicate'])
+        data = self.send([tap]).json()
+        self.assertEqual(data['duplicates'], [tap['client_uuid']])
+        self.assertEqual(data['counts'], {'resist': 1, 'smoked': 0, 'sport': 0})
+
+    def test_record_tap_ignores_known_client_uuid(self):
+        client_uuid = uuid.uuid4()
+        log, created = record_tap(self.user, 'SPORT', client_uuid)
+        self.assertTrue(created)
+        self.assertEqual(record_tap(self.user, 'SPORT', client_uuid), (log, False))
+        self.assertEqual(get_activity_counts(self.user), {'resist': 0, 'smoked': 0, 'sport': 1})
+
+
+@override_settings(ROLLUP_SAFETY_LAG=0)
+class ActivityRollupTests(TestCase):
+    """Rollups are bucketed in the user's time zone and updated incrementally."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        UserProfile.objects.create(user=self.user, time_zone='Europe/Moscow')
+        self.client.force_login(self.user)
+
+    def log(self, activity_type, timestamp):
+        return ActivityLog.objects.create(
+            user=self.user,
+            activity_type=activity_type,
+            timestamp=datetime.fromisoformat(timestamp),
+        )
+
+    def test_daily_buckets_use_user_time_zone(self):
+        # 22:30 UTC is already the next day in Moscow (UTC+3)
+        self.log('RESIST', '2025-01-01T22:30:00+00:00')
+        self.log('RESIST', '2025-01-01T10:00:00+00:00')
+        update_rollups()
+        days = ActivityRollup.objects.filter(granularity=ActivityRollup.DAY).order_by('bucket_start')
+        self.assertEqual([rollup.count for rollup in days], [1, 1])
+        self.assertEqual(
+            days[1].bucket_start.astimezone(zoneinfo.ZoneInfo('Europe/Moscow')).date().isoformat(),
+            '2025-01-02'
+        )
+
+    def test_incremental_update_only_adds_new_rows(self):
+        self.log('SPORT', '2025-01-01T10:00:00+00:00')
+        self.assertEqual(update_rollups(), 1)
+        self.log('SPORT', '2025-01-01T10:20:00+00:00')
+        self.assertEqual(update_rollups(), 1)
+        self.assertEqual(update_rollups(), 0)
+        hour = ActivityRollup.objects.get(granularity=ActivityRollup.HOUR)
+        self.assertEqual(hour.count, 2)
+
+    def test_late_commit_below_watermark_is_folded(self):
+        def log(log_id):
+            ActivityLog.objects.create(id=log_id, user=self.user, activity_type='RESIST')
+
+        start = timezone.now()
+        with mock.patch('tracker.rollups.timezone') as clock:
+            clock.now.return_value = start
+            log(5)
+            # Nothing is folded until the highest id seen has aged by the lag
+            self.assertEqual(update_rollups(lag=60), 0)
+            # Id 3 was taken before id 5 but its transaction commits only now
+            log(3)
+            log(8)
+            clock.now.return_value = start + timedelta(seconds=30)
+            self.assertEqual(update_rollups(lag=60), 0)
+            clock.now.return_value = start + timedelta(seconds=60)
+            self.assertEqual(update_rollups(lag=60), 2)
+        self.assertEqual(ActivityRollup.objects.get(granularity=ActivityRollup.DAY).count, 2)
+        # Id 8 stays pending and is counted live by the stats endpoint
+        data = self.client.get(reverse('tracker:activity_stats'), {'days': 1}).json()
+        self.assertEqual(sum(bucket['resist'] for bucket in data['buckets']), 3)
+
+    def test_stats_endpoint_includes_pending_logs(self):
+        now = timezone.now()
+        ActivityLog.objects.create(user=self.user, activity_type='SMOKED', timestamp=now)
+        update_rollups()
+        ActivityLog.objects.create(user=self.user, activity_type='SMOKED', timestamp=now)
+        data = self.client.get(reverse('tracker:activity_stats'), {'days': 1}).json()
+        self.assertEqual(sum(bucket['smoked'] for bucket in data['buckets']), 2)
+        self.assertEqual(data['time_zone'], 'Europe/Moscow')
+
+    def test_stats_endpoint_answers_304_until_new_log(self):
+        url = reverse('tracker:activity_stats')
+        ActivityLog.objects.create(user=self.user, activity_type='SPORT', timestamp=timezone.now())
+        etag = self.client.get(url, {'days': 7})['ETag']
+        response = self.client.get(url, {'days': 7}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        # A different window is a different resource
+        self.assertEqual(self.client.get(url, {'days': 8}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        ActivityLog.objects.create(user=self.user, activity_type='SPORT', timestamp=timezone.now())
+        self.assertEqual(self.client.get(url, {'days': 7}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ActivityExportTests(TestCase):
+    """Exports stream the user's logs as NDJSON/CSV, optionally gzipped."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        for day in (1, 2, 3):
+            ActivityLog.objects.create(
+                user=self.user,
+                activity_type='RESIST',
+                timestamp=datetime(2025, 1, day, 12, tzinfo=dt_timezone.utc),
+            )
+
+    def test_ndjson_with_date_range(self):
+        response = self.client.get(
+            reverse('tracker:activity_export'),
+            {'start': '2025-01-02', 'end': '2025-01-02'}
+        )
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['timestamp'][:10] for row in rows], ['2025-01-02'])
+
+    def test_gzipped_csv(self):
+        response = self.client.get(reverse('tracker:activity_export'), {'format': 'csv', 'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(lines[0], 'id,username,activity_type,timestamp,client_uuid')
+        self.assertEqual(len(lines), 4)
+
+    def test_invalid_format(self):
+        response = self.client.get(reverse('tracker:activity_export'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ActivityHistoryTests(TestCase):
+    """History pages follow (timestamp, id) cursors newest first."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.user)
+        moment = timezone.now()
+        # Pairs of equal timestamps must neither repeat nor skip rows across pages
+        for offset, activity_type in enumerate(['RESIST', 'SMOKED', 'RESIST', 'SPORT', 'RESIST', 'SMOKED', 'RESIST']):
+            ActivityLog.objects.create(
+                user=self.user,
+                activity_type=activity_type,
+                timestamp=moment - timedelta(minutes=offset // 2)
+            )
+        other = User.objects.create_user('other', password='password')
+        ActivityLog.objects.create(user=other, activity_type='RESIST')
+
+    def fetch_all(self, **params):
+        rows = []
+        cursor = None
+        while True:
+            query = {**params, **({'cursor': cursor} if cursor else {})}
+            data = self.client.get(reverse('tracker:activity_history'), query).json()
+            self.assertTrue(data['success'])
+            rows.extend(data['results'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return rows
+
+    def test_pages_cover_history_newest_first(self):
+        rows = self.fetch_all(limit=2)
+        expected = list(
+            ActivityLog.objects.filter(user=self.user).order_by('-timestamp', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual([row['id'] for row in rows], expected)
+
+    def test_type_filter(self):
+        rows = self.fetch_all(limit=3, type='RESIST')
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row['activity_type'] for row in rows}, {'RESIST'})
+
+    def test_last_page_has_no_cursor(self):
+        data = self.client.get(reverse('tracker:activity_history'), {'limit': 7}).json()
+        self.assertEqual(len(data['results']), 7)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': 'garbage'}, {'limit': '0'}, {'limit': 'x'}, {'type': 'NAP'}):
+            response = self.client.get(reverse('tracker:activity_history'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_deep_page_uses_a_single_bounded_query(self):
+        logs = ActivityLog.objects.filter(user=self.user)
+        _, cursor = keyset_page(logs, 'timestamp', ['id', 'timestamp'], limit=4)
+        with self.assertNumQueries(1):
+            rows, next_cursor = keyset_page(logs, 'timestamp', ['id', 'timestamp'], decode_cursor(cursor), limit=4)
+        self.assertEqual(len(rows), 3)
+        self.assertIsNone(next_cursor)
+
+
+class ActivityLogIndexTests(TestCase):
+    """The hot per-user queries are answered from the composite indexes (EXPLAIN)."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('user', password='password')
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise be read sequentially
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn(index_name, queryset.explain())
+
+    def test_newest_first_uses_user_timestamp_index(self):
+        logs = ActivityLog.objects.filter(user=self.user).order_by('-timestamp')[:50]
+        self.assertUsesIndex(logs, 'tracker_log_user_ts_idx')
+
+    def test_history_page_after_cursor_uses_user_timestamp_index(self):
+        moment = timezone.now()
+        logs = ActivityLog.objects.filter(user=self.user).filter(
+            Q(timestamp__lte=moment),
+            Q(timestamp__lt=moment) | Q(timestamp=moment, id__lt=100)
+        ).order_by('-timestamp', '-id')[:51]
+        self.assertUsesIndex(logs, 'tracker_log_user_ts_idx')
+
+    def test_history_by_type_uses_type_index(self):
+        logs = ActivityLog.objects.filter(user=self.user, activity_type='RESIST').order_by('-timestamp', '-id')[:51]
+        self.assertUsesIndex(logs, 'tracker_log_user_type_ts_idx')
+
+    def test_counts_by_type_use_covering_index(self):
+        counts = ActivityLog.objects.filter(user=self.user).values('user').order_by().annotate(
+            resist=Count('id', filter=Q(activity_type='RESIST')),
+            smoked=Count('id', filter=Q(activity_type='SMOKED')),
+        )
+        self.assertUsesIndex(counts, 'tracker_log_user_type_ts_idx')
+
+
+class ActivityLogAdminTests(TestCase):
+    """The changelist filters by user without listing users and never counts the whole table."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.other = User.objects.create_user('other', password='password')
+        self.client.force_login(self.user)
+        ActivityLog.objects.create(user=self.user, activity_type='RESIST')
+        ActivityLog.objects.create(user=self.other, activity_type='SMOKED')
+
+    def test_user_filter_is_an_autocomplete(self):
+        url = reverse('admin:tracker_activitylog_changelist')
+        response = self.client.get(url, {'user__id__exact': self.other.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, f'<option value="{self.other.pk}" selected>other</option>', html=True)
+        self.assertContains(response, 'js/admin-autocomplete-filter.js')
+
+    def test_date_filter(self):
+        url = reverse('admin:tracker_activitylog_changelist')
+        response = self.client.get(url, {'timestamp__gte': timezone.now() + timedelta(days=1)})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_count_is_capped(self):
+        ActivityLog.objects.bulk_create(
+            ActivityLog(user=self.user, activity_type='SPORT') for _ in range(COUNT_LIMIT)
+        )
+        paginator = EstimatedCountPaginator(ActivityLog.objects.all(), 100)
+        self.assertEqual(paginator.count, COUNT_LIMIT + 1)
+        paginator = EstimatedCountPaginator(ActivityLog.objects.filter(user=self.other), 100)
+        self.assertEqual(paginator.count, 1)
+
+
+class ActivityStreamTests(TestCase):
+    """Count changes are pushed to open SSE streams through pub/sub."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    async def test_stream_sends_initial_and_published_counts(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('tracker:activity_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        first = await anext(events)
+        self.assertIn('"resist": 0', first if isinstance(first, str) else first.decode())
+
+        await sync_to_async(publish_activity_counts)(self.user.pk, {'resist': 5, 'smoked': 0, 'sport': 0})
+        second = await asyncio.wait_for(anext(events), timeout=2)
+        self.assertIn('"resist": 5', second if isinstance(second, str) else second.decode())
+        await events.aclose()
+
+    def test_stream_is_disabled_under_wsgi(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('tracker:activity_stream')).status_code, 204)
+
+
+class BenchmarkTests(TestCase):
+    """The endpoint benchmark seeds consistent data, measures every endpoint and flags regressions."""
+
+    def test_seed_and_run(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = seed(200)
+        self.assertTrue(user.is_superuser)
+        self.assertEqual(ActivityLog.objects.count(), 200)
+        self.assertEqual(BreathingSession.objects.filter(user=user).count(), 20)
+        self.assertTrue(ActivityCounter.objects.filter(user=user).exists())
+        counts = get_activity_counts(user)
+        self.assertEqual(counts['resist'] + counts['smoked'] + counts['sport'], 200)
+
+        results = run_benchmarks(user, requests=3, warmup=0)
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results['activity_history']['queries'], 3)
+        for result in results.values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(ActivityLog.objects.count(), 203)
+
+    def test_compare(self):
+        baseline = {
+            'home': {'p50_ms': 4.0, 'p95_ms': 5.0, 'p99_ms': 6.0, 'queries': 3},
+            'guide': {'p50_ms': 0.2, 'p95_ms': 0.3, 'p99_ms': 0.4, 'queries': 0},
+        }
+        results = {
+            'home': {'p50_ms': 4.0, 'p95_ms': 6.0, 'p99_ms': 9.0, 'queries': 3},
+            'guide': {'p50_ms': 0.5, 'p95_ms': 0.9, 'p99_ms': 1.0, 'queries': 0},
+            'categories': {'p50_ms': 9.0, 'p95_ms': 9.0, 'p99_ms': 9.0, 'queries': 9},
+        }
+        # +20% and sub-millisecond growth are within the threshold; new endpoints have nothing to compare
+        self.assertEqual(compare(results, baseline, threshold=0.25), [])
+        results['home'] = {'p50_ms': 4.0, 'p95_ms': 7.0, 'p99_ms': 9.0, 'queries': 4}
+        self.assertEqual(len(compare(results, baseline, threshold=0.25)), 2)
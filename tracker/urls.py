@@ -5,5 +5,10 @@ app_name = 'tracker'
 
 urlpatterns = [
     path('api/activity/tap/', views.activity_tap, name='activity_tap'),
+    path('api/activity/tap/batch/', views.activity_tap_batch, name='activity_tap_batch'),
+    path('api/activity/stats/', views.activity_stats, name='activity_stats'),
+    path('api/activity/export/', views.activity_export, name='activity_export'),
+    path('api/activity/history/', views.activity_history, name='activity_history'),
+    path('api/activity/stream/', views.activity_stream, name='activity_stream'),
 ]
 
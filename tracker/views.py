@@ -1,34 +1,96 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.views.decorators.http import condition, require_http_methods
 from django.utils import timezone
+from django.db import transaction, IntegrityError
+from django.utils.dateparse import parse_datetime
 from django.views.decorators.csrf import ensure_csrf_cookie
-from datetime import timedelta
+from datetime import timedelta, timezone as dt_timezone
 import json
-from .models import ActivityLog
+import uuid
+from breathing.conditional import latest_id, make_etag
+from breathing.exports import parse_export_params, streaming_export_response
+from breathing.pagination import keyset_page, parse_page_params
+from breathing.ratelimit import rate_limit, get_rate
+from breathing import pubsub
+from .exports import ACTIVITY_EXPORT_FIELDS, activity_export_rows
+from .models import ActivityLog, ActivityCounter, ActivityRollup
+from . import rollups
 
 
 def get_activity_counts(user):
     """
-    Helper function to calculate activity counts for a user.
+    Helper function to return activity counts for a user.
     Returns a dictionary with 'resist', 'smoked', and 'sport' counts.
-    Optimized to use a single query with aggregation instead of 3 separate queries.
+    Reads the materialized ActivityCounter row (a primary-key lookup) and only
+    falls back to aggregating ActivityLog the first time a user is seen.
     """
-    from django.db.models import Count, Q
+    try:
+        counter = ActivityCounter.objects.get(user=user)
+    except ActivityCounter.DoesNotExist:
+        counter = ActivityCounter.rebuild_for_user(user)
     
-    # Single query with aggregation - much faster than 3 separate queries
-    counts = ActivityLog.objects.filter(user=user).aggregate(
-        resist=Count('id', filter=Q(activity_type='RESIST')),
-        smoked=Count('id', filter=Q(activity_type='SMOKED')),
-        sport=Count('id', filter=Q(activity_type='SPORT'))
-    )
+    return counter.as_dict()
+
+
+async def aget_activity_counts(user):
+    """Async get_activity_counts() for the async views."""
+    try:
+        counter = await ActivityCounter.objects.aget(user=user)
+    except ActivityCounter.DoesNotExist:
+        counter = await ActivityCounter.arebuild_for_user(user)
     
-    return {
-        'resist': counts['resist'] or 0,
-        'smoked': counts['smoked'] or 0,
-        'sport': counts['sport'] or 0,
-    }
+    return counter.as_dict()
+
+
+def record_tap(user, activity_type, client_uuid=None):
+    """
+    Save one tap and bump the user's counter in a single transaction.
+    A tap whose client_uuid the user already has (a retry after a lost
+    response) is not saved again. Returns (activity_log, created).
+    """
+    try:
+        with transaction.atomic():
+            if client_uuid is not None:
+                existing = ActivityLog.objects.filter(user=user, client_uuid=client_uuid).first()
+                if existing is not None:
+                    return existing, False
+            activity_log = ActivityLog.objects.create(
+                user=user,
+                activity_type=activity_type,
+                client_uuid=client_uuid
+            )
+            ActivityCounter.increment(user, activity_type)
+    except IntegrityError:
+        if client_uuid is None:
+            raise
+        # A concurrent retry of the same tap was saved first
+        return ActivityLog.objects.get(user=user, client_uuid=client_uuid), False
+    return activity_log, True
+
+
+def parse_tap_uuid(data):
+    """Optional client_uuid of a single tap, or raises ValueError with a message."""
+    if data.get('client_uuid') is None:
+        return None
+    try:
+        return uuid.UUID(str(data['client_uuid']))
+    except ValueError:
+        raise ValueError('Неверный идентификатор записи.')
+
+
+def activity_counts_channel(user_id):
+    """Pub/sub channel carrying count updates for one user."""
+    return f'activity-counts:{user_id}'
+
+
+def publish_activity_counts(user_id, counts):
+    """Push fresh counts to the user's other open devices (see activity_stream)."""
+    pubsub.publish(activity_counts_channel(user_id), counts)
 
 
 def home_view(request):
@@ -52,17 +114,49 @@ def home_view(request):
     
     context = {
         'activity_counts': activity_counts,
+        'live_updates': settings.ACTIVITY_LIVE_UPDATES,
     }
     
     return render(request, 'home.html', context)
 
 
+def activity_type_from_body(request):
+    """Rate-limit group for activity taps: the activity type in the JSON body."""
+    try:
+        return json.loads(request.body).get('activity_type')
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+
+def is_saved_tap_retry(request):
+    """
+    Rate-limit exemption for activity taps: a retry of a tap already saved
+    under its client_uuid is answered as a duplicate, so it must not be
+    rejected by (or count towards) the limit.
+    """
+    try:
+        client_uuid = parse_tap_uuid(json.loads(request.body))
+    except (json.JSONDecodeError, AttributeError, ValueError):
+        return False
+    if client_uuid is None or not request.user.is_authenticated:
+        return False
+    return ActivityLog.objects.filter(user=request.user, client_uuid=client_uuid).exists()
+
+
 @require_http_methods(["POST"])
 @login_required
+@rate_limit(
+    'activity_tap',
+    group=activity_type_from_body,
+    exempt=is_saved_tap_retry,
+    message='Слишком часто. Попробуйте через 3 секунды.'
+)
 def activity_tap(request):
     """
     AJAX endpoint for logging activity taps.
     Validates user authentication, activity type, and implements rate limiting.
+    An optional client_uuid makes retries safe: a tap already saved under it
+    is answered with the current counts and `duplicate: true`.
     """
     # Check if user is authenticated (login_required decorator handles this, but double-check)
     if not request.user.is_authenticated:
@@ -81,6 +175,14 @@ def activity_tap(request):
             'error': 'Неверный формат запроса.'
         }, status=400)
     
+    try:
+        client_uuid = parse_tap_uuid(data)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
     # Validate activity_type
     valid_types = ['RESIST', 'SMOKED', 'SPORT']
     if activity_type not in valid_types:
@@ -89,36 +191,24 @@ def activity_tap(request):
             'error': 'Неверный тип активности.'
         }, status=400)
     
-    # Rate limiting: Check if there's a recent entry of the same type (within 3 seconds)
-    three_seconds_ago = timezone.now() - timedelta(seconds=3)
-    recent_entry = ActivityLog.objects.filter(
-        user=request.user,
-        activity_type=activity_type,
-        timestamp__gte=three_seconds_ago
-    ).first()
-    
-    if recent_entry:
-        return JsonResponse({
-            'success': False,
-            'error': 'Слишком часто. Попробуйте через 3 секунды.',
-            'rate_limited': True
-        }, status=429)
+    # Rate limiting (same type within 3 seconds) is enforced by @rate_limit
+    # against the shared cache, so no ActivityLog query is needed here.
     
     # Create new ActivityLog entry
     try:
-        activity_log = ActivityLog.objects.create(
-            user=request.user,
-            activity_type=activity_type
-        )
+        activity_log, created = record_tap(request.user, activity_type, client_uuid)
         
         # Get updated counts
         counts = get_activity_counts(request.user)
+        if created:
+            publish_activity_counts(request.user.pk, counts)
         
         return JsonResponse({
             'success': True,
             'message': 'Активность зарегистрирована.',
             'counts': counts,
-            'activity_id': activity_log.id
+            'activity_id': activity_log.id,
+            'duplicate': not created
         }, status=200)
         
     except Exception as e:
@@ -126,3 +216,418 @@ def activity_tap(request):
             'success': False,
             'error': 'Ошибка при сохранении.'
         }, status=500)
+
+
+@require_http_methods(["POST"])
+@login_required
+@rate_limit(
+    'activity_tap',
+    group=activity_type_from_body,
+    exempt=is_saved_tap_retry,
+    message='Слишком часто. Попробуйте через 3 секунды.'
+)
+async def activity_tap_async(request):
+    """
+    Async activity_tap for ASGI serving (see breathing.asgi_urls): same
+    request and response, but the worker's event loop keeps serving other
+    requests while this one waits for the database. The insert and counter
+    update still share one transaction, which Django only runs synchronously.
+    """
+    user = await request.auser()
+    
+    try:
+        data = json.loads(request.body)
+        activity_type = data.get('activity_type')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверный формат запроса.'
+        }, status=400)
+    
+    if activity_type not in ActivityCounter.COUNT_FIELDS:
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверный тип активности.'
+        }, status=400)
+    
+    try:
+        client_uuid = parse_tap_uuid(data)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    try:
+        activity_log, created = await sync_to_async(record_tap)(user, activity_type, client_uuid)
+        counts = await aget_activity_counts(user)
+        if created:
+            # The cache pub/sub backend may query the database
+            await sync_to_async(publish_activity_counts)(user.pk, counts)
+    except Exception:
+        return JsonResponse({
+            'success': False,
+            'error': 'Ошибка при сохранении.'
+        }, status=500)
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Активность зарегистрирована.',
+        'counts': counts,
+        'activity_id': activity_log.id,
+        'duplicate': not created
+    }, status=200)
+
+
+# Largest number of queued taps accepted in one batch request
+ACTIVITY_BATCH_MAX_TAPS = 500
+
+
+def parse_client_tap(tap, now):
+    """
+    Validate one queued tap from the batch endpoint.
+    Returns (client_uuid, activity_type, timestamp) or raises ValueError with a message.
+    """
+    if not isinstance(tap, dict):
+        raise ValueError('Неверный формат записи.')
+    
+    activity_type = tap.get('activity_type')
+    if activity_type not in ActivityCounter.COUNT_FIELDS:
+        raise ValueError('Неверный тип активности.')
+    
+    try:
+        client_uuid = uuid.UUID(str(tap.get('client_uuid')))
+    except ValueError:
+        raise ValueError('Неверный идентификатор записи.')
+    
+    timestamp = now
+    client_timestamp = tap.get('client_timestamp')
+    if client_timestamp:
+        timestamp = parse_datetime(str(client_timestamp))
+        if timestamp is None:
+            raise ValueError('Неверное время записи.')
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+        # Clock skew: a tap can't have happened after the server received it
+        timestamp = min(timestamp, now)
+    
+    return client_uuid, activity_type, timestamp
+
+
+@require_http_methods(["POST"])
+@login_required
+@rate_limit('activity_tap_batch', message='Слишком часто. Попробуйте позже.')
+def activity_tap_batch(request):
+    """
+    AJAX endpoint for taps queued by the client while offline.
+    Expects {"taps": [{"activity_type", "client_uuid", "client_timestamp"}, ...]}.
+    Retries are dropped by client_uuid, the per-type rate limit is applied
+    across the batch in memory, and new rows are written with one bulk_create.
+    """
+    try:
+        data = json.loads(request.body)
+        taps = data.get('taps')
+    except (json.JSONDecodeError, AttributeError):
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверный формат запроса.'
+        }, status=400)
+    
+    if not isinstance(taps, list) or len(taps) > ACTIVITY_BATCH_MAX_TAPS:
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверный формат запроса.'
+        }, status=400)
+    
+    now = timezone.now()
+    rejected = []
+    parsed = {}
+    for tap in taps:
+        try:
+            client_uuid, activity_type, timestamp = parse_client_tap(tap, now)
+        except ValueError as e:
+            rejected.append({
+                'client_uuid': tap.get('client_uuid') if isinstance(tap, dict) else None,
+                'error': str(e)
+            })
+            continue
+        # Duplicates inside the same batch collapse onto the first copy
+        parsed.setdefault(client_uuid, (activity_type, timestamp))
+    
+    accepted = []
+    duplicates = []
+    rate_limited = []
+    try:
+        with transaction.atomic():
+            # Serialize concurrent batches from the same user on the counter row
+            list(ActivityCounter.objects.select_for_update().filter(user=request.user))
+            
+            existing = set(
+                ActivityLog.objects.filter(
+                    user=request.user,
+                    client_uuid__in=list(parsed)
+                ).values_list('client_uuid', flat=True)
+            ) if parsed else set()
+            
+            # Same-type taps closer together than the configured period are
+            # dropped, exactly as the single-tap endpoint would have done.
+            last_accepted = {}
+            new_logs = []
+            amounts = {}
+            for client_uuid, (activity_type, timestamp) in sorted(
+                parsed.items(), key=lambda item: item[1][1]
+            ):
+                if client_uuid in existing:
+                    duplicates.append(str(client_uuid))
+                    continue
+                rate = get_rate('activity_tap', activity_type)
+                previous = last_accepted.get(activity_type)
+                if rate and previous and timestamp - previous < timedelta(seconds=rate[1]):
+                    rate_limited.append(str(client_uuid))
+                    continue
+                last_accepted[activity_type] = timestamp
+                new_logs.append(ActivityLog(
+                    user=request.user,
+                    activity_type=activity_type,
+                    timestamp=timestamp,
+                    client_uuid=client_uuid
+                ))
+                amounts[activity_type] = amounts.get(activity_type, 0) + 1
+                accepted.append(str(client_uuid))
+            
+            if new_logs:
+                ActivityLog.objects.bulk_create(new_logs)
+                ActivityCounter.increment_many(request.user, amounts)
+    except IntegrityError:
+        # A concurrent retry inserted the same client_uuid first; the client
+        # will resend and the duplicates will then be dropped.
+        return JsonResponse({
+            'success': False,
+            'error': 'Конфликт записи. Повторите попытку.'
+        }, status=409)
+    
+    counts = get_activity_counts(request.user)
+    if accepted:
+        publish_activity_counts(request.user.pk, counts)
+    
+    return JsonResponse({
+        'success': True,
+        'accepted': accepted,
+        'duplicates': duplicates,
+        'rate_limited': rate_limited,
+        'rejected': rejected,
+        'counts': counts
+    }, status=200)
+
+
+# Longest range served by the stats endpoint, per granularity (in days)
+STATS_MAX_DAYS = {
+    ActivityRollup.HOUR: 31,
+    ActivityRollup.DAY: 366,
+}
+
+
+def activity_stats_etag(request):
+    """
+    ETag for activity_stats without computing the buckets: the user's latest
+    log id, the rollup watermark, the query and the window start (which moves
+    with the clock) identify the payload.
+    """
+    if not request.user.is_authenticated:
+        return None
+    user_id = request.user.pk
+    granularity = request.GET.get('granularity', ActivityRollup.DAY)
+    if granularity not in STATS_MAX_DAYS:
+        return None
+    tz = rollups.get_user_time_zones([user_id])[user_id]
+    window = rollups.bucket_start(timezone.now(), tz, granularity)
+    return make_etag(
+        'activity-stats',
+        user_id,
+        request.GET.get('days', ''),
+        granularity,
+        tz,
+        window.isoformat(),
+        rollups.get_watermark(),
+        latest_id(ActivityLog.objects.filter(user_id=user_id)),
+    )
+
+
+@require_http_methods(["GET"])
+@login_required
+@condition(etag_func=activity_stats_etag)
+def activity_stats(request):
+    """
+    JSON endpoint with per-bucket activity counts for charts.
+    Query parameters: granularity ('hour' or 'day', default 'day') and days
+    (how far back to go, default 30). Served from ActivityRollup plus the few
+    logs newer than the rollup watermark, never by scanning the user's history.
+    """
+    granularity = request.GET.get('granularity', ActivityRollup.DAY)
+    if granularity not in STATS_MAX_DAYS:
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверная детализация.'
+        }, status=400)
+    
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 0
+    if not 1 <= days <= STATS_MAX_DAYS[granularity]:
+        return JsonResponse({
+            'success': False,
+            'error': 'Неверный период.'
+        }, status=400)
+    
+    user_id = request.user.pk
+    tz = rollups.get_user_time_zones([user_id])[user_id]
+    since = rollups.bucket_start(timezone.now() - timedelta(days=days), tz, granularity)
+    
+    buckets = {}
+    
+    def add(start, activity_type, count):
+        counts = buckets.setdefault(
+            start.astimezone(tz),
+            dict.fromkeys(ActivityCounter.COUNT_FIELDS.values(), 0)
+        )
+        counts[ActivityCounter.COUNT_FIELDS[activity_type]] += count
+    
+    for start, activity_type, count in ActivityRollup.objects.filter(
+        user_id=user_id,
+        granularity=granularity,
+        bucket_start__gte=since
+    ).values_list('bucket_start', 'activity_type', 'count'):
+        add(start, activity_type, count)
+    
+    # Logs not yet folded in by update_activity_rollups (bounded by how often it runs)
+    pending = ActivityLog.objects.filter(
+        user_id=user_id,
+        id__gt=rollups.get_watermark(),
+        timestamp__gte=since
+    ).values_list('user_id', 'activity_type', 'timestamp')
+    for key, count in rollups.count_buckets(pending, {user_id: tz}).items():
+        _, bucket_granularity, start, activity_type = key
+        if bucket_granularity == granularity:
+            add(start, activity_type, count)
+    
+    return JsonResponse({
+        'success': True,
+        'granularity': granularity,
+        'time_zone': str(tz),
+        'buckets': [
+            {'start': start.isoformat(), **counts}
+            for start, counts in sorted(buckets.items())
+        ]
+    })
+
+
+@require_http_methods(["GET"])
+@login_required
+def activity_export(request):
+    """
+    Download the user's ActivityLog as NDJSON or CSV, streamed in chunks.
+    Query parameters: format ('ndjson' or 'csv'), gzip (1 to compress),
+    start/end (ISO dates or datetimes; end date inclusive).
+    """
+    try:
+        export_format, compress, start, end = parse_export_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    return streaming_export_response(
+        activity_export_rows(user=request.user, start=start, end=end),
+        ACTIVITY_EXPORT_FIELDS,
+        export_format,
+        compress,
+        filename='activity_log'
+    )
+
+
+ACTIVITY_HISTORY_FIELDS = ['id', 'activity_type', 'timestamp']
+
+
+@require_http_methods(["GET"])
+@login_required
+def activity_history(request):
+    """
+    The user's ActivityLog, newest first, one keyset page at a time (see
+    breathing.pagination). Query parameters: cursor (next_cursor of the
+    previous page), limit (default 50, at most 200) and type (one activity type).
+    """
+    try:
+        position, limit = parse_page_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    logs = ActivityLog.objects.filter(user=request.user)
+    activity_type = request.GET.get('type')
+    if activity_type:
+        if activity_type not in dict(ActivityLog.ACTIVITY_CHOICES):
+            return JsonResponse({
+                'success': False,
+                'error': 'Неверный тип активности.'
+            }, status=400)
+        logs = logs.filter(activity_type=activity_type)
+    
+    results, next_cursor = keyset_page(logs, 'timestamp', ACTIVITY_HISTORY_FIELDS, position, limit)
+    return JsonResponse({
+        'success': True,
+        'results': results,
+        'next_cursor': next_cursor
+    })
+
+
+# Seconds between SSE comment lines that keep idle connections open through proxies
+ACTIVITY_STREAM_KEEPALIVE = 20
+
+
+async def activity_stream(request):
+    """
+    Server-Sent Events stream of the user's activity counts.
+    Sends the current counts on connect and then an 'counts' event whenever
+    activity_tap / activity_tap_batch records a tap, on any device.
+    Only available under ASGI; a long-lived response would tie up a WSGI thread.
+    """
+    if request.method != 'GET':
+        return HttpResponse(status=405)
+    
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({
+            'success': False,
+            'error': 'Требуется авторизация.'
+        }, status=401)
+    
+    if not isinstance(request, ASGIRequest):
+        # 204 tells EventSource to stop reconnecting
+        return HttpResponse(status=204)
+    
+    # Subscribe before reading the current counts so no update falls in between
+    subscription = pubsub.subscribe(
+        activity_counts_channel(user.pk),
+        keepalive=ACTIVITY_STREAM_KEEPALIVE
+    )
+    initial_counts = await sync_to_async(get_activity_counts)(user)
+    
+    async def events():
+        try:
+            yield f'event: counts\ndata: {json.dumps(initial_counts)}\n\n'
+            async for counts in subscription:
+                if counts is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield f'event: counts\ndata: {json.dumps(counts)}\n\n'
+        finally:
+            await subscription.aclose()
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response